@@ -1,136 +1,293 @@
-"""Simple script to test the API functions"""
+"""
+Load generation and benchmark tool for the API.
+
+Requests are replayed from a scenario file in JSON lines format, one scenario
+per line:
+
+    {"name": "list", "method": "GET", "path": "/api/blogs/?page_size=50", "weight": 5}
+    {"name": "create", "method": "POST", "path": "/api/blogs/", "body": {"title": "t"}}
+
+`path` and string values of `body` may contain `{today}` and `{blog_id}`;
+`weight` (default 1) sets how often a scenario runs relative to the others, and
+`"auth": false` sends it without the token. A JWT token is obtained once and
+reused by every request. Worker threads each keep a pooled keep-alive session.
+
+Throughput and p50/p95/p99 latency are printed for every scenario, and written
+as JSON with `--output` so runs can be compared. Works against `runserver`, a
+WSGI server or the ASGI application alike:
+
+    python api_requests_script.py --base-url http://localhost:8000 \\
+        --concurrency 32 --duration 30 --output results.json
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from pathlib import Path
+
 import requests
 
-# Replace these values with your actual endpoint URLs
-BASE_URL = "http://localhost:8000/api"
-LOGIN_URL = "http://localhost:8000/token/"
-BLOGS_URL = BASE_URL + "/blogs/"  # Updated endpoint
-BLOGS_BY_DATE_URL = BASE_URL + "/blogs/by_date/"
-BLOGS_BY_DATE_RANGE_URL = BASE_URL + "/blogs/by_date_range/"
-BLOGS_CREATED_AFTER_DATE_URL = BASE_URL + "/blogs/created_after_date/"
-BLOGS_CREATED_BEFORE_DATE_URL = BASE_URL + "/blogs/created_before_date/"
-
-# Replace these values with your test user credentials
-USERNAME = "admin"
-PASSWORD = "admin"
-
-
-def get_token():
-    """
-    # Function to authenticate and get JWT token
-    """
-    login_data = {"username": USERNAME, "password": PASSWORD}
-
-    res = requests.post(LOGIN_URL, data=login_data, timeout=15)
-    response_data = res.json()
-    return response_data.get("access")
-
-
-def perform_request(url, method="GET", data=None):
-    """
-    Function to perform API requests with JWT token
-    """
-    res = None
-    headers = {"Authorization": f"Bearer {get_token()}"}
-
-    if method == "GET":
-        res = requests.get(url, headers=headers, timeout=30)
-    elif method == "POST":
-        res = requests.post(url, headers=headers, json=data, timeout=30)
-    elif method == "PUT":
-        res = requests.put(url, headers=headers, json=data, timeout=30)
-    elif method == "DELETE":
-        res = requests.delete(url, headers=headers, timeout=30)
-
-    return res
-
-
-# Test cases
-
-# Test Case 1: Get Blog List (Unauthenticated)
-response = perform_request(BLOGS_URL)
-print(
-    f"Test Case 1 - Get Blog List (Unauthenticated): Status Code: {response.status_code}, "
-    f"Response: {response.json()}"
-)
-
-# Test Case 2: Authenticate and Get JWT Token
-token = get_token()
-print(f"Test Case 2 - Authenticate and Get JWT Token: Token: {token}")
-
-# Test Case 3: Get Blog List (Authenticated)
-response = perform_request(BLOGS_URL)
-print(
-    f"Test Case 3 - Get Blog List (Authenticated): Status Code: {response.status_code}, "
-    f"Response: {response.json()}"
-)
-
-# Test Case 4: Create Blog (Authenticated)
-blog_data = {"title": "New Test Blog", "content": "This is a new test blog content."}
-response = perform_request(BLOGS_URL, method="POST", data=blog_data)
-print(
-    f"Test Case 4 - Create Blog (Authenticated): Status Code: {response.status_code}, "
-    f"Response: {response.json()}"
-)
-
-# Test Case 5: Update Blog (Authenticated)
-ID_TO_UPDATE = str(response.json()["id"])
-updated_blog_data = {
-    "title": "Updated Test Blog",
-    "content": "This is an updated test blog content.",
-}
-response = perform_request(
-    BLOGS_URL + ID_TO_UPDATE + "/", method="PUT", data=updated_blog_data
-)
-print(
-    f"Test Case 5 - Update Blog (Authenticated): Status Code: {response.status_code}, "
-    f"Response: {response.json()}"
-)
-
-# Test Case 6: Delete Blog (Authenticated)
-response = perform_request(BLOGS_URL + ID_TO_UPDATE + "/", method="DELETE")
-print(f"Test Case 6 - Delete Blog (Authenticated): Status Code: {response.status_code}")
-
-# Test Case 7: Search Blog by Title (Unauthenticated)
-response = perform_request(BLOGS_URL + "?title=Test")
-print(
-    f"Test Case 7 - Search Blog by Title (Unauthenticated): Status Code: {response.status_code}, "
-    f"Response: {response.json()}"
-)
-
-# Test Case 8: Search Blog by Author (Unauthenticated)
-response = perform_request(BLOGS_URL + "?author=1")
-print(
-    f"Test Case 8 - Search Blog by Author (Unauthenticated): Status Code: {response.status_code}, "
-    f"Response: {response.json()}"
-)
-
-# Test Case 9: Get Blogs by Date
-response = perform_request(BLOGS_BY_DATE_URL + "?date=2024-02-05")
-print(
-    f"Test Case 9 - Get Blogs by Date: Status Code: {response.status_code}, "
-    f"Response: {response.json()}"
-)
-
-# Test Case 10: Get Blogs by Date Range
-response = perform_request(
-    BLOGS_BY_DATE_RANGE_URL + "?start_date=2024-02-01&end_date=2024-02-05"
-)
-print(
-    f"Test Case 10 - Get Blogs by Date Range: Status Code: {response.status_code}, "
-    f"Response: {response.json()}"
-)
-
-# Test Case 11: Get Blogs Created After Date
-response = perform_request(BLOGS_CREATED_AFTER_DATE_URL + "?date=2024-02-01")
-print(
-    f"Test Case 11 - Get Blogs Created After Date: Status Code: {response.status_code}, "
-    f"Response: {response.json()}"
-)
-
-# Test Case 12: Get Blogs Created Before Date
-response = perform_request(BLOGS_CREATED_BEFORE_DATE_URL + "?date=2024-02-06")
-print(
-    f"Test Case 12 - Get Blogs Created Before Date: Status Code: {response.status_code}, "
-    f"Response: {response.json()}"
-)
+DEFAULT_SCENARIOS = Path(__file__).resolve().parent / "benchmarks" / "requests.jsonl"
+
+
+def get_token(base_url, username, password, timeout):
+    """
+    Authenticate once and return the JWT access token
+    """
+    res = requests.post(
+        f"{base_url}/token/",
+        data={"username": username, "password": password},
+        timeout=timeout,
+    )
+    res.raise_for_status()
+    return res.json()["access"]
+
+
+def load_scenarios(path, variables):
+    """
+    Read the scenarios of a JSON lines file, filling in `variables`
+    """
+    scenarios = []
+    with open(path, encoding="utf-8") as scenario_file:
+        for number, line in enumerate(scenario_file, start=1):
+            if not line.strip():
+                continue
+            scenario = json.loads(line)
+            if "path" not in scenario:
+                raise ValueError(f"{path}:{number}: scenario without a path")
+            scenario.setdefault("name", scenario["path"])
+            scenario["method"] = scenario.get("method", "GET").upper()
+            scenario["path"] = scenario["path"].format(**variables)
+            if isinstance(scenario.get("body"), dict):
+                scenario["body"] = {
+                    key: value.format(**variables) if isinstance(value, str) else value
+                    for key, value in scenario["body"].items()
+                }
+            scenarios.append(scenario)
+    if not scenarios:
+        raise ValueError(f"{path}: no scenarios")
+    return scenarios
+
+
+def find_blog_id(base_url, headers, timeout):
+    """
+    Return the id of an existing blog, creating one if there is none
+    """
+    blogs = requests.get(
+        f"{base_url}/api/blogs/?page_size=1", headers=headers, timeout=timeout
+    ).json()["results"]
+    if blogs:
+        return blogs[0]["id"]
+    res = requests.post(
+        f"{base_url}/api/blogs/",
+        headers=headers,
+        json={"title": "Load test", "content": "Created by api_requests_script.py"},
+        timeout=timeout,
+    )
+    res.raise_for_status()
+    return res.json()["id"]
+
+
+def schedule(scenarios):
+    """
+    Yield scenarios forever, each in proportion to its weight, in a fixed order
+    """
+    weighted = [
+        scenario
+        for scenario in scenarios
+        for _ in range(max(int(scenario.get("weight", 1)), 0))
+    ]
+    return itertools.cycle(weighted)
+
+
+class LoadRunner:
+    """
+    Send scenario requests from a pool of threads and record their latencies
+    """
+
+    def __init__(self, base_url, token, concurrency, timeout):
+        self.base_url = base_url
+        self.token = token
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.results = {}
+
+    def session(self):
+        """
+        Return the keep-alive session of the current thread
+        """
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        return session
+
+    def send(self, scenario):
+        """
+        Send one scenario request and record its latency and status
+        """
+        headers = {}
+        if scenario.get("auth", True) and self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        started = time.perf_counter()
+        try:
+            response = self.session().request(
+                scenario["method"],
+                self.base_url + scenario["path"],
+                headers=headers,
+                json=scenario.get("body"),
+                timeout=self.timeout,
+            )
+            response.content  # pylint: disable=pointless-statement
+            failed = response.status_code >= 400
+        except requests.RequestException:
+            failed = True
+        latency = time.perf_counter() - started
+
+        with self.lock:
+            result = self.results.setdefault(
+                scenario["name"], {"latencies": [], "errors": 0}
+            )
+            result["latencies"].append(latency)
+            result["errors"] += failed
+
+    def run(self, scenarios, total=None, duration=None):
+        """
+        Run `total` requests, or as many as possible in `duration` seconds.
+        Returns the elapsed wall time.
+        """
+        plan = schedule(scenarios)
+        plan_lock = threading.Lock()
+        deadline = time.perf_counter() + duration if duration else None
+        remaining = itertools.count()
+
+        def worker():
+            while True:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return
+                with plan_lock:
+                    if total is not None and next(remaining) >= total:
+                        return
+                    scenario = next(plan)
+                self.send(scenario)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for _ in range(self.concurrency):
+                executor.submit(worker)
+        return time.perf_counter() - started
+
+
+def percentile(latencies, fraction):
+    """
+    Return the nearest-rank `fraction` percentile of sorted `latencies`
+    """
+    return latencies[max(1, math.ceil(fraction * len(latencies))) - 1]
+
+
+def summarize(latencies, errors, elapsed):
+    """
+    Return throughput and latency statistics of a set of requests, in milliseconds
+    """
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+    }
+
+
+def report(runner, elapsed):
+    """
+    Build the results of a run and print them as a table
+    """
+    endpoints = {
+        name: summarize(result["latencies"], result["errors"], elapsed)
+        for name, result in sorted(runner.results.items())
+    }
+    total = summarize(
+        [value for result in runner.results.values() for value in result["latencies"]],
+        sum(result["errors"] for result in runner.results.values()),
+        elapsed,
+    )
+
+    print(
+        f"{'endpoint':<28}{'requests':>10}{'errors':>8}{'req/s':>10}"
+        f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    )
+    for name, stats in [*endpoints.items(), ("TOTAL", total)]:
+        print(
+            f"{name:<28}{stats['requests']:>10}{stats['errors']:>8}{stats['rps']:>10}"
+            f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}"
+        )
+    return {"total": total, "endpoints": endpoints}
+
+
+def main():
+    """
+    Parse the arguments, warm up, run the load and report
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--scenarios", default=str(DEFAULT_SCENARIOS))
+    parser.add_argument("--username", default=os.environ.get("API_USERNAME", "admin"))
+    parser.add_argument("--password", default=os.environ.get("API_PASSWORD", "admin"))
+    parser.add_argument("--concurrency", type=int, default=16)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--requests", type=int, help="Total number of requests")
+    group.add_argument("--duration", type=float, help="Run time in seconds")
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--blog-id", type=int, help="Blog used for {blog_id}")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+    if args.requests is None and args.duration is None:
+        args.requests = 1000
+
+    base_url = args.base_url.rstrip("/")
+    token = get_token(base_url, args.username, args.password, args.timeout)
+    headers = {"Authorization": f"Bearer {token}"}
+    variables = {
+        "today": date.today().isoformat(),
+        "blog_id": args.blog_id or find_blog_id(base_url, headers, args.timeout),
+    }
+    scenarios = load_scenarios(args.scenarios, variables)
+
+    if args.warmup:
+        LoadRunner(base_url, token, args.concurrency, args.timeout).run(
+            scenarios, total=args.warmup
+        )
+    runner = LoadRunner(base_url, token, args.concurrency, args.timeout)
+    started_at = datetime.now(timezone.utc).isoformat()
+    elapsed = runner.run(scenarios, total=args.requests, duration=args.duration)
+    results = {
+        "started_at": started_at,
+        "base_url": base_url,
+        "scenarios": args.scenarios,
+        "concurrency": args.concurrency,
+        "elapsed_s": round(elapsed, 3),
+        **report(runner, elapsed),
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Compare the Blog read endpoints served through WSGI and ASGI.
+
+Start both deployments against the same database, then run the benchmark:
+
+    gunicorn myproject.wsgi -w 4 --threads 8 -b 127.0.0.1:8000
+    uvicorn myproject.asgi:application --workers 4 --port 8001
+    python benchmarks/asgi_vs_wsgi.py --concurrency 256 --requests 20000
+
+Each target receives the same mix of list, detail and date filter requests from
+`--concurrency` client threads; requests per second and latency percentiles are
+printed per target and can be written as JSON with `--output`.
+"""
+
+import argparse
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import requests
+
+PATHS = [
+    "/api/blogs/?page_size=50",
+    "/api/blogs/{blog_id}/",
+    "/api/blogs/by_date/?date={today}",
+    "/api/blogs/created_before_date/?date={today}&page_size=50",
+]
+
+
+def percentile(latencies, fraction):
+    """
+    Return the `fraction` percentile of sorted `latencies`
+    """
+    index = min(len(latencies) - 1, int(round(fraction * (len(latencies) - 1))))
+    return latencies[index]
+
+
+def run(base_url, paths, total, concurrency, token=None):
+    """
+    Send `total` GET requests to `base_url` cycling over `paths` and return the stats
+    """
+    local = threading.local()
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+
+    def fetch(index):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=1)
+            session.mount("http://", adapter)
+        started = time.perf_counter()
+        response = session.get(
+            base_url + paths[index % len(paths)], headers=headers, timeout=60
+        )
+        return time.perf_counter() - started, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(fetch, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, status_code in results if status_code >= 400)
+    return {
+        "url": base_url,
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "rps": round(total / elapsed, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def main():
+    """
+    Parse the arguments and benchmark each target in turn
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--wsgi-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--asgi-url", default="http://127.0.0.1:8001")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=256)
+    parser.add_argument("--warmup", type=int, default=500)
+    parser.add_argument("--blog-id", type=int, default=1)
+    parser.add_argument("--token", help="JWT access token sent with every request")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    paths = [
+        path.format(blog_id=args.blog_id, today=date.today().isoformat())
+        for path in PATHS
+    ]
+    results = []
+    for name, base_url in (("wsgi", args.wsgi_url), ("asgi", args.asgi_url)):
+        run(base_url, paths, args.warmup, min(args.concurrency, args.warmup))
+        result = run(base_url, paths, args.requests, args.concurrency, args.token)
+        result["deployment"] = name
+        results.append(result)
+        print(
+            f"{name}: {result['rps']} req/s, p50 {result['p50_ms']} ms, "
+            f"p99 {result['p99_ms']} ms, {result['errors']} errors"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Micro-benchmark of JSON rendering for large blog lists.
+
+Builds blog representations with `BlogSerializer`'s read path (no database
+needed) and renders them with DRF's `JSONRenderer` and with
+`myapp.renderers.FastJSONRenderer`, checking that both produce the same bytes:
+
+    python benchmarks/render_json.py --blogs 1000 --content-size 2000
+
+Prints the best time of `--repeat` runs per renderer, as rendered blogs and
+megabytes per second, and the speedup.
+"""
+
+import argparse
+import os
+import random
+import string
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "myproject"))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "myproject.settings")
+
+import django  # pylint: disable=wrong-import-position
+
+django.setup()
+
+# pylint: disable=wrong-import-position
+from rest_framework.renderers import JSONRenderer
+
+from myapp.renderers import FastJSONRenderer, orjson
+from myapp.serializers import BlogSerializer
+
+
+def make_blogs(count, content_size, seed=0):
+    """
+    Return `count` blog representations with about `content_size` characters of content
+    """
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + '     ünïcödé\n"\\'
+    started = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    serializer = BlogSerializer()
+    blogs = []
+    for pk in range(1, count + 1):
+        created_at = started + timedelta(seconds=rng.randrange(10**8))
+        row = {
+            "id": pk,
+            "title": "".join(rng.choices(alphabet, k=40)),
+            "body__text": "".join(rng.choices(alphabet, k=content_size)),
+            "body__compressed": None,
+            "created_at": created_at,
+            "modified_at": created_at + timedelta(microseconds=rng.randrange(10**9)),
+            "author__username": f"author{rng.randrange(1000)}",
+        }
+        blogs.append(serializer.row_to_representation(row))
+    return blogs
+
+
+def best_time(renderer, data, repeat, number):
+    """
+    Return the best time in seconds of `number` renders, over `repeat` runs
+    """
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            renderer.render(data)
+        times.append((time.perf_counter() - started) / number)
+    return min(times)
+
+
+def main():
+    """
+    Parse the arguments, render the list with each renderer and report
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--blogs", type=int, default=1000)
+    parser.add_argument("--content-size", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--number", type=int, default=10)
+    args = parser.parse_args()
+
+    if orjson is None:
+        print("orjson is not installed; FastJSONRenderer falls back to the stdlib")
+    data = make_blogs(args.blogs, args.content_size)
+    reference, fast = JSONRenderer(), FastJSONRenderer()
+    output = reference.render(data)
+    if fast.render(data) != output:
+        raise SystemExit("FastJSONRenderer output differs from JSONRenderer")
+
+    size = len(output) / 1e6
+    print(f"{args.blogs} blogs, {size:.2f} MB per render")
+    results = {}
+    for name, renderer in [("JSONRenderer", reference), ("FastJSONRenderer", fast)]:
+        seconds = best_time(renderer, data, args.repeat, args.number)
+        results[name] = seconds
+        print(
+            f"{name:<18}{seconds * 1000:>10.2f} ms{args.blogs / seconds:>14.0f} blogs/s"
+            f"{size / seconds:>10.1f} MB/s"
+        )
+    print(f"speedup: {results['JSONRenderer'] / results['FastJSONRenderer']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 """admin.py"""
 from django.contrib import admin
-from .models import Blog
+from .models import Blog, BlogTask
 
 
 @admin.register(Blog)
@@ -11,3 +11,12 @@ class BlogAdmin(admin.ModelAdmin):
     search_fields = ("title", "author__username")
     list_filter = ("created_at", "modified_at")
     date_hierarchy = "created_at"
+
+
+@admin.register(BlogTask)
+class BlogTaskAdmin(admin.ModelAdmin):
+    """Durable background tasks, to review and retry those that failed"""
+
+    list_display = ("name", "attempts", "run_after", "failed_at")
+    list_filter = ("name", "failed_at")
+    readonly_fields = ("last_error",)
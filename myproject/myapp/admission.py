@@ -0,0 +1,406 @@
+"""
+Admission control for the Blog API.
+
+`AdmissionMiddleware` bounds the requests each route serves at once. Routes are
+identified by URL name (async routes share the limits of their sync
+counterparts) and configured in `BLOG_ADMISSION_ROUTES`, with `"*"` covering
+the routes not listed; routes in `BLOG_ADMISSION_EXEMPT` are never limited.
+A request finding its route busy waits in a bounded queue for at most
+`BLOG_ADMISSION_QUEUE_TIMEOUT` seconds. When the queue is full, or the wait
+times out, it is answered at once with `BLOG_ADMISSION_STATUS` (503 or 429)
+and a `Retry-After` estimated from the queue length and recent service times,
+so clients back off instead of piling up behind slow scans.
+
+Waiting requests are served by priority: authenticated writes first, then
+authenticated reads, then anonymous reads. A request arriving at a full queue
+takes the place of a waiting request of lower priority, which is shed instead.
+Requests count as authenticated when they carry a JWT whose signature and
+expiry check out. The user is not loaded, so this costs no query; the views
+still authenticate the request once it is admitted. Requests with any other
+`Authorization` header rank as anonymous reads, so made-up credentials cannot
+push legitimate requests out of the queue.
+
+Slots are held while the view runs. Streamed bodies are sent after the slot is
+released, except on routes configured with `"streaming": True`, whose slot is
+held until the body is sent or the response closed, to bound downloads rather
+than the views starting them; only sync bodies are held. Limits apply per
+process. In-flight and waiting requests, waits and
+shed requests are exported to Prometheus per route.
+"""
+
+import asyncio
+import math
+import threading
+import time
+from itertools import count
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+from rest_framework import permissions
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .metrics import (
+    ADMISSION_IN_FLIGHT,
+    ADMISSION_QUEUE_DEPTH,
+    ADMISSION_SHED,
+    ADMISSION_WAIT_SECONDS,
+)
+
+# Priorities of waiting requests, lowest first
+WRITE = 0
+AUTHENTICATED_READ = 1
+ANONYMOUS_READ = 2
+
+# Weight of the latest request in the average service time of a route
+SERVICE_TIME_WEIGHT = 0.1
+RETRY_AFTER_MAX = 60
+
+
+def has_valid_token(request):
+    """
+    Return whether the request carries a JWT with a valid signature, that has
+    not expired. The user of the token is not looked up.
+    """
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    if header is None:
+        return False
+    try:
+        raw_token = authentication.get_raw_token(header)
+        if raw_token is None:
+            return False
+        authentication.get_validated_token(raw_token)
+    except AuthenticationFailed:
+        return False
+    return True
+
+
+def priority(request):
+    """
+    Return the queue priority of a request
+    """
+    if not has_valid_token(request):
+        return ANONYMOUS_READ
+    if request.method in permissions.SAFE_METHODS:
+        return AUTHENTICATED_READ
+    return WRITE
+
+
+class Shed(Exception):
+    """
+    Raised when a request is not admitted
+    """
+
+
+class Waiter:
+    """
+    A request waiting for a slot in a thread.
+    `outcome` is set by the limiter, under its lock, before waking the request.
+    """
+
+    def __init__(self, rank, seq):
+        self.key = (rank, seq)
+        self.outcome = None
+        self.event = threading.Event()
+
+    def wake(self):
+        """
+        Wake the waiting thread
+        """
+        self.event.set()
+
+    def wait(self, timeout):
+        """
+        Return whether the request was woken within `timeout` seconds
+        """
+        return self.event.wait(timeout)
+
+
+class AsyncWaiter:
+    """
+    A coroutine waiting for a slot, woken on its event loop
+    """
+
+    def __init__(self, rank, seq):
+        self.key = (rank, seq)
+        self.outcome = None
+        self.loop = asyncio.get_running_loop()
+        self.future = self.loop.create_future()
+
+    def wake(self):
+        """
+        Complete the future from any thread
+        """
+        self.loop.call_soon_threadsafe(self.resolve)
+
+    def resolve(self):
+        """
+        Complete the future, unless the coroutine stopped waiting
+        """
+        if not self.future.done():
+            self.future.set_result(None)
+
+    async def wait(self, timeout):
+        """
+        Return whether the request was woken within `timeout` seconds
+        """
+        try:
+            await asyncio.wait_for(asyncio.shield(self.future), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+class RouteLimiter:
+    """
+    Concurrency limit and priority wait queue of one route
+    """
+
+    def __init__(self, route, concurrency, queue, streaming=False):
+        self.route = route
+        self.concurrency = concurrency
+        self.queue_size = queue
+        self.streaming = streaming
+        self.lock = threading.Lock()
+        self.active = 0
+        self.waiters = []
+        self.sequence = count()
+        self.service_time = 0.0
+
+    def enter(self, waiter_class, rank):
+        """
+        Take a slot if one is free and nobody waits, else queue a new waiter.
+        Returns `None` when admitted, or the waiter to wait on.
+        Raises:
+            Shed: If the queue is full of requests of the same or higher priority.
+        """
+        shed = None
+        with self.lock:
+            if self.active < self.concurrency and not self.waiters:
+                self.active += 1
+                ADMISSION_IN_FLIGHT.labels(self.route).set(self.active)
+                return None
+            if len(self.waiters) >= self.queue_size:
+                lowest = max(self.waiters, key=lambda waiter: waiter.key, default=None)
+                if lowest is None or lowest.key[0] <= rank:
+                    ADMISSION_SHED.labels(self.route, "queue_full").inc()
+                    raise Shed("queue_full")
+                self.waiters.remove(lowest)
+                lowest.outcome = "evicted"
+                shed = lowest
+            waiter = waiter_class(rank, next(self.sequence))
+            self.waiters.append(waiter)
+            ADMISSION_QUEUE_DEPTH.labels(self.route).set(len(self.waiters))
+        if shed is not None:
+            ADMISSION_SHED.labels(self.route, "evicted").inc()
+            shed.wake()
+        return waiter
+
+    def leave_queue(self, waiter, reason="timeout"):
+        """
+        Give up waiting after a timeout, or when the request was cancelled.
+        Returns whether the waiter was admitted meanwhile, and so holds a slot.
+        """
+        with self.lock:
+            if waiter.outcome is not None:
+                return waiter.outcome == "admitted"
+            self.waiters.remove(waiter)
+            ADMISSION_QUEUE_DEPTH.labels(self.route).set(len(self.waiters))
+        ADMISSION_SHED.labels(self.route, reason).inc()
+        return False
+
+    def release(self, elapsed=None):
+        """
+        Free a slot, handing it to the first waiter by priority and arrival.
+        `elapsed` is the service time of the request, `None` if it never ran.
+        """
+        with self.lock:
+            if elapsed is not None:
+                self.service_time += SERVICE_TIME_WEIGHT * (elapsed - self.service_time)
+            if not self.waiters:
+                self.active -= 1
+                ADMISSION_IN_FLIGHT.labels(self.route).set(self.active)
+                return
+            waiter = min(self.waiters, key=lambda waiter: waiter.key)
+            self.waiters.remove(waiter)
+            ADMISSION_QUEUE_DEPTH.labels(self.route).set(len(self.waiters))
+            waiter.outcome = "admitted"
+        waiter.wake()
+
+    def retry_after(self):
+        """
+        Return the seconds until the current queue has likely been served
+        """
+        with self.lock:
+            backlog = self.active + len(self.waiters)
+            seconds = backlog * self.service_time / max(self.concurrency, 1)
+        return min(max(math.ceil(seconds), 1), RETRY_AFTER_MAX)
+
+
+class HeldContent:
+    """
+    Iterator over a streamed body, releasing the slot of its request once the
+    body is sent or the response is closed
+    """
+
+    def __init__(self, content, release):
+        self.content = iter(content)
+        self.release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.content)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        """
+        Release the slot, once; called by the response when it is closed
+        """
+        release, self.release = self.release, None
+        if release is not None:
+            release()
+
+
+class AdmissionMiddleware:
+    """
+    Limit the concurrent requests of each route, queueing or shedding the excess
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.routes = getattr(settings, "BLOG_ADMISSION_ROUTES", {})
+        self.exempt = set(getattr(settings, "BLOG_ADMISSION_EXEMPT", ()))
+        self.timeout = getattr(settings, "BLOG_ADMISSION_QUEUE_TIMEOUT", 5)
+        self.status = getattr(settings, "BLOG_ADMISSION_STATUS", 503)
+        self.limiters = {}
+        self.lock = threading.Lock()
+
+    def limiter(self, request):
+        """
+        Return the limiter of the route of `request`, or `None` if it is not limited
+        """
+        try:
+            match = resolve(request.path_info, getattr(request, "urlconf", None))
+        except Resolver404:
+            return None
+        route = match.url_name or match.view_name
+        route = route.removeprefix("async-")
+        if route in self.exempt:
+            return None
+        limiter = self.limiters.get(route)
+        if limiter is None:
+            config = self.routes.get(route, self.routes.get("*"))
+            if config is None:
+                return None
+            with self.lock:
+                limiter = self.limiters.setdefault(
+                    route,
+                    RouteLimiter(
+                        route,
+                        config["concurrency"],
+                        config["queue"],
+                        config.get("streaming", False),
+                    ),
+                )
+        return limiter
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        limiter = self.limiter(request)
+        if limiter is None:
+            return self.get_response(request)
+        started = time.perf_counter()
+        try:
+            waiter = limiter.enter(Waiter, priority(request))
+            if waiter is not None:
+                self.admit(limiter, waiter, waiter.wait(self.timeout), started)
+        except Shed:
+            return self.shed(limiter)
+        admitted_at = time.perf_counter()
+        held = False
+        try:
+            response = self.get_response(request)
+            held = self.hold(limiter, response, admitted_at)
+            return response
+        finally:
+            if not held:
+                limiter.release(time.perf_counter() - admitted_at)
+
+    async def __acall__(self, request):
+        limiter = self.limiter(request)
+        if limiter is None:
+            return await self.get_response(request)
+        started = time.perf_counter()
+        try:
+            waiter = limiter.enter(AsyncWaiter, priority(request))
+            if waiter is not None:
+                try:
+                    woken = await waiter.wait(self.timeout)
+                except asyncio.CancelledError:
+                    # The client disconnected: free the slot it may have been given
+                    if limiter.leave_queue(waiter, "cancelled"):
+                        limiter.release()
+                    raise
+                self.admit(limiter, waiter, woken, started)
+        except Shed:
+            return self.shed(limiter)
+        admitted_at = time.perf_counter()
+        held = False
+        try:
+            response = await self.get_response(request)
+            held = self.hold(limiter, response, admitted_at)
+            return response
+        finally:
+            if not held:
+                limiter.release(time.perf_counter() - admitted_at)
+
+    def hold(self, limiter, response, admitted_at):
+        """
+        Keep the slot of a streaming route until the body of `response` is sent.
+        Returns whether the slot is now released by the body instead.
+        """
+        if not (limiter.streaming and response.streaming) or response.is_async:
+            return False
+        response.streaming_content = HeldContent(
+            response.streaming_content,
+            lambda: limiter.release(time.perf_counter() - admitted_at),
+        )
+        return True
+
+    def admit(self, limiter, waiter, woken, started):
+        """
+        Settle the outcome of a wait.
+        Raises:
+            Shed: If the request was evicted or waited too long.
+        """
+        if not woken and not limiter.leave_queue(waiter):
+            raise Shed("timeout")
+        if waiter.outcome != "admitted":
+            raise Shed(waiter.outcome)
+        ADMISSION_WAIT_SECONDS.labels(limiter.route).observe(
+            time.perf_counter() - started
+        )
+
+    def shed(self, limiter):
+        """
+        Return the response of a request that was not admitted
+        """
+        response = JsonResponse(
+            {"detail": "The server is busy, please retry later."}, status=self.status
+        )
+        response["Retry-After"] = str(limiter.retry_after())
+        return response
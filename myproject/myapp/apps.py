@@ -7,3 +7,8 @@ class MyappConfig(AppConfig):
 
     default_auto_field = "django.db.models.BigAutoField"
     name = "myapp"
+
+    def ready(self):
+        """Connect the model signal receivers and register the background tasks"""
+        # pylint: disable-next=import-outside-toplevel,unused-import
+        from . import search, signals, stats
@@ -0,0 +1,232 @@
+"""
+Async variants of the Blog read endpoints.
+
+Under ASGI the list, retrieve and date filter endpoints are served by coroutine
+views, so a request waiting on the database does not hold a worker thread. They
+run the same pipeline as `BlogViewSet`: content negotiation, authentication with
+the same classes (awaited when they support it, as the JWT classes do, else run
+in a thread), permission checks, conditional GET and the response cache.
+Queries are built by the viewset and evaluated with the async ORM; other
+methods on the same URLs fall back to the sync viewset. `blog_events` streams the
+changes made through the viewset as Server-Sent Events.
+"""
+
+from asgiref.sync import sync_to_async
+from django.db import DatabaseError
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import permissions
+from rest_framework.exceptions import MethodNotAllowed, NotFound
+from rest_framework.response import Response
+
+from . import events, routing
+from .cache import acache_response
+from .conditional import aconditional_response
+from .middleware import timed
+from .views import BlogViewSet
+
+
+class AsyncBlogViewSet(BlogViewSet):
+    """
+    Coroutine implementation of the `BlogViewSet` read actions
+    """
+
+    @classmethod
+    def as_async_view(cls, actions, fallback=None, **initkwargs):
+        """
+        Return an async view serving the GET action in `actions`.
+        Requests with other methods are passed to the sync `fallback` view.
+        """
+        actions = {"head": actions["get"], **actions}
+
+        async def view(request, *args, **kwargs):
+            if request.method.lower() not in actions and fallback is not None:
+                return await sync_to_async(fallback)(request, *args, **kwargs)
+            self = cls(action_map=actions, **initkwargs)
+            return await self.adispatch(request, *args, **kwargs)
+
+        view = csrf_exempt(view)
+        view.actions = actions
+        return view
+
+    async def adispatch(self, request, *args, **kwargs):
+        """
+        Async variant of `dispatch`
+        """
+        with routing.request_scope():
+            try:
+                return await self.ahandle(request, *args, **kwargs)
+            except DatabaseError:
+                if not routing.replica_failed():
+                    raise
+        with routing.request_scope():
+            return await self.ahandle(request, *args, **kwargs)
+
+    async def ahandle(self, request, *args, **kwargs):
+        """
+        Run the request through the async pipeline and render its response
+        """
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.ainitial(request, *args, **kwargs)
+            if self.action is None:
+                raise MethodNotAllowed(request.method)
+            handler = self.aretrieve if self.detail else self.alist
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            response = self.handle_exception(exc)
+
+        response = self.finalize_response(request, response, *args, **kwargs)
+        return rendered(response)
+
+    async def ainitial(self, request, *args, **kwargs):
+        """
+        Async variant of `initial`
+        """
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+        neg = self.perform_content_negotiation(request)
+        request.accepted_renderer, request.accepted_media_type = neg
+        version, scheme = self.determine_version(request, *args, **kwargs)
+        request.version, request.versioning_scheme = version, scheme
+
+        await self.aperform_authentication(request)
+        await self.acheck_permissions(request)
+        self.check_throttles(request)
+        if (
+            routing.replicas()
+            and request.method in permissions.SAFE_METHODS
+            and self.action not in self.primary_read_actions
+        ):
+            alias = await sync_to_async(routing.choose_read_alias)(request.user)
+            routing.use_replica(alias)
+
+    async def aperform_authentication(self, request):
+        """
+        Authenticate the request, awaiting authenticators that support it.
+        Mirrors `Request._authenticate` so the user is never loaded lazily.
+        """
+        # pylint: disable=protected-access
+        for authenticator in request.authenticators:
+            authenticate = getattr(authenticator, "aauthenticate", None)
+            if authenticate is None:
+                authenticate = sync_to_async(authenticator.authenticate)
+            try:
+                user_auth_tuple = await authenticate(request)
+            except Exception:
+                request._not_authenticated()
+                raise
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+        request._not_authenticated()
+
+    async def acheck_permissions(self, request):
+        """
+        Async variant of `check_permissions`.
+        Permissions may define `ahas_permission`; the others are called directly.
+        """
+        for permission in self.get_permissions():
+            has_permission = getattr(permission, "ahas_permission", None)
+            if has_permission is not None:
+                allowed = await has_permission(request, self)
+            else:
+                allowed = permission.has_permission(request, self)
+            if not allowed:
+                self.permission_denied(
+                    request,
+                    message=getattr(permission, "message", None),
+                    code=getattr(permission, "code", None),
+                )
+
+    @aconditional_response
+    @acache_response
+    async def alist(self, request, *args, **kwargs):
+        """
+        Async variant of `list` and the date filter actions
+        """
+        queryset = self.get_serializer().rows(self.get_read_queryset())
+        page_queryset = None
+        if self.paginator is not None:
+            page_queryset = self.paginator.get_page_queryset(queryset, request, self)
+
+        if page_queryset is not None:
+            page = self.paginator.build_page([row async for row in page_queryset])
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        rows = [row async for row in queryset]
+        return Response(self.get_serializer(rows, many=True).data)
+
+    @aconditional_response
+    @acache_response
+    async def aretrieve(self, request, *args, **kwargs):
+        """
+        Async variant of `retrieve`
+        """
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            **{self.lookup_field: kwargs[lookup_url_kwarg]}
+        )
+        serializer = self.get_serializer()
+        row = await serializer.rows(queryset).afirst()
+        if row is None:
+            raise NotFound()
+        return Response(serializer.row_to_representation(row))
+
+
+def rendered(response):
+    """
+    Render a DRF response into a plain `HttpResponse`.
+    The ASGI handler renders template responses in a worker thread; rendering
+    here keeps the whole request on the event loop.
+    """
+    if not hasattr(response, "render"):
+        return response
+    with timed("render"):
+        response.render()
+    http_response = HttpResponse(response.content, status=response.status_code)
+    for header, value in response.items():
+        http_response[header] = value
+    return http_response
+
+
+@require_GET
+async def blog_events(request):
+    """
+    Stream the blogs created, updated and deleted as Server-Sent Events.
+    Query Params:
+        author (int): Only stream the events of the blogs of this author.
+    Headers:
+        Last-Event-ID: Id of the last event received, to resume after it.
+    Returns:
+        StreamingHttpResponse: Never ending `text/event-stream`, or 503 when
+        the process serves `BLOG_EVENTS_MAX_SUBSCRIBERS` streams already.
+    """
+    author = request.GET.get("author")
+    if author is not None:
+        if not author.isdigit():
+            return JsonResponse(
+                {"author": ["A valid integer is required."]}, status=400
+            )
+        author = int(author)
+    if events.broker.subscribers >= settings.BLOG_EVENTS_MAX_SUBSCRIBERS:
+        response = JsonResponse(
+            {"detail": "Too many event streams, please retry later."}, status=503
+        )
+        response["Retry-After"] = str(events.RETRY_MILLISECONDS // 1000)
+        return response
+    response = StreamingHttpResponse(
+        events.broker.stream(request.headers.get("Last-Event-ID"), author),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    # Ask nginx not to buffer the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
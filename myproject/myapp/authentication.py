@@ -0,0 +1,258 @@
+"""
+JWT authentication for the Blog API.
+
+`AsyncJWTAuthentication` behaves exactly like simplejwt's `JWTAuthentication`
+when called synchronously, and adds `aauthenticate`, which loads the user with
+the async ORM so an async view never blocks on the database.
+
+`CachedJWTAuthentication` resolves users through a bounded in-process LRU cache
+with a TTL, so authenticated requests usually skip the `auth_user` query. Saving
+or deleting a user evicts it from the cache of the process that wrote it; other
+processes see the change once their entry expires (`BLOG_AUTH_USER_CACHE_TTL`).
+With `BLOG_AUTH_STATELESS_READS`, safe requests are authenticated from the token
+alone, as simplejwt's `TokenUser`, without any user lookup.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .metrics import AUTH_USER_CACHE_LOOKUPS
+
+
+class UserCache:
+    """
+    Thread-safe LRU cache of users by id, whose entries expire after a TTL
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @property
+    def maxsize(self):
+        """
+        Maximum number of cached users
+        """
+        return getattr(settings, "BLOG_AUTH_USER_CACHE_SIZE", 10000)
+
+    @property
+    def ttl(self):
+        """
+        Lifetime of cached users in seconds
+        """
+        return getattr(settings, "BLOG_AUTH_USER_CACHE_TTL", 60)
+
+    def get(self, user_id):
+        """
+        Return a copy of the cached user with id `user_id`, or `None`.
+        Copies keep requests from sharing mutable model instances.
+        """
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at <= now:
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+        return copy.copy(user)
+
+    def set(self, user_id, user):
+        """
+        Cache `user`, evicting the least recently used users beyond `maxsize`
+        """
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl
+        with self.lock:
+            self.entries[user_id] = (copy.copy(user), expires_at)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        """
+        Drop the cached user with id `user_id`
+        """
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        """
+        Drop every cached user
+        """
+        with self.lock:
+            self.entries.clear()
+
+
+user_cache = UserCache()
+
+
+class AsyncJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication with an async code path
+    """
+
+    def authenticate(self, request):
+        validated_token = self.get_request_token(request)
+        if validated_token is None:
+            return None
+        return self.get_user(validated_token), validated_token
+
+    async def aauthenticate(self, request):
+        """
+        Async variant of `authenticate`.
+        Token parsing and validation are CPU only and shared with the sync path.
+        """
+        validated_token = self.get_request_token(request)
+        if validated_token is None:
+            return None
+        return await self.aget_user(validated_token), validated_token
+
+    def get_request_token(self, request):
+        """
+        Return the validated token of `request`, or `None` if it carries no JWT
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        return self.get_validated_token(raw_token)
+
+    def get_user(self, validated_token):
+        user = self.load_user(self.get_user_id(validated_token))
+        self.check_user(user, validated_token)
+        return user
+
+    async def aget_user(self, validated_token):
+        """
+        Async variant of `get_user`, with the same checks and error codes
+        """
+        user = await self.aload_user(self.get_user_id(validated_token))
+        self.check_user(user, validated_token)
+        return user
+
+    def get_user_id(self, validated_token):
+        """
+        Return the user id claim of `validated_token`
+        """
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as exc:
+            raise InvalidToken(
+                _("Token contained no recognizable user identification")
+            ) from exc
+
+    def load_user(self, user_id):
+        """
+        Load the user with id `user_id` from the database
+        """
+        try:
+            return self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist as exc:
+            raise AuthenticationFailed(
+                _("User not found"), code="user_not_found"
+            ) from exc
+
+    async def aload_user(self, user_id):
+        """
+        Async variant of `load_user`
+        """
+        try:
+            return await self.user_model.objects.aget(
+                **{api_settings.USER_ID_FIELD: user_id}
+            )
+        except self.user_model.DoesNotExist as exc:
+            raise AuthenticationFailed(
+                _("User not found"), code="user_not_found"
+            ) from exc
+
+    def check_user(self, user, validated_token):
+        """
+        Reject inactive users and tokens issued before a password change
+        """
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+
+class CachedJWTAuthentication(AsyncJWTAuthentication):
+    """
+    JWT authentication resolving users through `user_cache`
+    """
+
+    def authenticate(self, request):
+        validated_token = self.get_request_token(request)
+        if validated_token is None:
+            return None
+        if self.is_stateless(request):
+            return self.get_token_user(validated_token), validated_token
+        return self.get_user(validated_token), validated_token
+
+    async def aauthenticate(self, request):
+        validated_token = self.get_request_token(request)
+        if validated_token is None:
+            return None
+        if self.is_stateless(request):
+            return self.get_token_user(validated_token), validated_token
+        return await self.aget_user(validated_token), validated_token
+
+    def is_stateless(self, request):
+        """
+        Whether `request` is authenticated from its token alone
+        """
+        return (
+            getattr(settings, "BLOG_AUTH_STATELESS_READS", False)
+            and request.method in SAFE_METHODS
+        )
+
+    def get_token_user(self, validated_token):
+        """
+        Return a user backed by the claims of `validated_token`
+        """
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        return api_settings.TOKEN_USER_CLASS(validated_token)
+
+    def load_user(self, user_id):
+        user = user_cache.get(user_id)
+        if user is not None:
+            AUTH_USER_CACHE_LOOKUPS.labels("hit").inc()
+            return user
+        AUTH_USER_CACHE_LOOKUPS.labels("miss").inc()
+        user = super().load_user(user_id)
+        user_cache.set(user_id, user)
+        return user
+
+    async def aload_user(self, user_id):
+        user = user_cache.get(user_id)
+        if user is not None:
+            AUTH_USER_CACHE_LOOKUPS.labels("hit").inc()
+            return user
+        AUTH_USER_CACHE_LOOKUPS.labels("miss").inc()
+        user = await super().aload_user(user_id)
+        user_cache.set(user_id, user)
+        return user
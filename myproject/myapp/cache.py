@@ -0,0 +1,222 @@
+"""
+Versioned response cache for the Blog read endpoints.
+
+Cached responses are keyed on the action, the URL kwargs, the normalized query
+params and a per-collection version number. Writes bump the version instead of
+deleting entries, so stale responses are never served and no key scanning is
+needed; old entries simply expire. Only the basic cache API is used, so any
+Django cache backend works, including locmem and file-based caches.
+"""
+
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import routing
+from .metrics import BLOG_CACHE_HITS, BLOG_CACHE_MISSES
+
+
+class ResponseCache:
+    """
+    Cache of serialized response data for one collection of resources
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.version_key = f"{collection}:version"
+        self.changed_at_key = f"{collection}:changed_at"
+
+    @property
+    def cache(self):
+        """
+        The configured Django cache, resolved on every use so settings overrides apply
+        """
+        return caches[getattr(settings, "BLOG_CACHE_ALIAS", "default")]
+
+    @property
+    def timeout(self):
+        """
+        Lifetime of cached responses in seconds
+        """
+        return getattr(settings, "BLOG_CACHE_TIMEOUT", 300)
+
+    def version(self):
+        """
+        Return the current collection version.
+        A missing version (first use or evicted) starts from the current time in
+        milliseconds, so it never falls back to a value used by older entries.
+        """
+        version = self.cache.get(self.version_key)
+        if version is None:
+            self.cache.add(self.version_key, int(time.time() * 1000), timeout=None)
+            version = self.cache.get(self.version_key)
+        return version
+
+    async def aversion(self):
+        """
+        Async variant of `version`
+        """
+        version = await self.cache.aget(self.version_key)
+        if version is None:
+            await self.cache.aadd(
+                self.version_key, int(time.time() * 1000), timeout=None
+            )
+            version = await self.cache.aget(self.version_key)
+        return version
+
+    def bump(self):
+        """
+        Move the collection to a new version, invalidating every cached response
+        """
+        try:
+            self.cache.incr(self.version_key)
+        except ValueError:
+            self.cache.set(self.version_key, int(time.time() * 1000), timeout=None)
+        self.cache.set(self.changed_at_key, time.time(), timeout=None)
+
+    def changed_at(self):
+        """
+        Return the timestamp of the last write to the collection.
+        When unknown it is assumed to be now, which is the safe answer for
+        conditional requests.
+        """
+        changed_at = self.cache.get(self.changed_at_key)
+        if changed_at is None:
+            self.cache.add(self.changed_at_key, time.time(), timeout=None)
+            changed_at = self.cache.get(self.changed_at_key)
+        return changed_at
+
+    async def achanged_at(self):
+        """
+        Async variant of `changed_at`
+        """
+        changed_at = await self.cache.aget(self.changed_at_key)
+        if changed_at is None:
+            await self.cache.aadd(self.changed_at_key, time.time(), timeout=None)
+            changed_at = await self.cache.aget(self.changed_at_key)
+        return changed_at
+
+    def bump_on_commit(self):
+        """
+        Bump the version once the current transaction commits
+        """
+        transaction.on_commit(self.bump)
+
+    def make_key(self, request, action, kwargs):
+        """
+        Build the cache key of a read request
+        """
+        return (
+            f"{self.collection}:{self.version()}:{self.digest(request, action, kwargs)}"
+        )
+
+    async def amake_key(self, request, action, kwargs):
+        """
+        Async variant of `make_key`
+        """
+        version = await self.aversion()
+        return f"{self.collection}:{version}:{self.digest(request, action, kwargs)}"
+
+    def digest(self, request, action, kwargs):
+        """
+        Hash the parts of a read request that select its response.
+        The active timezone is part of the key since it shifts day boundaries
+        and the rendering of datetimes.
+        """
+        params = sorted(
+            (name, [value for value in request.query_params.getlist(name) if value])
+            for name in request.query_params
+        )
+        parts = [
+            request.get_host(),
+            timezone.get_current_timezone_name(),
+            action,
+            repr(sorted(kwargs.items())),
+            repr([(name, values) for name, values in params if values]),
+        ]
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Return the cached response data for `key`, or `None`
+        """
+        return self.cache.get(key)
+
+    def set(self, key, data):
+        """
+        Store response data under `key`, unless it was read from a replica that
+        may not have replayed the last write yet
+        """
+        if routing.read_alias() is not None and routing.may_be_stale(self.changed_at()):
+            return
+        self.cache.set(key, data, timeout=self.timeout)
+
+    async def aget(self, key):
+        """
+        Async variant of `get`
+        """
+        return await self.cache.aget(key)
+
+    async def aset(self, key, data):
+        """
+        Async variant of `set`
+        """
+        if routing.read_alias() is not None and routing.may_be_stale(
+            await self.achanged_at()
+        ):
+            return
+        await self.cache.aset(key, data, timeout=self.timeout)
+
+
+blog_cache = ResponseCache("blogs")
+
+
+def cache_response(view_method):
+    """
+    Serve a viewset read method from `blog_cache`, storing successful responses
+    """
+
+    @wraps(view_method)
+    def wrapper(view, request, *args, **kwargs):
+        key = blog_cache.make_key(request, view.action, kwargs)
+        data = blog_cache.get(key)
+        if data is not None:
+            BLOG_CACHE_HITS.labels(view.action).inc()
+            return Response(data)
+
+        BLOG_CACHE_MISSES.labels(view.action).inc()
+        response = view_method(view, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            blog_cache.set(key, response.data)
+        return response
+
+    return wrapper
+
+
+def acache_response(view_method):
+    """
+    Async variant of `cache_response` for coroutine view methods
+    """
+
+    @wraps(view_method)
+    async def wrapper(view, request, *args, **kwargs):
+        key = await blog_cache.amake_key(request, view.action, kwargs)
+        data = await blog_cache.aget(key)
+        if data is not None:
+            BLOG_CACHE_HITS.labels(view.action).inc()
+            return Response(data)
+
+        BLOG_CACHE_MISSES.labels(view.action).inc()
+        response = await view_method(view, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            await blog_cache.aset(key, response.data)
+        return response
+
+    return wrapper
@@ -0,0 +1,212 @@
+"""
+Incremental change feed of the Blog corpus.
+
+Clients sync by calling the `changes` action with the cursor returned by their
+previous call. Each call returns the blogs created or modified since that
+cursor, and tombstones of the blogs deleted since then, in change order and at
+most `batch_size` of them, so a sync costs in proportion to the changes rather
+than to the table size. The feed is read with two index range scans, on
+`(modified_at, id)` of the blog table and `(deleted_at, blog_id)` of the
+tombstones, merged in Python.
+
+Deletions done through the API (`perform_destroy` and bulk delete) write a
+`BlogTombstone` in their transaction; rows deleted by other means, such as the
+admin or a cascade from a deleted user, leave no tombstone.
+
+Cursors are monotonic: a change position is `(timestamp, id, kind)`, and a feed
+only returns changes older than `BLOG_CHANGES_SETTLE_SECONDS`, so transactions
+that took their timestamp earlier but committed later are not skipped. Once
+a client is up to date, its cursor moves to that horizon. Tombstones are
+pruned after `BLOG_CHANGES_TOMBSTONE_DAYS`; older cursors are answered with
+`410 Gone`, and the client must sync again from the start.
+"""
+
+import heapq
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+
+from .models import BlogTombstone
+from .serializers import DATETIME_FIELD
+
+# Kinds of change, ordering a blog before a tombstone of the same position
+UPSERT = 0
+DELETE = 1
+
+
+class CursorExpired(APIException):
+    """
+    The cursor predates the tombstones still kept
+    """
+
+    status_code = status.HTTP_410_GONE
+    default_detail = "This cursor has expired, sync again from the start."
+    default_code = "cursor_expired"
+
+
+def encode_cursor(position):
+    """
+    Return the opaque cursor of a `(timestamp, id, kind)` position
+    """
+    timestamp, pk, kind = position
+    raw = f"{timestamp.isoformat()}|{pk}|{kind}"
+    return urlsafe_b64encode(raw.encode("ascii")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Return the `(timestamp, id, kind)` position of a cursor.
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = urlsafe_b64decode(padded.encode("ascii")).decode("ascii")
+        timestamp, pk, kind = raw.split("|")
+        position = parse_datetime(timestamp), int(pk), int(kind)
+    except (BinasciiError, UnicodeError, ValueError) as exc:
+        raise ValueError("Invalid cursor.") from exc
+    if position[0] is None or timezone.is_naive(position[0]):
+        raise ValueError("Invalid cursor.")
+    return position
+
+
+class ChangesParamsSerializer(serializers.Serializer):
+    """
+    Query params of the changes endpoint
+    """
+
+    # pylint: disable=abstract-method
+    cursor = serializers.CharField(required=False)
+    batch_size = serializers.IntegerField(required=False, min_value=1)
+
+    def validate_cursor(self, value):
+        """
+        Decode the cursor into a change position
+        """
+        try:
+            return decode_cursor(value)
+        except ValueError as exc:
+            raise serializers.ValidationError(str(exc)) from exc
+
+    def validate_batch_size(self, value):
+        """
+        Cap the batch size
+        """
+        return min(value, settings.BLOG_CHANGES_MAX_BATCH_SIZE)
+
+
+def after(position, timestamp_field, id_field, kind):
+    """
+    Return the filter of the rows of `kind` positioned after `position`
+    """
+    if position is None:
+        return Q()
+    timestamp, pk, cursor_kind = position
+    same_time = Q(**{timestamp_field: timestamp})
+    later_id = Q(**{f"{id_field}__gt": pk})
+    if kind > cursor_kind:
+        later_id |= Q(**{id_field: pk})
+    return Q(**{f"{timestamp_field}__gt": timestamp}) | (same_time & later_id)
+
+
+def record_deletions(blog_ids):
+    """
+    Write the tombstones of deleted blogs, in the caller's transaction
+    """
+    deleted_at = timezone.now()
+    BlogTombstone.objects.bulk_create(
+        [BlogTombstone(blog_id=pk, deleted_at=deleted_at) for pk in set(blog_ids)],
+        batch_size=settings.BLOG_BULK_BATCH_SIZE,
+    )
+
+
+def prune_tombstones():
+    """
+    Delete the tombstones older than `BLOG_CHANGES_TOMBSTONE_DAYS`
+    Returns:
+        int: Number of deleted tombstones.
+    """
+    deleted, _ = BlogTombstone.objects.filter(
+        deleted_at__lt=timezone.now() - retention()
+    ).delete()
+    return deleted
+
+
+def retention():
+    """
+    Return how long tombstones are kept
+    """
+    return timedelta(days=settings.BLOG_CHANGES_TOMBSTONE_DAYS)
+
+
+def get_changes(serializer, queryset, cursor=None, batch_size=None):
+    """
+    Return the changes of the blogs of `queryset` after the `cursor` position,
+    blogs being represented by `serializer`
+    Raises:
+        CursorExpired: If tombstones after the cursor may have been pruned.
+    Returns:
+        dict: `blogs` and `deleted` ids in change order, the next `cursor`, and
+        whether `more` changes are waiting.
+    """
+    batch_size = batch_size or settings.BLOG_CHANGES_BATCH_SIZE
+    now = timezone.now()
+    if cursor is not None and cursor[0] < now - retention():
+        raise CursorExpired()
+    horizon = now - timedelta(seconds=settings.BLOG_CHANGES_SETTLE_SECONDS)
+
+    rows = serializer.rows(
+        queryset.filter(after(cursor, "modified_at", "id", UPSERT))
+        .filter(modified_at__lt=horizon)
+        .order_by("modified_at", "id")
+    )[: batch_size + 1]
+    tombstones = (
+        BlogTombstone.objects.filter(after(cursor, "deleted_at", "blog_id", DELETE))
+        .filter(deleted_at__lt=horizon)
+        .order_by("deleted_at", "blog_id")
+        .values_list("deleted_at", "blog_id")[: batch_size + 1]
+    )
+    changes = list(
+        islice(
+            heapq.merge(
+                ((row["modified_at"], row["id"], UPSERT, row) for row in rows),
+                ((deleted_at, pk, DELETE, None) for deleted_at, pk in tombstones),
+                key=lambda change: change[:3],
+            ),
+            batch_size + 1,
+        )
+    )
+
+    more = len(changes) > batch_size
+    changes = changes[:batch_size]
+    if more:
+        position = changes[-1][:3]
+    else:
+        # Everything before the horizon has been seen
+        position = (horizon, 0, UPSERT)
+    return {
+        "blogs": [
+            serializer.row_to_representation(row)
+            for _, _, kind, row in changes
+            if kind == UPSERT
+        ],
+        "deleted": [
+            {
+                "id": pk,
+                "deleted_at": DATETIME_FIELD.to_representation(timestamp),
+            }
+            for timestamp, pk, kind, _ in changes
+            if kind == DELETE
+        ],
+        "cursor": encode_cursor(position),
+        "more": more,
+    }
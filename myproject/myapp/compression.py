@@ -0,0 +1,366 @@
+"""
+Negotiated response compression.
+
+`CompressionMiddleware` compresses responses with the best encoding the client
+accepts in `Accept-Encoding`, among gzip and, when their packages are installed,
+brotli (`br`) and Zstandard (`zstd`). Ties between equally acceptable encodings
+go to the first of `BLOG_COMPRESSION_ENCODINGS`, and each encoding is used at
+its level in `BLOG_COMPRESSION_LEVELS`.
+
+Bodies shorter than `BLOG_COMPRESSION_MIN_SIZE` are sent as they are, and so
+are responses that already have a `Content-Encoding`, partial content and
+formats that are compressed already. Streaming responses are compressed chunk
+by chunk, each chunk being flushed so the client receives it without waiting
+for the rest of the stream.
+
+Like Django's `GZipMiddleware`, strong ETags of compressed responses are made
+weak: the bytes differ from the identity representation, while
+`If-None-Match` still matches through the weak comparison it uses. The ETag of
+a `304 Not Modified` answering a client that accepts compression is weakened
+the same way, so it agrees with the compressed response it revalidates. Input
+and output sizes, ratios and the CPU time spent compressing are exported to
+Prometheus, labelled by encoding.
+"""
+
+import time
+import zlib
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from .metrics import (
+    COMPRESSION_CPU_SECONDS,
+    COMPRESSION_INPUT_BYTES,
+    COMPRESSION_OUTPUT_BYTES,
+    COMPRESSION_RATIO,
+)
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+# Content types sent as they are: compressed formats, and event streams whose
+# small, latency sensitive messages gain little
+INCOMPRESSIBLE_TYPES = (
+    "application/gzip",
+    "application/zip",
+    "application/zstd",
+    "application/x-brotli",
+    "audio/",
+    "image/",
+    "video/",
+    "font/woff",
+    "text/event-stream",
+)
+
+
+class GzipCodec:
+    """
+    gzip with zlib
+    """
+
+    name = "gzip"
+    default_level = 6
+
+    def compress(self, data, level):
+        """
+        Return `data` compressed as one gzip member
+        """
+        return zlib.compress(data, level, wbits=31)
+
+    def stream(self, level):
+        """
+        Return `(compress, finish)` callables of an incremental compressor.
+        `compress` returns the compressed bytes of a chunk, flushed.
+        """
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        return (
+            lambda chunk: compressor.compress(chunk)
+            + compressor.flush(zlib.Z_SYNC_FLUSH),
+            compressor.flush,
+        )
+
+
+class BrotliCodec:
+    """
+    brotli, with the `brotli` package
+    """
+
+    name = "br"
+    default_level = 4
+
+    def compress(self, data, level):
+        """
+        Return `data` compressed
+        """
+        return brotli.compress(data, quality=level)
+
+    def stream(self, level):
+        """
+        Return `(compress, finish)` callables of an incremental compressor
+        """
+        compressor = brotli.Compressor(quality=level)
+        return (
+            lambda chunk: compressor.process(chunk) + compressor.flush(),
+            compressor.finish,
+        )
+
+
+class ZstdCodec:
+    """
+    Zstandard, with the `zstandard` package
+    """
+
+    name = "zstd"
+    default_level = 3
+
+    def compress(self, data, level):
+        """
+        Return `data` compressed as one frame
+        """
+        return zstandard.ZstdCompressor(level=level).compress(data)
+
+    def stream(self, level):
+        """
+        Return `(compress, finish)` callables of an incremental compressor
+        """
+        compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        return (
+            lambda chunk: compressor.compress(chunk)
+            + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+            compressor.flush,
+        )
+
+
+def available_codecs():
+    """
+    Return the codecs whose libraries are installed, by encoding name
+    """
+    codecs = [GzipCodec()]
+    if brotli is not None:
+        codecs.append(BrotliCodec())
+    if zstandard is not None:
+        codecs.append(ZstdCodec())
+    return {codec.name: codec for codec in codecs}
+
+
+CODECS = available_codecs()
+
+
+@lru_cache(maxsize=256)
+def parse_accept_encoding(header):
+    """
+    Return the `{coding: quality}` of an `Accept-Encoding` header.
+    Malformed qualities count as 0.
+    """
+    qualities = {}
+    for item in header.split(","):
+        coding, *params = item.split(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = min(max(float(value), 0.0), 1.0)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    return qualities
+
+
+def negotiate(header, encodings):
+    """
+    Return the encoding of `encodings` the `Accept-Encoding` header prefers,
+    the earliest on equal quality, or `None` if it accepts none of them
+    """
+    qualities = parse_accept_encoding(header)
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compressible(response):
+    """
+    Whether the body of `response` may be compressed
+    """
+    if response.has_header("Content-Encoding") or response.status_code == 206:
+        return False
+    content_type = response.get("Content-Type", "").lower()
+    return not content_type.startswith(INCOMPRESSIBLE_TYPES)
+
+
+def weaken_etag(response):
+    """
+    Make a strong ETag of `response` weak
+    """
+    etag = response.get("ETag")
+    if etag and etag.startswith('"'):
+        response.headers["ETag"] = "W/" + etag
+
+
+def observe(encoding, size, compressed_size, cpu_seconds):
+    """
+    Record one compressed body in the Prometheus metrics
+    """
+    COMPRESSION_INPUT_BYTES.labels(encoding).inc(size)
+    COMPRESSION_OUTPUT_BYTES.labels(encoding).inc(compressed_size)
+    COMPRESSION_CPU_SECONDS.labels(encoding).observe(cpu_seconds)
+    if compressed_size:
+        COMPRESSION_RATIO.labels(encoding).observe(size / compressed_size)
+
+
+class CompressedStream:
+    """
+    Incremental compressor of one streaming response, recording its sizes and
+    CPU time in the metrics when the stream ends
+    """
+
+    def __init__(self, codec, level):
+        self.encoding = codec.name
+        self.compressor, self.finisher = codec.stream(level)
+        self.size = 0
+        self.compressed_size = 0
+        self.cpu_seconds = 0.0
+
+    def compress(self, chunk):
+        """
+        Return the compressed bytes of `chunk`
+        """
+        if isinstance(chunk, str):
+            chunk = chunk.encode(settings.DEFAULT_CHARSET)
+        started = time.thread_time()
+        data = self.compressor(bytes(chunk))
+        self.cpu_seconds += time.thread_time() - started
+        self.size += len(chunk)
+        self.compressed_size += len(data)
+        return data
+
+    def finish(self):
+        """
+        Return the end of the compressed stream and observe the metrics
+        """
+        started = time.thread_time()
+        data = self.finisher()
+        self.cpu_seconds += time.thread_time() - started
+        self.compressed_size += len(data)
+        observe(self.encoding, self.size, self.compressed_size, self.cpu_seconds)
+        return data
+
+
+def compress_sequence(chunks, stream):
+    """
+    Yield the compressed chunks of a streaming response
+    """
+    for chunk in chunks:
+        data = stream.compress(chunk)
+        if data:
+            yield data
+    yield stream.finish()
+
+
+async def acompress_sequence(chunks, stream):
+    """
+    Async variant of `compress_sequence`
+    """
+    async for chunk in chunks:
+        data = stream.compress(chunk)
+        if data:
+            yield data
+    yield stream.finish()
+
+
+class CompressionMiddleware:
+    """
+    Compress responses with the encoding negotiated from `Accept-Encoding`
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.encodings = [
+            encoding
+            for encoding in getattr(
+                settings, "BLOG_COMPRESSION_ENCODINGS", ["zstd", "br", "gzip"]
+            )
+            if encoding in CODECS
+        ]
+        levels = getattr(settings, "BLOG_COMPRESSION_LEVELS", {})
+        self.levels = {
+            name: levels.get(name, codec.default_level)
+            for name, codec in CODECS.items()
+        }
+        self.min_size = getattr(settings, "BLOG_COMPRESSION_MIN_SIZE", 1024)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        """
+        Compress the body of `response` if the client accepts it
+        """
+        encoding = negotiate(
+            request.META.get("HTTP_ACCEPT_ENCODING", ""), self.encodings
+        )
+        if response.status_code == 304:
+            if encoding is not None:
+                weaken_etag(response)
+            return response
+        if not compressible(response):
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if encoding is None:
+            return response
+        codec, level = CODECS[encoding], self.levels[encoding]
+
+        if response.streaming:
+            stream = CompressedStream(codec, level)
+            if response.is_async:
+                response.streaming_content = acompress_sequence(
+                    response.streaming_content, stream
+                )
+            else:
+                response.streaming_content = compress_sequence(
+                    response.streaming_content, stream
+                )
+            # The compressed size is only known once the stream has been sent
+            del response.headers["Content-Length"]
+        else:
+            content = response.content
+            started = time.thread_time()
+            compressed = codec.compress(content, level)
+            cpu_seconds = time.thread_time() - started
+            if len(compressed) >= len(content):
+                return response
+            observe(encoding, len(content), len(compressed), cpu_seconds)
+            response.content = compressed
+            response.headers["Content-Length"] = str(len(compressed))
+
+        weaken_etag(response)
+        response.headers["Content-Encoding"] = encoding
+        return response
@@ -0,0 +1,266 @@
+"""
+Conditional GET support for the Blog read endpoints.
+
+Strong ETags and `Last-Modified` are derived from `Blog.modified_at` without
+serializing anything: a detail response is identified by its primary key and
+`modified_at`, a collection by `max(modified_at)`, the row count and the request
+params, and a page of a paginated collection by the ids and `modified_at` of its
+rows. Requests whose validators still match get a 304 without loading rows.
+HTTP dates have no fraction of a second, so `Last-Modified` is only sent, and
+`If-Modified-Since` only honoured, once the second of the last change is over:
+a later change within that second would otherwise carry the same date.
+Validators are memoized in the versioned response cache, so repeated polls of
+an unchanged collection do not touch the database at all.
+"""
+
+import hashlib
+import time
+from functools import wraps
+
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .cache import blog_cache
+
+# Aggregates identifying the state of a whole collection
+SUMMARY = {"last_modified": Max("modified_at"), "count": Count("id")}
+
+
+def detail_queryset(view, kwargs):
+    """
+    Return the `modified_at` values of the blog addressed by the URL kwargs
+    """
+    lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+    return (
+        view.filter_queryset(view.get_queryset())
+        .filter(**{view.lookup_field: kwargs[lookup_url_kwarg]})
+        .values_list("modified_at", flat=True)
+    )
+
+
+def detail_validators(view, kwargs):
+    """
+    Return `(etag_parts, last_modified)` for a single blog, or `None` if it does not exist
+    """
+    return detail_state(view, kwargs, detail_queryset(view, kwargs).first())
+
+
+async def adetail_validators(view, kwargs):
+    """
+    Async variant of `detail_validators`
+    """
+    return detail_state(view, kwargs, await detail_queryset(view, kwargs).afirst())
+
+
+def detail_state(view, kwargs, modified_at):
+    """
+    Build the detail validators from the blog's `modified_at`
+    """
+    if modified_at is None:
+        return None
+    # URL kwargs are strings in the router and ints in the async routes
+    pk = str(kwargs[view.lookup_url_kwarg or view.lookup_field])
+    fieldset = view.get_fieldset()
+    representation = [sorted(fieldset.get("fields") or ()), fieldset.get("excerpt")]
+    return [pk, modified_at.isoformat(), repr(representation)], modified_at.timestamp()
+
+
+def collection_querysets(view):
+    """
+    Return `(page_queryset, queryset)` of the current collection action.
+    Paginated requests are validated against the rows of the requested page only,
+    so their cost stays bounded by the page size; `page_queryset` is `None` otherwise.
+    """
+    queryset = view.get_read_queryset()
+    page_queryset = None
+    if view.paginator is not None:
+        page_queryset = view.paginator.get_page_queryset(queryset, view.request, view)
+    if page_queryset is not None:
+        page_queryset = page_queryset.values_list("id", "modified_at")
+    return page_queryset, queryset
+
+
+def collection_validators(view):
+    """
+    Return `(etag_parts, last_modified)` for the collection the current action reads
+    """
+    page_queryset, queryset = collection_querysets(view)
+    if page_queryset is not None:
+        state = page_state(list(page_queryset))
+    else:
+        state = summary_state(queryset.aggregate(**SUMMARY))
+    return collection_state(view, *state, blog_cache.changed_at())
+
+
+async def acollection_validators(view):
+    """
+    Async variant of `collection_validators`
+    """
+    page_queryset, queryset = collection_querysets(view)
+    if page_queryset is not None:
+        state = page_state([row async for row in page_queryset])
+    else:
+        state = summary_state(await queryset.aaggregate(**SUMMARY))
+    return collection_state(view, *state, await blog_cache.achanged_at())
+
+
+def page_state(rows):
+    """
+    Return `(state, last_modified)` of a page of `(id, modified_at)` rows
+    """
+    last_modified = max((modified_at for _, modified_at in rows), default=None)
+    return [(pk, modified_at.isoformat()) for pk, modified_at in rows], last_modified
+
+
+def summary_state(summary):
+    """
+    Return `(state, last_modified)` of a whole collection from its `SUMMARY`
+    """
+    last_modified = summary["last_modified"]
+    return [
+        summary["count"],
+        last_modified and last_modified.isoformat(),
+    ], last_modified
+
+
+def collection_state(view, state, last_modified, changed_at):
+    """
+    Combine the collection state with the request params and last write time
+    """
+    params = sorted(
+        (name, view.request.query_params.getlist(name))
+        for name in view.request.query_params
+    )
+    # Deletions do not move max(modified_at), so the collection's last write
+    # time bounds Last-Modified from below.
+    timestamp = changed_at
+    if last_modified is not None:
+        timestamp = max(timestamp, last_modified.timestamp())
+    return [*state, repr(params)], timestamp
+
+
+def make_validators(view, request, result):
+    """
+    Turn `(etag_parts, last_modified)` into the `(etag, last_modified)` pair
+    """
+    parts, last_modified = result
+    parts = [
+        view.action,
+        request.accepted_renderer.format,
+        timezone.get_current_timezone_name(),
+        *parts,
+    ]
+    digest = hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()
+    return quote_etag(digest), last_modified
+
+
+def http_last_modified(last_modified):
+    """
+    Return the timestamp `last_modified` in whole seconds, or `None` while that
+    second is not over
+    """
+    seconds = int(last_modified)
+    if seconds >= int(time.time()):
+        return None
+    return seconds
+
+
+def get_validators(view, request, kwargs):
+    """
+    Return the `(etag, last_modified)` of the current read request, or `None`
+    """
+    key = blog_cache.make_key(request, f"validators:{view.action}", kwargs)
+    validators = blog_cache.get(key)
+    if validators is not None:
+        return validators
+
+    if view.detail:
+        result = detail_validators(view, kwargs)
+    else:
+        result = collection_validators(view)
+    if result is None:
+        return None
+
+    validators = make_validators(view, request, result)
+    blog_cache.set(key, validators)
+    return validators
+
+
+async def aget_validators(view, request, kwargs):
+    """
+    Async variant of `get_validators`
+    """
+    key = await blog_cache.amake_key(request, f"validators:{view.action}", kwargs)
+    validators = await blog_cache.aget(key)
+    if validators is not None:
+        return validators
+
+    if view.detail:
+        result = await adetail_validators(view, kwargs)
+    else:
+        result = await acollection_validators(view)
+    if result is None:
+        return None
+
+    validators = make_validators(view, request, result)
+    await blog_cache.aset(key, validators)
+    return validators
+
+
+def add_validators(response, validators):
+    """
+    Set `ETag` and `Last-Modified` on successful and not modified responses
+    """
+    etag, last_modified = validators
+    last_modified = http_last_modified(last_modified)
+    if response.status_code in (200, 304):
+        response.headers.setdefault("ETag", etag)
+        if last_modified is not None:
+            response.headers.setdefault("Last-Modified", http_date(last_modified))
+    return response
+
+
+def conditional_response(view_method):
+    """
+    Answer conditional GETs with 304 and add `ETag` / `Last-Modified` to responses
+    """
+
+    @wraps(view_method)
+    def wrapper(view, request, *args, **kwargs):
+        validators = get_validators(view, request, kwargs)
+        if validators is None:
+            return view_method(view, request, *args, **kwargs)
+
+        etag, last_modified = validators
+        response = get_conditional_response(
+            request, etag=etag, last_modified=http_last_modified(last_modified)
+        )
+        if response is None:
+            response = view_method(view, request, *args, **kwargs)
+        return add_validators(response, validators)
+
+    return wrapper
+
+
+def aconditional_response(view_method):
+    """
+    Async variant of `conditional_response` for coroutine view methods
+    """
+
+    @wraps(view_method)
+    async def wrapper(view, request, *args, **kwargs):
+        validators = await aget_validators(view, request, kwargs)
+        if validators is None:
+            return await view_method(view, request, *args, **kwargs)
+
+        etag, last_modified = validators
+        response = get_conditional_response(
+            request, etag=etag, last_modified=http_last_modified(last_modified)
+        )
+        if response is None:
+            response = await view_method(view, request, *args, **kwargs)
+        return add_validators(response, validators)
+
+    return wrapper
@@ -0,0 +1,246 @@
+"""
+Live stream of Blog changes as Server-Sent Events.
+
+The write actions of `BlogViewSet` publish a `created`, `updated` or `deleted`
+event per blog once their transaction commits. Events are kept in a ring
+buffer of the last `BLOG_EVENTS_BUFFER_SIZE` and fanned out to the clients of
+the `events` endpoint, served through ASGI, so dashboards are pushed changes
+instead of polling the list endpoints.
+
+Subscribers are async generators. Rather than a queue per subscriber, they all
+read the shared buffer, and the subscribers of an event loop wait on a single
+future that is replaced each time an event is published: a publication costs
+one `call_soon_threadsafe` per event loop, however many clients are connected,
+and an idle client costs no thread, only a suspended coroutine. Idle streams
+receive a comment every `BLOG_EVENTS_HEARTBEAT_SECONDS` so proxies keep them
+open and closed connections are noticed.
+
+Event ids combine the epoch of the process and a sequence number. Clients
+reconnecting with `Last-Event-ID` receive the buffered events they missed; if
+those are no longer buffered, were published while nobody was subscribed, or
+the id comes from another process, they receive a `reset` event instead and
+should reload, e.g. through the change feed. The fan-out is per process:
+clients only receive the writes handled by the process they are connected to.
+"""
+
+import asyncio
+import threading
+import uuid
+from collections import deque
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+
+from .metrics import EVENTS_PUBLISHED, EVENTS_RESETS, EVENTS_SUBSCRIBERS
+from .renderers import FastJSONRenderer
+from .serializers import BlogSerializer
+
+CREATED = "created"
+UPDATED = "updated"
+DELETED = "deleted"
+RESET = "reset"
+
+# Milliseconds EventSource clients wait before reconnecting
+RETRY_MILLISECONDS = 3000
+HEARTBEAT = b": keepalive\n\n"
+RESET_BODY = b'{"detail":"Events were missed, reload the blogs."}'
+
+
+def message(event_id, kind, body):
+    """
+    Return the Server-Sent Events message of an event with a JSON `body`
+    """
+    return b"id: %s\nevent: %s\ndata: %s\n\n" % (
+        event_id.encode("ascii"),
+        kind.encode("ascii"),
+        body,
+    )
+
+
+class LoopChannel:
+    """
+    The subscribers of one event loop, woken together by resolving `future`
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.subscribers = 0
+        self.future = loop.create_future()
+
+    def wake(self):
+        """
+        Wake every subscriber of the loop; runs on the loop
+        """
+        future, self.future = self.future, self.loop.create_future()
+        future.set_result(None)
+
+
+class EventBroker:
+    """
+    Buffer of the latest events of this process and registry of the event loops
+    of its subscribers
+    """
+
+    def __init__(self, size=None):
+        self.lock = threading.Lock()
+        self.epoch = uuid.uuid4().hex[:12]
+        self.sequence = 0
+        # (sequence, author id, message) of the latest events
+        self.events = deque(maxlen=size or settings.BLOG_EVENTS_BUFFER_SIZE)
+        self.channels = {}
+        self.subscribers = 0
+
+    def event_id(self, sequence):
+        """
+        Return the `Last-Event-ID` of a position in the stream
+        """
+        return f"{self.epoch}-{sequence}"
+
+    def position(self, last_event_id):
+        """
+        Return the sequence a reconnecting client resumes from, or `None` when
+        the id does not belong to this process
+        """
+        epoch, _, sequence = (last_event_id or "").partition("-")
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        return int(sequence)
+
+    def publish(self, kind, items):
+        """
+        Publish an event per `(author id, data)` item and wake the subscribers.
+        Without subscribers the events are skipped, and the stream records a
+        gap so that clients resuming across it are reset.
+        """
+        if not self.subscribers:
+            with self.lock:
+                self.sequence += 1
+                self.events.clear()
+            return
+        renderer = FastJSONRenderer()
+        items = [(author_id, renderer.render(data)) for author_id, data in items]
+        with self.lock:
+            for author_id, body in items:
+                self.sequence += 1
+                self.events.append(
+                    (
+                        self.sequence,
+                        author_id,
+                        message(self.event_id(self.sequence), kind, body),
+                    )
+                )
+            channels = list(self.channels.values())
+        EVENTS_PUBLISHED.labels(kind).inc(len(items))
+        for channel in channels:
+            try:
+                channel.loop.call_soon_threadsafe(channel.wake)
+            except RuntimeError:
+                # The loop was closed without its subscribers leaving
+                self.leave(channel, channel.subscribers)
+
+    def head(self):
+        """
+        Return the sequence of the latest event
+        """
+        with self.lock:
+            return self.sequence
+
+    def since(self, sequence):
+        """
+        Return the events after `sequence`, whether events were missed since,
+        and the sequence to continue from
+        """
+        with self.lock:
+            first = self.sequence - len(self.events) + 1
+            if sequence is None or not first - 1 <= sequence <= self.sequence:
+                return [], True, self.sequence
+            events = list(islice(self.events, sequence - first + 1, None))
+            return events, False, self.sequence
+
+    def join(self):
+        """
+        Register a subscriber of the running event loop and return its channel
+        """
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            channel = self.channels.get(loop)
+            if channel is None:
+                channel = self.channels[loop] = LoopChannel(loop)
+            channel.subscribers += 1
+            self.subscribers += 1
+        EVENTS_SUBSCRIBERS.inc()
+        return channel
+
+    def leave(self, channel, count=1):
+        """
+        Unregister subscribers of `channel`
+        """
+        with self.lock:
+            if self.channels.get(channel.loop) is not channel:
+                return
+            channel.subscribers -= count
+            self.subscribers -= count
+            if channel.subscribers <= 0:
+                del self.channels[channel.loop]
+        EVENTS_SUBSCRIBERS.dec(count)
+
+    async def stream(self, last_event_id=None, author=None):
+        """
+        Yield the messages of a subscriber: the events after `last_event_id`
+        (all new events without one) of blogs by `author` (all when `None`),
+        and heartbeats while idle
+        """
+        channel = self.join()
+        try:
+            if last_event_id:
+                sequence = self.position(last_event_id)
+            else:
+                sequence = self.head()
+            yield b"retry: %d\n\n" % RETRY_MILLISECONDS
+            heartbeat = settings.BLOG_EVENTS_HEARTBEAT_SECONDS
+            while True:
+                # Taken before reading, so an event published meanwhile wakes us
+                future = channel.future
+                events, missed, sequence = self.since(sequence)
+                if missed:
+                    EVENTS_RESETS.inc()
+                    yield message(self.event_id(sequence), RESET, RESET_BODY)
+                for _, author_id, data in events:
+                    if author is None or author_id == author:
+                        yield data
+                try:
+                    await asyncio.wait_for(asyncio.shield(future), heartbeat)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT
+        finally:
+            self.leave(channel)
+
+
+broker = EventBroker()
+
+
+def publish_on_commit(kind, blogs):
+    """
+    Publish an event of `kind` for each blog once the current transaction commits.
+    Blogs are serialized then, and only if somebody is subscribed.
+    """
+    blogs = list(blogs)
+    transaction.on_commit(
+        lambda: broker.publish(
+            kind, ((blog.author_id, BlogSerializer(blog).data) for blog in blogs)
+        )
+    )
+
+
+def publish_deletions_on_commit(authors):
+    """
+    Publish a `deleted` event per `{blog id: author id}` item once the current
+    transaction commits
+    """
+    authors = dict(authors)
+    transaction.on_commit(
+        lambda: broker.publish(
+            DELETED, ((author_id, {"id": pk}) for pk, author_id in authors.items())
+        )
+    )
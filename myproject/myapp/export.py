@@ -0,0 +1,277 @@
+"""
+Snapshot exports of the Blog corpus.
+
+A snapshot is a gzip-compressed NDJSON file (one blog per line, in the API
+representation) plus a JSON manifest, written to `BLOG_EXPORT_DIR`. Rows are
+streamed from a server-side cursor straight into the compressed file, so memory
+use is bounded whatever the size of the table. Incremental snapshots contain the
+blogs created or modified since the previous snapshot.
+
+A snapshot covers the changes older than `BLOG_EXPORT_SETTLE_SECONDS`, so a
+transaction that took its `modified_at` before the snapshot but commits after it
+is exported by the next incremental snapshot instead of being skipped. Deleted
+blogs never appear in incremental snapshots; consumers learn of deletions from
+the change feed or by loading a full snapshot.
+"""
+
+import gzip
+import hashlib
+import json
+import re
+import threading
+from datetime import timedelta
+from datetime import timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags, quote_etag
+
+from .models import Blog
+from .serializers import BlogSerializer
+
+SNAPSHOT_FORMAT = "ndjson+gzip"
+NAME_RE = re.compile(r"^blogs-\d{8}T\d{12}Z$")
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+_export_lock = threading.Lock()
+
+
+class ExportInProgress(Exception):
+    """
+    Raised when an export is requested while another one is running
+    """
+
+
+def export_dir():
+    """
+    Return the snapshot directory, creating it if needed
+    """
+    directory = Path(settings.BLOG_EXPORT_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+def snapshot_name(until):
+    """
+    Return the name of the snapshot taken at `until`
+    """
+    return "blogs-" + until.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+
+
+def manifest_path(name):
+    """
+    Return the manifest path of snapshot `name`
+    """
+    return export_dir() / f"{name}.manifest.json"
+
+
+def data_path(name):
+    """
+    Return the data file path of snapshot `name`
+    """
+    return export_dir() / f"{name}.ndjson.gz"
+
+
+def list_manifests():
+    """
+    Return the manifests of all completed snapshots, oldest first
+    """
+    manifests = []
+    for path in sorted(export_dir().glob("blogs-*.manifest.json")):
+        with path.open(encoding="utf-8") as manifest_file:
+            manifests.append(json.load(manifest_file))
+    return manifests
+
+
+def get_manifest(name):
+    """
+    Return the manifest of snapshot `name`, or `None` if it does not exist
+    """
+    if not NAME_RE.match(name):
+        return None
+    path = manifest_path(name)
+    if not path.exists():
+        return None
+    with path.open(encoding="utf-8") as manifest_file:
+        return json.load(manifest_file)
+
+
+def watermark():
+    """
+    Return the default end of a snapshot: the changes since may belong to
+    transactions that have not committed yet
+    """
+    settle = getattr(settings, "BLOG_EXPORT_SETTLE_SECONDS", 2)
+    return timezone.now() - timedelta(seconds=settle)
+
+
+def export_snapshot(incremental=False, until=None, chunk_size=2000):
+    """
+    Write a snapshot of the blogs modified up to `until` (default: `watermark()`).
+    With `incremental`, only blogs modified since the previous snapshot are
+    written; deletions are not. Returns the manifest.
+    """
+    until = until or watermark()
+    since = None
+    if incremental:
+        previous = list_manifests()
+        if previous:
+            since = parse_datetime(previous[-1]["until"])
+
+    queryset = Blog.objects.filter(modified_at__lte=until).order_by("id")
+    if since is not None:
+        queryset = queryset.filter(modified_at__gt=since)
+
+    name = snapshot_name(until)
+    path = data_path(name)
+    partial_path = path.with_suffix(".partial")
+    serializer = BlogSerializer()
+    digest = hashlib.sha256()
+    rows = 0
+
+    with partial_path.open("wb") as raw_file:
+        with gzip.GzipFile(fileobj=_HashingWriter(raw_file, digest), mode="wb") as out:
+            for row in serializer.rows(queryset).iterator(chunk_size=chunk_size):
+                line = json.dumps(serializer.row_to_representation(row))
+                out.write(line.encode("utf-8") + b"\n")
+                rows += 1
+    partial_path.replace(path)
+
+    manifest = {
+        "name": name,
+        "format": SNAPSHOT_FORMAT,
+        "kind": "incremental" if incremental else "full",
+        "since": since.isoformat() if since else None,
+        "until": until.isoformat(),
+        "rows": rows,
+        "file": path.name,
+        "bytes": path.stat().st_size,
+        "sha256": digest.hexdigest(),
+        "fields": list(BlogSerializer.Meta.fields),
+        "created_at": timezone.now().isoformat(),
+    }
+    with manifest_path(name).open("w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    return manifest
+
+
+def start_export(incremental=False):
+    """
+    Start a snapshot export in a background thread and return its name.
+    Raises:
+        ExportInProgress: If another export is still running in this process.
+    """
+    if not _export_lock.acquire(blocking=False):
+        raise ExportInProgress("An export is already running.")
+    until = watermark()
+
+    def run():
+        try:
+            export_snapshot(incremental=incremental, until=until)
+        finally:
+            connection.close()
+            _export_lock.release()
+
+    threading.Thread(target=run, name="blog-export", daemon=True).start()
+    return snapshot_name(until)
+
+
+def snapshot_response(request, manifest):
+    """
+    Serve a snapshot file, honouring single `Range` requests and `If-Range`
+    """
+    path = export_dir() / manifest["file"]
+    size = path.stat().st_size
+    etag = quote_etag(manifest["sha256"])
+
+    byte_range = _parse_range(request, size, etag)
+    if byte_range == "unsatisfiable":
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+    elif byte_range is None:
+        response = FileResponse(
+            path.open("rb"), as_attachment=True, content_type="application/gzip"
+        )
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _read_range(path, start, end), status=206, content_type="application/gzip"
+        )
+        response["Content-Length"] = str(end - start + 1)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Disposition"] = f'attachment; filename="{path.name}"'
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    return response
+
+
+def _parse_range(request, size, etag):
+    """
+    Return `(start, end)` for a satisfiable single range, `"unsatisfiable"`, or
+    `None` to send the whole file
+    """
+    header = request.META.get("HTTP_RANGE")
+    if not header:
+        return None
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if if_range and etag not in parse_etags(if_range):
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return "unsatisfiable"
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return "unsatisfiable"
+    return start, end
+
+
+def _read_range(path, start, end):
+    """
+    Yield the bytes of `path` from `start` to `end` inclusive
+    """
+    with path.open("rb") as data_file:
+        data_file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = data_file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+class _HashingWriter:
+    """
+    File wrapper hashing everything written through it
+    """
+
+    def __init__(self, raw_file, digest):
+        self.raw_file = raw_file
+        self.digest = digest
+
+    def write(self, data):
+        """
+        Hash and write `data`
+        """
+        self.digest.update(data)
+        return self.raw_file.write(data)
+
+    def flush(self):
+        """
+        Flush the underlying file
+        """
+        self.raw_file.flush()
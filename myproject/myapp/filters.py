@@ -0,0 +1,163 @@
+"""
+Declarative filters for Blog querysets.
+
+Every read endpoint accepts the same query params: `author`, `date`,
+`start_date`/`end_date`, `created_after`, `created_before`, and the full-text
+params `q` and `title`. They are validated by `BlogFilterSerializer`, so bad
+input is a 400, and combined into one query: all date params collapse into a
+single half-open `[start, end)` range on the raw `created_at` column, which the
+database answers with an index range scan (on `(author, created_at)` when an
+author is given).
+
+The old date endpoints are aliases that rename their `date` param and make it
+required. Parsed filter specs are cached, so repeated identical queries skip
+validation entirely.
+"""
+
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+from types import MappingProxyType
+
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from . import search
+
+DATE_FORMATS = ["%Y-%m-%d"]
+
+# Params of the date endpoints, mapped to the filter they stand for
+ALIASES = {
+    "by_date": {"date": "date"},
+    "by_date_range": {"start_date": "start_date", "end_date": "end_date"},
+    "created_after_date": {"date": "created_after"},
+    "created_before_date": {"date": "created_before"},
+}
+
+
+class BlogFilterSerializer(serializers.Serializer):
+    """
+    Query params accepted by the Blog read endpoints
+    """
+
+    # pylint: disable=abstract-method
+    author = serializers.IntegerField(required=False, min_value=1)
+    date = serializers.DateField(required=False, input_formats=DATE_FORMATS)
+    start_date = serializers.DateField(required=False, input_formats=DATE_FORMATS)
+    end_date = serializers.DateField(required=False, input_formats=DATE_FORMATS)
+    created_after = serializers.DateField(required=False, input_formats=DATE_FORMATS)
+    created_before = serializers.DateField(required=False, input_formats=DATE_FORMATS)
+    q = serializers.CharField(required=False, max_length=200)
+    title = serializers.CharField(required=False, max_length=200)
+
+    def validate(self, attrs):
+        start_date, end_date = attrs.get("start_date"), attrs.get("end_date")
+        if start_date and end_date and start_date > end_date:
+            raise ValidationError({"end_date": ["Must not be before start_date."]})
+        return attrs
+
+
+FILTER_PARAMS = frozenset(BlogFilterSerializer().fields)
+
+
+def get_filter_spec(action, query_params):
+    """
+    Return the validated filters of a request as a read-only mapping.
+    Blank params are ignored, like in the response cache key.
+    Raises:
+        ValidationError: When a param is invalid, or a date endpoint misses its params.
+    """
+    names = FILTER_PARAMS.union(ALIASES.get(action, ()))
+    items = tuple(
+        sorted(
+            (name, query_params[name])
+            for name in names
+            if query_params.get(name, "") != ""
+        )
+    )
+    return parse_filter_spec(action, items)
+
+
+@lru_cache(maxsize=1024)
+def parse_filter_spec(action, items):
+    """
+    Validate `(name, value)` params of `action`; memoized per distinct input.
+    Errors are raised, so they are never cached.
+    """
+    params = dict(items)
+    aliases = ALIASES.get(action, {})
+    data = {name: value for name, value in params.items() if name not in aliases}
+    errors = {}
+    for param, target in aliases.items():
+        if param in params:
+            data[target] = params[param]
+        else:
+            errors[param] = [serializers.Field.default_error_messages["required"]]
+
+    serializer = BlogFilterSerializer(data=data)
+    if not serializer.is_valid():
+        # Report errors under the names the client sent
+        param_names = {target: param for param, target in aliases.items()}
+        for name, messages in serializer.errors.items():
+            errors[param_names.get(name, name)] = messages
+    if errors:
+        raise ValidationError(errors)
+    return MappingProxyType(dict(serializer.validated_data))
+
+
+def start_of_day(day):
+    """
+    Return the aware datetime at which `day` starts in the current timezone
+    """
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def created_range(spec):
+    """
+    Return the `(start, end)` datetimes bounding `created_at`, either may be `None`
+    """
+    next_day = timedelta(days=1)
+    starts, ends = [], []
+    if spec.get("date"):
+        starts.append(spec["date"])
+        ends.append(spec["date"] + next_day)
+    if spec.get("start_date"):
+        starts.append(spec["start_date"])
+    if spec.get("end_date"):
+        ends.append(spec["end_date"] + next_day)
+    if spec.get("created_after"):
+        starts.append(spec["created_after"] + next_day)
+    if spec.get("created_before"):
+        ends.append(spec["created_before"])
+    start = start_of_day(max(starts)) if starts else None
+    end = start_of_day(min(ends)) if ends else None
+    return start, end
+
+
+def filter_blogs(queryset, spec):
+    """
+    Apply a filter spec to a Blog queryset.
+    Search results are ordered by relevance unless the response is paginated.
+    """
+    if spec.get("author"):
+        queryset = queryset.filter(author_id=spec["author"])
+    start, end = created_range(spec)
+    if start is not None:
+        queryset = queryset.filter(created_at__gte=start)
+    if end is not None:
+        queryset = queryset.filter(created_at__lt=end)
+    if spec.get("q") or spec.get("title"):
+        queryset = search.search(queryset, spec.get("q"), spec.get("title"))
+        queryset = queryset.order_by("-search_rank", "id")
+    return queryset
+
+
+class BlogFilterBackend(BaseFilterBackend):
+    """
+    Filter Blog querysets by the query params described in `BlogFilterSerializer`
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        spec = get_filter_spec(getattr(view, "action", None), request.query_params)
+        return filter_blogs(queryset, spec)
@@ -0,0 +1,20 @@
+"""
+Management command deleting expired blog deletion tombstones
+"""
+
+from django.core.management.base import BaseCommand
+
+from myapp import changefeed
+
+
+class Command(BaseCommand):
+    """Delete the change feed tombstones older than BLOG_CHANGES_TOMBSTONE_DAYS"""
+
+    help = (
+        "Delete the deletion tombstones the change feed no longer serves; run it "
+        "periodically, e.g. daily from cron."
+    )
+
+    def handle(self, *args, **options):
+        deleted = changefeed.prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} blog tombstones"))
@@ -0,0 +1,53 @@
+"""
+Management command running the tasks of the durable background queue
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from prometheus_client import start_http_server
+
+from myapp import tasks
+
+
+class Command(BaseCommand):
+    """Run the background tasks stored in the BlogTask table"""
+
+    help = (
+        "Run the background tasks written to the BlogTask table when "
+        "BLOG_TASKS_DURABLE is on; run one or more next to the web processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no task is due instead of waiting for more.",
+        )
+        parser.add_argument(
+            "--metrics-port",
+            type=int,
+            help="Serve the Prometheus metrics of the worker on this port.",
+        )
+
+    def handle(self, *args, **options):
+        if options["metrics_port"]:
+            start_http_server(options["metrics_port"])
+        poll = settings.BLOG_TASKS_POLL_SECONDS
+        ran = 0
+        measured = None
+        while True:
+            if measured is None or time.monotonic() - measured >= poll:
+                tasks.measure_durable_queue()
+                measured = time.monotonic()
+            batch = tasks.run_durable_batch()
+            ran += batch
+            if batch:
+                continue
+            if options["once"]:
+                break
+            close_old_connections()
+            time.sleep(poll)
+        self.stdout.write(self.style.SUCCESS(f"Ran {ran} background tasks"))
@@ -0,0 +1,96 @@
+"""
+Management command filling the database with synthetic blogs for scale testing
+"""
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp import seed
+
+
+class Command(BaseCommand):
+    """Create many users and realistic blogs, deterministically from a seed"""
+
+    help = (
+        "Bulk-create users and blogs with realistic content sizes and creation "
+        "dates spread over years. The same arguments always produce the same rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users", type=int, default=100, help="Number of authors to create."
+        )
+        parser.add_argument(
+            "--blogs", type=int, default=10000, help="Number of blogs to create."
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0, help="Seed of the random generator."
+        )
+        parser.add_argument(
+            "--until",
+            type=date.fromisoformat,
+            help="Date of the most recent blogs, YYYY-MM-DD. Defaults to today; "
+            "pass it explicitly for repeatable runs.",
+        )
+        parser.add_argument(
+            "--years",
+            type=float,
+            default=5,
+            help="Number of years before --until over which blogs are spread.",
+        )
+        parser.add_argument(
+            "--content-words",
+            type=int,
+            default=300,
+            help="Median number of words of blog content.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=2000,
+            help="Rows written per statement and transaction.",
+        )
+        parser.add_argument(
+            "--user-prefix",
+            default="seed_user_",
+            help="Prefix of the generated usernames; existing users are reused.",
+        )
+        parser.add_argument(
+            "--password",
+            help="Password of the generated users. By default they cannot log in.",
+        )
+        parser.add_argument(
+            "--no-index",
+            action="store_true",
+            help="Do not add the blogs to the full-text search index.",
+        )
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["blogs"] < 0:
+            raise CommandError("--users must be positive and --blogs not negative.")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        def progress(written):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"{written}/{options['blogs']} blogs")
+
+        result = seed.seed(
+            options["users"],
+            options["blogs"],
+            seed_value=options["seed"],
+            until=options["until"],
+            years=options["years"],
+            content_words=options["content_words"],
+            batch_size=options["batch_size"],
+            user_prefix=options["user_prefix"],
+            password=options["password"],
+            index=not options["no_index"],
+            progress=progress,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {result['blogs']} blogs by {result['users']} users"
+            )
+        )
@@ -0,0 +1,231 @@
+"""
+Prometheus metrics for the Blog API.
+
+Metrics are registered on the default `prometheus_client` registry, which
+django_prometheus exports at `/metrics`.
+"""
+
+from django.db import connections
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+BLOG_CACHE_HITS = Counter(
+    "blog_response_cache_hits_total",
+    "Blog read responses served from the response cache.",
+    ["action"],
+)
+BLOG_CACHE_MISSES = Counter(
+    "blog_response_cache_misses_total",
+    "Blog read responses that had to be computed.",
+    ["action"],
+)
+AUTH_USER_CACHE_LOOKUPS = Counter(
+    "blog_auth_user_cache_lookups_total",
+    "Users resolved by JWT authentication, by cache result (hit or miss).",
+    ["result"],
+)
+
+REQUEST_DB_QUERIES = Histogram(
+    "blog_request_db_queries",
+    "SQL queries run per request.",
+    ["route", "action"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+)
+REQUEST_DB_SECONDS = Histogram(
+    "blog_request_db_seconds",
+    "Time spent running SQL queries per request.",
+    ["route", "action"],
+)
+REQUEST_SERIALIZE_SECONDS = Histogram(
+    "blog_request_serialize_seconds",
+    "Time spent in serializers per request, excluding queries.",
+    ["route", "action"],
+)
+REQUEST_RENDER_SECONDS = Histogram(
+    "blog_request_render_seconds",
+    "Time spent rendering the response body per request.",
+    ["route", "action"],
+)
+
+COMPRESSION_INPUT_BYTES = Counter(
+    "blog_compression_input_bytes",
+    "Response bytes compressed, before compression.",
+    ["encoding"],
+)
+COMPRESSION_OUTPUT_BYTES = Counter(
+    "blog_compression_output_bytes",
+    "Compressed response bytes sent.",
+    ["encoding"],
+)
+COMPRESSION_RATIO = Histogram(
+    "blog_compression_ratio",
+    "Uncompressed to compressed size of each compressed response.",
+    ["encoding"],
+    buckets=(1, 1.5, 2, 3, 4, 6, 8, 12, 16, 32),
+)
+COMPRESSION_CPU_SECONDS = Histogram(
+    "blog_compression_cpu_seconds",
+    "CPU time spent compressing each response.",
+    ["encoding"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+
+DB_READ_ROUTES = Counter(
+    "blog_db_read_routes",
+    "Read requests by database alias and reason (replica, sticky or fallback).",
+    ["alias", "reason"],
+)
+DB_REPLICA_HEALTHY = Gauge(
+    "blog_db_replica_healthy",
+    "Whether the last health check of a read replica passed.",
+    ["alias"],
+)
+
+ADMISSION_IN_FLIGHT = Gauge(
+    "blog_admission_in_flight",
+    "Requests being served, per limited route.",
+    ["route"],
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "blog_admission_queue_depth",
+    "Requests waiting for a slot, per limited route.",
+    ["route"],
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "blog_admission_wait_seconds",
+    "Time admitted requests waited in the queue.",
+    ["route"],
+)
+ADMISSION_SHED = Counter(
+    "blog_admission_shed",
+    "Requests rejected by admission control, by reason (queue_full, timeout, evicted, cancelled).",
+    ["route", "reason"],
+)
+
+EVENTS_SUBSCRIBERS = Gauge(
+    "blog_events_subscribers",
+    "Clients connected to the blog event stream.",
+)
+EVENTS_PUBLISHED = Counter(
+    "blog_events_published",
+    "Blog events published to the event stream, by kind.",
+    ["kind"],
+)
+EVENTS_RESETS = Counter(
+    "blog_events_resets",
+    "Subscribers told to reload because events they missed are no longer buffered.",
+)
+
+
+TASK_QUEUE_DEPTH = Gauge(
+    "blog_task_queue_depth",
+    "Background tasks due and waiting to run, per queue (memory or database).",
+    ["queue"],
+)
+TASK_QUEUE_LAG_SECONDS = Gauge(
+    "blog_task_queue_lag_seconds",
+    "Time the oldest due background task has been waiting, per queue.",
+    ["queue"],
+)
+TASK_WAIT_SECONDS = Histogram(
+    "blog_task_wait_seconds",
+    "Time background tasks waited between being due and starting to run.",
+    ["task"],
+)
+TASK_RUN_SECONDS = Histogram(
+    "blog_task_run_seconds",
+    "Time spent running each batch of background tasks.",
+    ["task"],
+)
+TASK_RUNS = Counter(
+    "blog_task_runs",
+    "Background tasks run, by outcome (succeeded, retried or failed).",
+    ["task", "outcome"],
+)
+
+
+class DatabasePoolCollector:
+    """
+    Export the statistics of the psycopg connection pool of each database.
+    Values are read from the pool at scrape time, so checkouts are not slowed down.
+    """
+
+    # (metric name, pool statistic, description) of the exported gauges
+    gauges = [
+        ("blog_db_pool_min_size", "pool_min", "Minimum size of the connection pool."),
+        ("blog_db_pool_max_size", "pool_max", "Maximum size of the connection pool."),
+        ("blog_db_pool_size", "pool_size", "Connections managed by the pool."),
+        ("blog_db_pool_available", "pool_available", "Idle connections in the pool."),
+        (
+            "blog_db_pool_requests_waiting",
+            "requests_waiting",
+            "Requests waiting for a connection.",
+        ),
+    ]
+    # (metric name, pool statistic, scale, description) of the exported counters
+    counters = [
+        (
+            "blog_db_pool_checkouts",
+            "requests_num",
+            1,
+            "Connections requested from the pool.",
+        ),
+        (
+            "blog_db_pool_wait_seconds",
+            "requests_wait_ms",
+            0.001,
+            "Time spent waiting for a pool connection.",
+        ),
+        (
+            "blog_db_pool_checkout_failures",
+            "requests_errors",
+            1,
+            "Connection requests that failed or timed out.",
+        ),
+        (
+            "blog_db_pool_connection_errors",
+            "connections_errors",
+            1,
+            "Failed attempts to open a database connection.",
+        ),
+    ]
+
+    def pools(self):
+        """
+        Yield `(alias, pool)` for every database configured with a pool
+        """
+        for alias in connections:
+            if connections.settings[alias].get("OPTIONS", {}).get("pool"):
+                yield alias, connections[alias].pool
+
+    def describe(self):
+        """
+        Return the metric families without values, so registering does not touch pools
+        """
+        return [family for family, _, _ in self.families()]
+
+    def collect(self):
+        """
+        Return the metric families of all pools
+        """
+        families = self.families()
+        for alias, pool in self.pools():
+            stats = pool.get_stats()
+            for family, stat, scale in families:
+                family.add_metric([alias], stats.get(stat, 0) * scale)
+        return [family for family, _, _ in families]
+
+    def families(self):
+        """
+        Return empty `(family, statistic, scale)` triples of the exported metrics
+        """
+        return [
+            (GaugeMetricFamily(name, doc, labels=["alias"]), stat, 1)
+            for name, stat, doc in self.gauges
+        ] + [
+            (CounterMetricFamily(name, doc, labels=["alias"]), stat, scale)
+            for name, stat, scale, doc in self.counters
+        ]
+
+
+REGISTRY.register(DatabasePoolCollector())
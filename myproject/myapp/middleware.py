@@ -0,0 +1,177 @@
+"""
+Per-request performance instrumentation.
+
+`PerformanceMiddleware` records, for every request, the number of SQL queries,
+the time spent in the database, in serializers and in rendering. The figures
+are sent back in a `Server-Timing` header and observed in Prometheus histograms
+labelled by route (URL name) and viewset action.
+
+Queries are timed by an `execute_wrapper` installed once on every connection,
+which reports to the timings of the current request through a context variable;
+that also covers queries the async ORM runs in worker threads. Serializers and
+renderers are timed with `timed` blocks. All of it is a few `perf_counter` calls
+per request, so the middleware is cheap enough to leave enabled. Serializer time
+excludes queries run while serializing, which are counted as database time.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import (
+    REQUEST_DB_QUERIES,
+    REQUEST_DB_SECONDS,
+    REQUEST_RENDER_SECONDS,
+    REQUEST_SERIALIZE_SECONDS,
+)
+
+_current_timings = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """
+    Accumulated timings of one request
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.durations = {"serialize": 0.0, "render": 0.0}
+        self.active = set()
+        self.route = None
+        self.action = None
+
+    def server_timing(self):
+        """
+        Return the `Server-Timing` header value
+        """
+        total = time.perf_counter() - self.started
+        return ", ".join(
+            [
+                f'db;dur={self.db * 1000:.2f};desc="{self.queries} queries"',
+                f"serialize;dur={self.durations['serialize'] * 1000:.2f}",
+                f"render;dur={self.durations['render'] * 1000:.2f}",
+                f"total;dur={total * 1000:.2f}",
+            ]
+        )
+
+    def observe(self):
+        """
+        Record the timings in the Prometheus histograms
+        """
+        labels = (self.route or "<unresolved>", self.action or "")
+        REQUEST_DB_QUERIES.labels(*labels).observe(self.queries)
+        REQUEST_DB_SECONDS.labels(*labels).observe(self.db)
+        REQUEST_SERIALIZE_SECONDS.labels(*labels).observe(self.durations["serialize"])
+        REQUEST_RENDER_SECONDS.labels(*labels).observe(self.durations["render"])
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Connection `execute_wrapper` counting and timing the queries of the current request
+    """
+    timings = _current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db += time.perf_counter() - started
+        timings.queries += 1
+
+
+def instrument_connection(connection):
+    """
+    Install `record_query` on a database connection, once
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+@contextmanager
+def timed(name):
+    """
+    Add the time spent in the block to the `name` timing of the current request.
+    Nested blocks of the same name are counted once; queries run in the block
+    are left to the database timing. Does nothing outside of a request.
+    """
+    timings = _current_timings.get()
+    if timings is None or name in timings.active:
+        yield
+        return
+    timings.active.add(name)
+    started, db_started = time.perf_counter(), timings.db
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started - (timings.db - db_started)
+        timings.durations[name] += elapsed
+        timings.active.discard(name)
+
+
+class PerformanceMiddleware:
+    """
+    Measure queries, database, serializer and render time of each request
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_timings.reset(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_timings.reset(token)
+        return self.finish(request, response, timings)
+
+    def process_template_response(self, request, response):
+        """
+        Time the rendering of DRF and template responses
+        """
+        # pylint: disable=unused-argument
+        timings = _current_timings.get()
+        if timings is not None:
+            started = time.perf_counter()
+
+            def rendered(_response):
+                timings.durations["render"] += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def finish(self, request, response, timings):
+        """
+        Add the `Server-Timing` header and observe the histograms
+        """
+        match = request.resolver_match
+        if match is not None:
+            timings.route = match.view_name
+            actions = getattr(match.func, "actions", None) or {}
+            timings.action = actions.get(request.method.lower())
+        if getattr(settings, "BLOG_SERVER_TIMING_HEADER", True):
+            response["Server-Timing"] = timings.server_timing()
+        timings.observe()
+        return response
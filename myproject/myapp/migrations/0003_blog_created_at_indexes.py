@@ -0,0 +1,24 @@
+# Generated by Django 5.1.8 on 2026-10-18 04:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("myapp", "0002_blog_delete_post"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="blog",
+            index=models.Index(fields=["created_at"], name="blog_created_at_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="blog",
+            index=models.Index(
+                fields=["author", "created_at"], name="blog_author_created_at_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Full-text search index for Blog title and content, see myapp/search.py
+
+from django.db import migrations
+
+# Must match myapp.search.SEARCH_CONFIG
+SEARCH_CONFIG = "english"
+
+POSTGRESQL_FORWARDS = [
+    "ALTER TABLE myapp_blog ADD COLUMN search_vector tsvector",
+    f"""
+    UPDATE myapp_blog SET search_vector =
+        setweight(to_tsvector('{SEARCH_CONFIG}', title), 'A') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', content), 'B')
+    """,
+    "CREATE INDEX blog_search_vector_idx ON myapp_blog USING gin (search_vector)",
+]
+POSTGRESQL_BACKWARDS = [
+    "DROP INDEX IF EXISTS blog_search_vector_idx",
+    "ALTER TABLE myapp_blog DROP COLUMN IF EXISTS search_vector",
+]
+SQLITE_FORWARDS = [
+    "CREATE VIRTUAL TABLE myapp_blog_fts USING fts5("
+    "title, content, tokenize = 'porter unicode61')",
+    "INSERT INTO myapp_blog_fts (rowid, title, content) "
+    "SELECT id, title, content FROM myapp_blog",
+]
+SQLITE_BACKWARDS = ["DROP TABLE IF EXISTS myapp_blog_fts"]
+
+
+def run_statements(statements):
+    """Return a RunPython function running the statements of the current vendor"""
+
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("myapp", "0003_blog_created_at_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_statements(
+                {"postgresql": POSTGRESQL_FORWARDS, "sqlite": SQLITE_FORWARDS}
+            ),
+            run_statements(
+                {"postgresql": POSTGRESQL_BACKWARDS, "sqlite": SQLITE_BACKWARDS}
+            ),
+        ),
+    ]
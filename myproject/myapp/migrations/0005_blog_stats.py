@@ -0,0 +1,54 @@
+# Generated by Django 5.1.8 on 2026-10-18 04:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("myapp", "0004_blog_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BlogStat",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "dimension",
+                    models.CharField(
+                        choices=[
+                            ("day", "Creation day"),
+                            ("month", "Creation month"),
+                            ("author", "Author"),
+                            ("total", "All blogs"),
+                        ],
+                        max_length=8,
+                    ),
+                ),
+                ("bucket", models.CharField(blank=True, max_length=32)),
+                ("count", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["dimension", "-count"],
+                        name="blog_stat_dimension_count_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("dimension", "bucket"),
+                        name="blog_stat_dimension_bucket_uniq",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.8 on 2026-10-18 04:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("myapp", "0005_blog_stats"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BlogTombstone",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("blog_id", models.BigIntegerField()),
+                ("deleted_at", models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="blog",
+            index=models.Index(
+                fields=["modified_at", "id"], name="blog_modified_at_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="blogtombstone",
+            index=models.Index(
+                fields=["deleted_at", "blog_id"], name="blog_tombstone_position_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,208 @@
+# Move Blog.content into the BlogContent table, see myapp/models.py
+#
+# This is the expand step, safe while the previous release still serves:
+#   - the `content` column is kept, but made nullable so the new release can
+#     insert blogs without it;
+#   - triggers mirror the content written by the previous release, and its
+#     deletions, into BlogContent;
+#   - existing bodies are copied in short transactions of BATCH_SIZE blogs,
+#     without locking the blog table. A body already written by a trigger or by
+#     the new release is newer than the copy, so it is left as is.
+# No catch-up is needed: every write after the triggers are created is mirrored.
+# Migration 0009 is the contract step. It drops the triggers and the column and
+# validates the foreign key. Apply it once no process of the previous release
+# is left, e.g. with the next deploy.
+
+import zlib
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models, transaction
+
+BATCH_SIZE = 1000
+
+PG_TRIGGER = [
+    """
+    CREATE FUNCTION myapp_blog_mirror_content() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM myapp_blogcontent WHERE blog_id = OLD.id;
+            RETURN OLD;
+        END IF;
+        IF NEW.content IS NOT NULL THEN
+            INSERT INTO myapp_blogcontent (blog_id, text, compressed)
+            VALUES (NEW.id, NEW.content, NULL)
+            ON CONFLICT (blog_id)
+            DO UPDATE SET text = excluded.text, compressed = NULL;
+        END IF;
+        RETURN NEW;
+    END
+    $$
+    """,
+    """
+    CREATE TRIGGER myapp_blog_mirror_content
+    AFTER INSERT OR UPDATE OF content OR DELETE ON myapp_blog
+    FOR EACH ROW EXECUTE FUNCTION myapp_blog_mirror_content()
+    """,
+]
+PG_DROP_TRIGGER = [
+    "DROP TRIGGER IF EXISTS myapp_blog_mirror_content ON myapp_blog",
+    "DROP FUNCTION IF EXISTS myapp_blog_mirror_content()",
+]
+SQLITE_MIRROR = (
+    "INSERT OR REPLACE INTO myapp_blogcontent (blog_id, text, compressed) "
+    "VALUES (NEW.id, NEW.content, NULL)"
+)
+SQLITE_TRIGGER = [
+    "CREATE TRIGGER myapp_blog_mirror_content_insert AFTER INSERT ON myapp_blog "
+    f"WHEN NEW.content IS NOT NULL BEGIN {SQLITE_MIRROR}; END",
+    "CREATE TRIGGER myapp_blog_mirror_content_update "
+    "AFTER UPDATE OF content ON myapp_blog "
+    f"WHEN NEW.content IS NOT NULL BEGIN {SQLITE_MIRROR}; END",
+    "CREATE TRIGGER myapp_blog_mirror_content_delete AFTER DELETE ON myapp_blog "
+    "BEGIN DELETE FROM myapp_blogcontent WHERE blog_id = OLD.id; END",
+]
+SQLITE_DROP_TRIGGER = [
+    f"DROP TRIGGER IF EXISTS myapp_blog_mirror_content_{event}"
+    for event in ("insert", "update", "delete")
+]
+
+
+def encode(value):
+    """
+    Return the `text` and `compressed` values storing `value`, as BlogContent
+    stored them when this migration was written
+    """
+    min_size = getattr(settings, "BLOG_CONTENT_COMPRESS_MIN_SIZE", 4096)
+    data = value.encode("utf-8")
+    if min_size is not None and len(data) >= min_size:
+        level = getattr(settings, "BLOG_CONTENT_COMPRESS_LEVEL", 6)
+        compressed = zlib.compress(data, level)
+        if len(compressed) < len(data):
+            return {"text": "", "compressed": compressed}
+    return {"text": value, "compressed": None}
+
+
+def decode(text, compressed):
+    """
+    Return the text stored in the `text` and `compressed` columns
+    """
+    if compressed is not None:
+        return zlib.decompress(compressed).decode("utf-8")
+    return text or ""
+
+
+def run_sql(schema_editor, statements):
+    """
+    Run the statements of the database vendor, a dict of lists
+    """
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def create_triggers(apps, schema_editor):  # pylint: disable=unused-argument
+    run_sql(schema_editor, {"postgresql": PG_TRIGGER, "sqlite": SQLITE_TRIGGER})
+
+
+def drop_triggers(apps, schema_editor):  # pylint: disable=unused-argument
+    run_sql(
+        schema_editor, {"postgresql": PG_DROP_TRIGGER, "sqlite": SQLITE_DROP_TRIGGER}
+    )
+
+
+def copy_content(apps, schema_editor):
+    Blog = apps.get_model("myapp", "Blog")
+    BlogContent = apps.get_model("myapp", "BlogContent")
+    db = schema_editor.connection.alias
+    blogs = Blog.objects.using(db).order_by("id")
+
+    last_id = 0
+    while True:
+        with transaction.atomic(using=db):
+            rows = list(
+                blogs.filter(id__gt=last_id).values_list("id", "content")[:BATCH_SIZE]
+            )
+            if not rows:
+                break
+            BlogContent.objects.using(db).bulk_create(
+                [
+                    BlogContent(blog_id=pk, **encode(content or ""))
+                    for pk, content in rows
+                ],
+                ignore_conflicts=True,
+            )
+        last_id = rows[-1][0]
+
+
+def restore_content(apps, schema_editor):
+    """
+    Copy the bodies back into the `content` column, which must exist
+    """
+    BlogContent = apps.get_model("myapp", "BlogContent")
+    connection = schema_editor.connection
+    bodies = BlogContent.objects.using(connection.alias).order_by("blog_id")
+    last_id = 0
+    while True:
+        with transaction.atomic(using=connection.alias):
+            rows = list(
+                bodies.filter(blog_id__gt=last_id).values_list(
+                    "blog_id", "text", "compressed"
+                )[:BATCH_SIZE]
+            )
+            if not rows:
+                break
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    "UPDATE myapp_blog SET content = %s WHERE id = %s",
+                    [(decode(text, compressed), pk) for pk, text, compressed in rows],
+                )
+        last_id = rows[-1][0]
+    with connection.cursor() as cursor:
+        cursor.execute("UPDATE myapp_blog SET content = '' WHERE content IS NULL")
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("myapp", "0006_blog_changes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BlogContent",
+            fields=[
+                (
+                    "blog",
+                    models.OneToOneField(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="body",
+                        serialize=False,
+                        to="myapp.blog",
+                    ),
+                ),
+                ("text", models.TextField(blank=True)),
+                ("compressed", models.BinaryField(null=True)),
+            ],
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.AlterField(
+                    model_name="blog",
+                    name="content",
+                    field=models.TextField(null=True),
+                ),
+                migrations.RunPython(create_triggers, drop_triggers),
+                migrations.RunPython(copy_content, restore_content),
+            ],
+            state_operations=[
+                migrations.RemoveField(
+                    model_name="blog",
+                    name="content",
+                ),
+            ],
+        ),
+    ]
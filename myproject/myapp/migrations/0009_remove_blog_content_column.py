@@ -0,0 +1,114 @@
+# Contract step of the move of Blog.content, see 0007_blog_content
+#
+# Apply it only once every process runs a release reading BlogContent, since
+# it drops the column the previous release reads. Each step commits on its own:
+#   - the mirroring triggers are dropped;
+#   - bodies of blogs deleted while they were copied are deleted;
+#   - on PostgreSQL the foreign key is added NOT VALID, which only locks the
+#     tables briefly, then validated in its own transaction, which scans
+#     BlogContent without blocking writes;
+#   - the column is dropped, which only changes the catalog on PostgreSQL.
+
+import copy
+import importlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+expand = importlib.import_module("myapp.migrations.0007_blog_content")
+
+FK_NAME = "myapp_blogcontent_blog_id_fk_myapp_blog_id"
+
+
+def delete_orphans(apps, schema_editor):  # pylint: disable=unused-argument
+    schema_editor.execute(
+        "DELETE FROM myapp_blogcontent WHERE NOT EXISTS "
+        "(SELECT 1 FROM myapp_blog WHERE myapp_blog.id = myapp_blogcontent.blog_id)"
+    )
+
+
+def blog_fields(apps):
+    """
+    Return the BlogContent model with its `blog` field without and with the
+    database constraint
+    """
+    BlogContent = apps.get_model("myapp", "BlogContent")
+    field = BlogContent._meta.get_field("blog")
+    constrained = copy.copy(field)
+    constrained.db_constraint = True
+    return BlogContent, field, constrained
+
+
+def add_foreign_key(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            f"ALTER TABLE myapp_blogcontent ADD CONSTRAINT {FK_NAME} "
+            "FOREIGN KEY (blog_id) REFERENCES myapp_blog (id) "
+            "DEFERRABLE INITIALLY DEFERRED NOT VALID"
+        )
+        schema_editor.execute(
+            f"ALTER TABLE myapp_blogcontent VALIDATE CONSTRAINT {FK_NAME}"
+        )
+        return
+    BlogContent, field, constrained = blog_fields(apps)
+    schema_editor.alter_field(BlogContent, field, constrained)
+
+
+def drop_foreign_key(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            f"ALTER TABLE myapp_blogcontent DROP CONSTRAINT IF EXISTS {FK_NAME}"
+        )
+        return
+    BlogContent, field, constrained = blog_fields(apps)
+    schema_editor.alter_field(BlogContent, constrained, field)
+
+
+def content_field():
+    """
+    Return the legacy `content` column as left by 0007
+    """
+    field = models.TextField(null=True)
+    field.set_attributes_from_name("content")
+    return field
+
+
+def drop_column(apps, schema_editor):
+    schema_editor.remove_field(apps.get_model("myapp", "Blog"), content_field())
+
+
+def restore_column(apps, schema_editor):
+    schema_editor.add_field(apps.get_model("myapp", "Blog"), content_field())
+    expand.restore_content(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("myapp", "0008_blog_tasks"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(expand.drop_triggers, expand.create_triggers),
+                migrations.RunPython(delete_orphans, migrations.RunPython.noop),
+                migrations.RunPython(add_foreign_key, drop_foreign_key),
+                migrations.RunPython(drop_column, restore_column),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name="blogcontent",
+                    name="blog",
+                    field=models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="body",
+                        serialize=False,
+                        to="myapp.blog",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -1,18 +1,272 @@
 """Define the schema"""
-from django.db import models
+import zlib
+
+from django.conf import settings
+from django.db import models, transaction
 from django.contrib.auth.models import User
 
 
+class BlogQuerySet(models.QuerySet):
+    """
+    Blog queryset whose bulk writes also store the content of the blogs
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            BlogContent.store([blog for blog in objs if blog.pk is not None])
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        if "content" not in fields:
+            return super().bulk_update(objs, fields, *args, **kwargs)
+        fields = [name for name in fields if name != "content"]
+        with transaction.atomic(using=self.db, savepoint=False):
+            BlogContent.store(objs)
+            if not fields:
+                return len(objs)
+            return super().bulk_update(objs, fields, *args, **kwargs)
+
+
 class Blog(models.Model):
     """
-    Define the schema
+    Define the schema.
+    `content` is kept in the `BlogContent` row of the blog, so that scans of
+    the blog table do not read the bodies. It behaves like a field: it may be
+    passed to the constructor, is loaded on first access (or with
+    `select_related("body")`) and is written by `save` and the bulk methods of
+    the manager when it was assigned.
     """
 
     title = models.CharField(max_length=255)
-    content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     modified_at = models.DateTimeField(auto_now=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE)
 
+    objects = BlogQuerySet.as_manager()
+
+    class Meta:
+        """
+        Indexes backing the date filters, the author filter and the change feed
+        """
+
+        indexes = [
+            models.Index(fields=["created_at"], name="blog_created_at_idx"),
+            models.Index(
+                fields=["author", "created_at"], name="blog_author_created_at_idx"
+            ),
+            models.Index(fields=["modified_at", "id"], name="blog_modified_at_id_idx"),
+        ]
+
     def __str__(self):
         return self.title
+
+    @property
+    def content(self):
+        """
+        The text of the blog
+        """
+        if "_content" not in self.__dict__:
+            try:
+                body = self.body  # pylint: disable=no-member
+            except BlogContent.DoesNotExist:
+                self.__dict__["_content"] = ""
+            else:
+                self.__dict__["_content"] = body.text_value()
+        return self.__dict__["_content"]
+
+    @content.setter
+    def content(self, value):
+        self.__dict__["_content"] = value
+        self.__dict__["_content_changed"] = True
+
+    @property
+    def content_changed(self):
+        """
+        Whether `content` was assigned since it was last stored
+        """
+        return self.__dict__.get("_content_changed", False)
+
+    def save(self, *args, **kwargs):
+        """
+        Save the blog and, when it was assigned, its content, atomically.
+        `"content"` may be listed in `update_fields`.
+        """
+        update_fields = kwargs.get("update_fields")
+        store_content = self.content_changed
+        if update_fields is not None:
+            store_content = store_content and "content" in update_fields
+            kwargs["update_fields"] = [
+                name for name in update_fields if name != "content"
+            ]
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+            if store_content:
+                BlogContent.store([self])
+
+    def refresh_from_db(self, *args, **kwargs):
+        self.__dict__.pop("_content", None)
+        self.__dict__.pop("_content_changed", None)
+        super().refresh_from_db(*args, **kwargs)
+
+
+class BlogStat(models.Model):
+    """
+    Number of blogs in one bucket of a rollup dimension, see `myapp.stats`
+    """
+
+    DAY = "day"
+    MONTH = "month"
+    AUTHOR = "author"
+    TOTAL = "total"
+    DIMENSIONS = [
+        (DAY, "Creation day"),
+        (MONTH, "Creation month"),
+        (AUTHOR, "Author"),
+        (TOTAL, "All blogs"),
+    ]
+
+    dimension = models.CharField(max_length=8, choices=DIMENSIONS)
+    # ISO date, year-month, author id, or empty for the total
+    bucket = models.CharField(max_length=32, blank=True)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        """
+        One row per bucket; authors are ranked by count
+        """
+
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dimension", "bucket"], name="blog_stat_dimension_bucket_uniq"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["dimension", "-count"], name="blog_stat_dimension_count_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.dimension} {self.bucket}: {self.count}"
+
+
+class BlogTombstone(models.Model):
+    """
+    Deletion of a blog, kept for the change feed, see `myapp.changefeed`
+    """
+
+    blog_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField()
+
+    class Meta:
+        """
+        Tombstones are read in `(deleted_at, blog_id)` order
+        """
+
+        indexes = [
+            models.Index(
+                fields=["deleted_at", "blog_id"], name="blog_tombstone_position_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Blog {self.blog_id} deleted at {self.deleted_at}"
+
+
+class BlogTask(models.Model):
+    """
+    Task of the durable background queue, see `myapp.tasks`
+    """
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField()
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField()
+    # Set once the task has failed its last attempt; it is then kept for review
+    failed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        """
+        Workers claim the due tasks in `(run_after, id)` order
+        """
+
+        indexes = [
+            models.Index(
+                fields=["run_after", "id"],
+                name="blog_task_due_idx",
+                condition=models.Q(failed_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} task {self.pk}"
+
+
+class BlogContent(models.Model):
+    """
+    Text of a blog, in a table of its own.
+    Bodies of at least `BLOG_CONTENT_COMPRESS_MIN_SIZE` bytes are stored
+    zlib-compressed in `compressed`, with an empty `text`, when that makes them
+    smaller.
+    """
+
+    blog = models.OneToOneField(
+        Blog, on_delete=models.CASCADE, primary_key=True, related_name="body"
+    )
+    text = models.TextField(blank=True)
+    compressed = models.BinaryField(null=True)
+
+    def __str__(self):
+        return f"Content of blog {self.blog_id}"
+
+    def text_value(self):
+        """
+        Return the text of the blog
+        """
+        return self.decode(self.text, self.compressed)
+
+    @staticmethod
+    def encode(value):
+        """
+        Return the `text` and `compressed` column values storing `value`
+        """
+        min_size = getattr(settings, "BLOG_CONTENT_COMPRESS_MIN_SIZE", None)
+        data = value.encode("utf-8")
+        if min_size is not None and len(data) >= min_size:
+            level = getattr(settings, "BLOG_CONTENT_COMPRESS_LEVEL", 6)
+            compressed = zlib.compress(data, level)
+            if len(compressed) < len(data):
+                return {"text": "", "compressed": compressed}
+        return {"text": value, "compressed": None}
+
+    @staticmethod
+    def decode(text, compressed):
+        """
+        Return the text stored in the `text` and `compressed` columns.
+        Both are `None` for a blog without content row.
+        """
+        if compressed is not None:
+            return zlib.decompress(compressed).decode("utf-8")
+        return text or ""
+
+    @classmethod
+    def store(cls, blogs):
+        """
+        Insert or replace the content rows of the saved `blogs` whose content
+        was assigned
+        """
+        blogs = [blog for blog in blogs if blog.content_changed]
+        if not blogs:
+            return
+        cls.objects.bulk_create(
+            [cls(blog_id=blog.pk, **cls.encode(blog.content)) for blog in blogs],
+            update_conflicts=True,
+            unique_fields=["blog"],
+            update_fields=["text", "compressed"],
+            batch_size=settings.BLOG_BULK_BATCH_SIZE,
+        )
+        for blog in blogs:
+            blog.__dict__["_content_changed"] = False
@@ -0,0 +1,193 @@
+"""
+Keyset (cursor) pagination for the Blog API.
+
+Pages are ordered by `(created_at, id)` and each cursor stores the position of
+the last row that was sent, so fetching a page is a range scan starting at that
+position. No `OFFSET` and no `COUNT(*)` is ever issued, which keeps the cost of
+page N the same as page 1 regardless of table size.
+"""
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from urllib import parse
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination keyed on the `(created_at, id)` pair.
+
+    Pagination is opt-in: responses are only paginated when the client sends
+    `page_size` or `cursor`, so existing clients keep receiving plain lists.
+    Cursors are opaque url-safe base64 tokens; the `next` and `previous` links
+    carry the requested page size forward.
+    """
+
+    ordering = ("created_at", "id")
+    page_size = None
+    default_page_size = 100
+    max_page_size = 1000
+    page_size_query_param = "page_size"
+
+    def get_page_size(self, request):
+        """
+        Return the requested page size, or `None` when pagination is not requested.
+        """
+        value = request.query_params.get(self.page_size_query_param)
+        if value is None:
+            if self.cursor_query_param in request.query_params:
+                return self.default_page_size
+            return self.page_size
+        try:
+            page_size = int(value)
+        except ValueError:
+            return self.default_page_size
+        if page_size <= 0:
+            return self.default_page_size
+        return min(page_size, self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        return self.build_page(list(page_queryset))
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """
+        Return the (unevaluated) queryset for the requested page.
+
+        The slice fetches one extra row so `build_page` can tell whether a
+        following page exists. Returns `None` when pagination is not requested.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, self.current_position = False, None
+        else:
+            reverse, self.current_position = self.cursor.reverse, self.cursor.position
+
+        if reverse:
+            queryset = queryset.order_by("-created_at", "-id")
+        else:
+            queryset = queryset.order_by("created_at", "id")
+
+        if self.current_position is not None:
+            created_at, pk = self.current_position
+            if reverse:
+                queryset = queryset.filter(created_at__lte=created_at).filter(
+                    Q(created_at__lt=created_at) | Q(id__lt=pk)
+                )
+            else:
+                queryset = queryset.filter(created_at__gte=created_at).filter(
+                    Q(created_at__gt=created_at) | Q(id__gt=pk)
+                )
+
+        return queryset[: self.page_size + 1]
+
+    def build_page(self, results):
+        """
+        Build the page from the rows fetched by `get_page_queryset`.
+
+        Rows may be model instances or dicts (e.g. from `.values()`).
+        """
+        reverse = self.cursor is not None and self.cursor.reverse
+        self.page = list(results[: self.page_size])
+        has_following_position = len(results) > len(self.page)
+
+        # Positions of the first and last rows in query order.
+        if self.page:
+            first_position = self._get_position_from_instance(
+                self.page[0], self.ordering
+            )
+            last_position = self._get_position_from_instance(
+                self.page[-1], self.ordering
+            )
+        elif self.current_position is not None:
+            # An empty page points back at the cursor row itself; ids are
+            # integers, so nudging the id by one makes the bound inclusive.
+            created_at, pk = self.current_position
+            pk = pk - 1 if reverse else pk + 1
+            first_position = last_position = (created_at, pk)
+        else:
+            first_position = last_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = self.current_position is not None
+            self.has_previous = has_following_position
+            self.next_position = first_position
+            self.previous_position = last_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = self.current_position is not None
+            self.next_position = last_position
+            self.previous_position = first_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=self.next_position)
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=True, position=self.previous_position)
+        )
+
+    def decode_cursor(self, request):
+        """
+        Given a request with a cursor, return a `Cursor` whose position is a
+        `(created_at, id)` tuple.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            querystring = urlsafe_b64decode(encoded.encode("ascii")).decode("ascii")
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            reverse = bool(int(tokens.get("r", ["0"])[0]))
+            created_at = parse_datetime(tokens["c"][0])
+            pk = int(tokens["i"][0])
+        except (BinasciiError, KeyError, TypeError, ValueError, UnicodeError) as exc:
+            raise NotFound(self.invalid_cursor_message) from exc
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+
+        return Cursor(offset=0, reverse=reverse, position=(created_at, pk))
+
+    def encode_cursor(self, cursor):
+        """
+        Given a `Cursor` instance, return an url with the encoded cursor.
+        """
+        created_at, pk = cursor.position
+        tokens = {"c": created_at.isoformat(), "i": str(pk)}
+        if cursor.reverse:
+            tokens["r"] = "1"
+
+        querystring = parse.urlencode(tokens)
+        encoded = urlsafe_b64encode(querystring.encode("ascii")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def _get_position_from_instance(self, instance, ordering):
+        if isinstance(instance, dict):
+            return instance["created_at"], instance["id"]
+        return instance.created_at, instance.id
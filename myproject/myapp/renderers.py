@@ -0,0 +1,69 @@
+"""
+Fast JSON rendering for the Blog API.
+
+`FastJSONRenderer` renders with orjson when it is installed, and produces the
+same bytes as DRF's `JSONRenderer`: compact separators, UTF-8 without escaping,
+U+2028/U+2029 escaped, and dates, times, decimals, lazy strings and querysets
+encoded by DRF's `JSONEncoder`. Whatever orjson cannot render the same way is
+handed to `JSONRenderer`: indented output, non-default `UNICODE_JSON`,
+`COMPACT_JSON` or `STRICT_JSON` settings, non-string dict keys and integers
+beyond 64 bits.
+
+orjson writes floats in its own shortest form, which differs from `json` for
+exponents (`1e16` rather than `1e+16`) and writes NaN as `null`; the Blog API
+emits no floats.
+"""
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# JSONRenderer escapes these so the output is also valid JavaScript
+ESCAPES = ((b"\xe2\x80\xa8", b"\\u2028"), (b"\xe2\x80\xa9", b"\\u2029"))
+# Dates and datetimes go through DRF's encoder, which formats them differently
+OPTIONS = 0
+if orjson is not None:
+    # pylint: disable-next=no-member
+    OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Drop-in `JSONRenderer` backed by orjson, falling back to the stdlib
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.default = self.encoder_class().default
+
+    @property
+    def fast(self):
+        """
+        Whether orjson output is identical under the current settings
+        """
+        return (
+            orjson is not None
+            and not self.ensure_ascii
+            and self.compact
+            and self.strict
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if not self.fast or self.get_indent(
+            accepted_media_type, renderer_context or {}
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        # pylint: disable=no-member
+        try:
+            ret = orjson.dumps(data, default=self.default, option=OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        for char, escape in ESCAPES:
+            if char in ret:
+                ret = ret.replace(char, escape)
+        return ret
@@ -0,0 +1,265 @@
+"""
+Read replica routing for the Blog API.
+
+`ReplicaRouter` sends every write, and by default every read, to the `default`
+database. `BlogViewSet` opts the reads of its safe-method requests into the
+replicas listed in `BLOG_DB_REPLICAS` with `use_replica`, which picks a healthy
+replica for the rest of the request. The choice lives in a context variable,
+so it covers the queries the async ORM runs in worker threads, while
+authentication, write requests, the admin and management commands keep reading
+from the primary.
+
+Read-your-writes: after a successful write, the reads of its author stick to
+the primary for `BLOG_DB_STICKY_SECONDS`. The window is never shorter than the
+most a replica still used may lag, `BLOG_DB_REPLICA_MAX_LAG` at its last probe
+plus the `BLOG_DB_REPLICA_CHECK_INTERVAL` until the next one; the defaults keep
+that bound below the sticky window. The deadline is kept in the
+`BLOG_CACHE_ALIAS` cache, so with a shared cache backend it holds across
+processes. Responses read from a replica within
+that window of the last write are not stored in the response cache, so a
+lagging replica cannot cache stale data under the new collection version.
+
+Health: each process probes a replica with `SELECT 1` (and, on PostgreSQL, its
+replay lag against `BLOG_DB_REPLICA_MAX_LAG`) when it is about to use it and
+its last probe is older than `BLOG_DB_REPLICA_CHECK_INTERVAL` seconds. Replicas
+failing the probe, or a query during a request, are skipped until a later probe
+passes; reads fall back to the primary when no replica is healthy.
+"""
+
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from .metrics import DB_READ_ROUTES, DB_REPLICA_HEALTHY
+
+_read_alias = ContextVar("read_alias", default=None)
+
+# Seconds of replay lag of a PostgreSQL standby; 0 when it has replayed all it received
+PG_REPLICA_LAG = (
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+    "END"
+)
+
+
+def replicas():
+    """
+    Return the aliases of the configured read replicas
+    """
+    return getattr(settings, "BLOG_DB_REPLICAS", [])
+
+
+def sticky_seconds():
+    """
+    Return how long the reads of a writer stick to the primary, at least as long
+    as a replica considered healthy may lag behind
+    """
+    return max(
+        getattr(settings, "BLOG_DB_STICKY_SECONDS", 5),
+        getattr(settings, "BLOG_DB_REPLICA_MAX_LAG", 2)
+        + getattr(settings, "BLOG_DB_REPLICA_CHECK_INTERVAL", 1),
+    )
+
+
+def read_alias():
+    """
+    Return the replica the current request reads from, or `None` for the primary
+    """
+    return _read_alias.get()
+
+
+class ReplicaRouter:
+    """
+    Route reads to the replica chosen for the current request, everything else
+    to the primary
+    """
+
+    def db_for_read(self, model, **hints):
+        """
+        The replica selected by `use_replica`, else the primary
+        """
+        # pylint: disable=unused-argument
+        return _read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        """
+        Always the primary, including for instances read from a replica
+        """
+        # pylint: disable=unused-argument
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """
+        The primary and its replicas hold the same rows
+        """
+        # pylint: disable=unused-argument,protected-access
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """
+        Replicas receive the schema through replication
+        """
+        # pylint: disable=unused-argument
+        if db in replicas():
+            return False
+        return None
+
+
+class ReplicaHealth:
+    """
+    Health of the read replicas as last probed by this process
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # alias -> (healthy, monotonic time of the last probe)
+        self.states = {}
+
+    def is_healthy(self, alias):
+        """
+        Return whether `alias` may serve reads, probing it if its state is stale
+        """
+        interval = getattr(settings, "BLOG_DB_REPLICA_CHECK_INTERVAL", 1)
+        now = time.monotonic()
+        with self.lock:
+            healthy, checked_at = self.states.get(alias, (True, None))
+            if checked_at is not None and now - checked_at < interval:
+                return healthy
+            # Other requests keep the previous state while this one probes
+            self.states[alias] = (healthy, now)
+        return self.set_healthy(alias, self.probe(alias))
+
+    def probe(self, alias):
+        """
+        Run the health check query on `alias`
+        """
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                if connection.vendor == "postgresql":
+                    cursor.execute(PG_REPLICA_LAG)
+                    (lag,) = cursor.fetchone()
+                    return lag <= getattr(settings, "BLOG_DB_REPLICA_MAX_LAG", 2)
+                cursor.execute("SELECT 1")
+                return True
+        except DatabaseError:
+            # Drop the broken connection so the next probe reconnects
+            connection.close_if_unusable_or_obsolete()
+            return False
+
+    def set_healthy(self, alias, healthy):
+        """
+        Record the health of `alias`
+        """
+        with self.lock:
+            self.states[alias] = (healthy, time.monotonic())
+        DB_REPLICA_HEALTHY.labels(alias).set(int(healthy))
+        return healthy
+
+    def mark_down(self, alias):
+        """
+        Stop reading from `alias` until its next successful probe
+        """
+        self.set_healthy(alias, False)
+
+    def reset(self):
+        """
+        Forget every probe result
+        """
+        with self.lock:
+            self.states.clear()
+
+
+replica_health = ReplicaHealth()
+
+
+def sticky_key(user_id):
+    """
+    Return the cache key of the primary stickiness deadline of a user
+    """
+    return f"blogs:primary-until:{user_id}"
+
+
+def stick_to_primary(user):
+    """
+    Send the reads of `user` to the primary for the next `sticky_seconds()`
+    """
+    seconds = sticky_seconds()
+    if replicas() and seconds > 0 and user.is_authenticated:
+        cache = caches[getattr(settings, "BLOG_CACHE_ALIAS", "default")]
+        cache.set(sticky_key(user.pk), time.time() + seconds, timeout=seconds)
+
+
+def is_sticky(user):
+    """
+    Whether `user` wrote recently enough to read from the primary
+    """
+    if not user.is_authenticated:
+        return False
+    cache = caches[getattr(settings, "BLOG_CACHE_ALIAS", "default")]
+    return (cache.get(sticky_key(user.pk)) or 0) > time.time()
+
+
+def choose_read_alias(user):
+    """
+    Return a healthy replica for the reads of `user`, or `None` for the primary
+    """
+    if is_sticky(user):
+        DB_READ_ROUTES.labels(DEFAULT_DB_ALIAS, "sticky").inc()
+        return None
+    healthy = [alias for alias in replicas() if replica_health.is_healthy(alias)]
+    if not healthy:
+        DB_READ_ROUTES.labels(DEFAULT_DB_ALIAS, "fallback").inc()
+        return None
+    alias = random.choice(healthy)
+    DB_READ_ROUTES.labels(alias, "replica").inc()
+    return alias
+
+
+def use_replica(alias):
+    """
+    Read from `alias` for the rest of the current `request_scope`
+    """
+    _read_alias.set(alias)
+
+
+@contextmanager
+def request_scope():
+    """
+    Read from the primary unless `use_replica` is called inside the block
+    """
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def replica_failed():
+    """
+    Mark the replica of the current request down after a database error.
+    Returns whether the request was reading from a replica, and so may be retried
+    on the primary.
+    """
+    alias = _read_alias.get()
+    if alias is None:
+        return False
+    replica_health.mark_down(alias)
+    return True
+
+
+def may_be_stale(changed_at):
+    """
+    Whether a replica may not have replayed the write made at `changed_at`
+    (a timestamp) yet
+    """
+    return time.time() - changed_at < sticky_seconds()
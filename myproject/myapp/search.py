@@ -0,0 +1,156 @@
+"""
+Full-text search over Blog title and content.
+
+PostgreSQL keeps a `search_vector` tsvector column on `myapp_blog` with a GIN
+index; title words are weighted above content words. SQLite keeps an FTS5 table
+`myapp_blog_fts` keyed by blog id. Both are created by migration 0004. Writes
+enqueue a background task with the ids of the blogs they save or delete, which
+indexes the blogs as they are once the write commits, and removes the deleted
+ones from the SQLite table; search results lag writes by the queue delay. The
+column is not a model field, so it is never read by regular queries. Other
+databases fall back to `icontains`, which does not see compressed content.
+
+Documents are built from the loaded blogs rather than from the table in SQL,
+so indexing works whatever the storage of the blog columns.
+"""
+
+import re
+
+from django.db import connection, transaction
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from . import tasks
+from .models import Blog
+
+# Text search configuration used by the search_vector column (see migration 0004)
+SEARCH_CONFIG = "english"
+FTS_TABLE = "myapp_blog_fts"
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+# Background task indexing saved blogs and removing deleted ones
+INDEX_TASK = "search.index"
+
+PG_DOCUMENT = (
+    "setweight(to_tsvector(%s::regconfig, %s), 'A') || "
+    "setweight(to_tsvector(%s::regconfig, %s), 'B')"
+)
+
+
+def index_blogs(blogs):
+    """
+    Add or refresh the search index entries of `blogs`
+    """
+    blogs = list(blogs)
+    if not blogs:
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.executemany(
+                f"UPDATE myapp_blog SET search_vector = {PG_DOCUMENT} WHERE id = %s",
+                [
+                    (SEARCH_CONFIG, blog.title, SEARCH_CONFIG, blog.content, blog.id)
+                    for blog in blogs
+                ],
+            )
+        elif connection.vendor == "sqlite":
+            ids = [(blog.id,) for blog in blogs]
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", ids)
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, content) VALUES (%s, %s, %s)",
+                [(blog.id, blog.title, blog.content) for blog in blogs],
+            )
+
+
+def unindex_blogs(ids):
+    """
+    Remove deleted blogs from the search index.
+    Only needed on SQLite; the PostgreSQL column is deleted with its row.
+    Entries left behind by other deletions never match a blog, since ids are not reused.
+    """
+    if connection.vendor == "sqlite" and ids:
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in ids]
+            )
+
+
+def index_blogs_later(ids):
+    """
+    Index the blogs `ids` in the background once the current transaction
+    commits, or remove them from the index if they were deleted by then
+    """
+    if ids:
+        tasks.enqueue(INDEX_TASK, list(ids))
+
+
+@tasks.task(INDEX_TASK)
+def reindex_blogs(batches):
+    """
+    Index the blogs of a batch of index tasks, each a list of ids, as they are
+    now. The rows are locked, so a task reading a blog before a later write
+    cannot overwrite the entry indexed by the task of that write.
+    """
+    ids = {pk for ids in batches for pk in ids}
+    with transaction.atomic():
+        blogs = list(
+            Blog.objects.select_related("body")
+            .select_for_update(of=("self",))
+            .filter(id__in=ids)
+            .order_by("id")
+        )
+        index_blogs(blogs)
+        unindex_blogs(ids.difference(blog.id for blog in blogs))
+
+
+def search(queryset, terms, title=None):
+    """
+    Filter `queryset` to blogs matching `terms`, annotated with `search_rank`
+    (higher is more relevant). `title` additionally requires the title to
+    contain that text; it is checked only on the rows matched by the index.
+    """
+    words = WORD_RE.findall(" ".join(filter(None, [terms, title])))
+    if not words:
+        return queryset.none()
+
+    if connection.vendor == "postgresql":
+        query = "plainto_tsquery(%s::regconfig, %s)"
+        params = [SEARCH_CONFIG, " ".join(words)]
+        queryset = queryset.filter(
+            RawSQL(
+                f"myapp_blog.search_vector @@ {query}",
+                params,
+                output_field=BooleanField(),
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f"ts_rank_cd(myapp_blog.search_vector, {query})",
+                params,
+                output_field=FloatField(),
+            )
+        )
+    elif connection.vendor == "sqlite":
+        match = " ".join(f'"{word}"' for word in words)
+        queryset = queryset.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]
+            )
+        ).annotate(
+            # bm25() is lower for better matches; title words weigh four times more
+            search_rank=RawSQL(
+                f"(SELECT -bm25({FTS_TABLE}, 4.0, 1.0) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid = myapp_blog.id)",
+                [match],
+                output_field=FloatField(),
+            )
+        )
+    else:
+        condition = Q()
+        for word in words:
+            condition &= Q(title__icontains=word) | Q(body__text__icontains=word)
+        queryset = queryset.filter(condition).annotate(
+            search_rank=RawSQL("0", [], output_field=FloatField())
+        )
+
+    if title:
+        queryset = queryset.filter(title__icontains=title)
+    return queryset
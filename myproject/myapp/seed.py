@@ -0,0 +1,276 @@
+"""
+Synthetic Blog data for scale testing.
+
+`seed` creates users and blogs whose shape resembles a production corpus: a few
+prolific authors and a long tail of occasional ones, titles of a handful of
+words, content lengths following a log-normal distribution (most posts are a
+few hundred words, some are very long) and `created_at` spread over several
+years, with volume growing towards the present.
+
+Rows are generated lazily and written in batches, one transaction per batch, so
+memory use does not depend on the number of rows. Users are written with
+`bulk_create`; blogs with `bulk_create`, or with COPY on PostgreSQL, which is
+several times faster. All values are drawn from a single `random.Random(seed)`,
+so the same arguments always produce the same rows.
+"""
+
+import math
+import random
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from datetime import timezone as dt_timezone
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+
+from . import search, stats
+from .cache import blog_cache
+from .models import Blog, BlogContent
+
+VOCABULARY = (
+    "the of and to in is that for it as was with be by on not he this are or his "
+    "from at which but have an they you were her she there been one all we their "
+    "has would when if so no will can more about said time what some could them "
+    "other than then now only its like these two may first any new very should "
+    "because how people also over work most even just where after years data "
+    "system performance database query index server request response cache "
+    "memory latency throughput python django postgres design model user blog "
+    "write read test build release deploy service network client code review "
+    "team project feature change problem result value number large small fast "
+    "slow simple better different important world life day way thing "
+    "example question answer idea story travel food music city home garden "
+    "learning history science market product customer price quality summer "
+    "winter morning evening weekend family friend book film picture language"
+).split()
+
+# Shape of the generated content, in words
+TITLE_WORDS = (3, 10)
+SENTENCE_WORDS = (6, 20)
+PARAGRAPH_SENTENCES = (3, 8)
+CONTENT_SIGMA = 0.8
+CONTENT_WORDS_MAX = 20000
+# Share of blogs edited after publication, and how long after
+EDITED_SHARE = 0.2
+EDIT_DELAY = timedelta(days=30)
+
+BLOG_COLUMNS = ("id", "title", "created_at", "modified_at", "author_id")
+CONTENT_COLUMNS = ("blog_id", "text", "compressed")
+
+
+def batched(iterable, size):
+    """
+    Yield lists of up to `size` items of `iterable`
+    """
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class BlogGenerator:
+    """
+    Deterministic source of synthetic users and blogs
+    """
+
+    def __init__(self, seed_value, until, years, content_words):
+        self.rng = random.Random(seed_value)
+        self.until = datetime.combine(until, time.min, tzinfo=dt_timezone.utc)
+        self.span = timedelta(days=365.25 * years).total_seconds()
+        self.content_mu = math.log(max(content_words, 1))
+
+    def words(self, count):
+        """
+        Return `count` random words
+        """
+        return self.rng.choices(VOCABULARY, k=count)
+
+    def title(self):
+        """
+        Return a title of a few capitalized words
+        """
+        return " ".join(self.words(self.rng.randint(*TITLE_WORDS))).title()
+
+    def content(self):
+        """
+        Return paragraphs of sentences totalling a log-normal number of words
+        """
+        total = min(
+            max(round(self.rng.lognormvariate(self.content_mu, CONTENT_SIGMA)), 1),
+            CONTENT_WORDS_MAX,
+        )
+        words = self.words(total)
+        paragraphs, sentences, start = [], [], 0
+        paragraph_length = self.rng.randint(*PARAGRAPH_SENTENCES)
+        while start < total:
+            end = start + self.rng.randint(*SENTENCE_WORDS)
+            sentences.append(" ".join(words[start:end]).capitalize() + ".")
+            start = end
+            if len(sentences) == paragraph_length or start >= total:
+                paragraphs.append(" ".join(sentences))
+                sentences = []
+                paragraph_length = self.rng.randint(*PARAGRAPH_SENTENCES)
+        return "\n\n".join(paragraphs)
+
+    def timestamps(self):
+        """
+        Return `(created_at, modified_at)`, recent dates being the most frequent
+        """
+        age = self.span * (1 - math.sqrt(self.rng.random()))
+        created_at = self.until - timedelta(seconds=age)
+        modified_at = created_at
+        if self.rng.random() < EDITED_SHARE:
+            modified_at = min(created_at + EDIT_DELAY * self.rng.random(), self.until)
+        return created_at, modified_at
+
+    def author(self, author_ids):
+        """
+        Return an author id; low indexes write far more blogs than high ones
+        """
+        return author_ids[int(len(author_ids) * self.rng.random() ** 3)]
+
+    def blogs(self, count, author_ids):
+        """
+        Yield `count` unsaved blogs written by `author_ids`
+        """
+        for _ in range(count):
+            created_at, modified_at = self.timestamps()
+            yield Blog(
+                title=self.title(),
+                content=self.content(),
+                created_at=created_at,
+                modified_at=modified_at,
+                author_id=self.author(author_ids),
+            )
+
+
+@contextmanager
+def explicit_timestamps():
+    """
+    Let `bulk_create` keep the given `created_at` and `modified_at` values
+    instead of overwriting them with the current time
+    """
+    fields = [
+        field
+        for field in Blog._meta.concrete_fields
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def seed_users(count, prefix, password, batch_size):
+    """
+    Create users `<prefix>0000000` to `<prefix><count - 1>`, keeping existing ones.
+    Returns the ids of all of them, in username order.
+    """
+    user_model = get_user_model()
+    password_hash = make_password(password)
+    names = (f"{prefix}{number:07d}" for number in range(count))
+    for batch in batched(names, batch_size):
+        with transaction.atomic():
+            user_model.objects.bulk_create(
+                [user_model(username=name, password=password_hash) for name in batch],
+                ignore_conflicts=True,
+            )
+        connection.queries_log.clear()
+    return list(
+        user_model.objects.filter(username__startswith=prefix)
+        .order_by("username")
+        .values_list("id", flat=True)[:count]
+    )
+
+
+def reserve_blog_ids(count):
+    """
+    Take `count` ids from the PostgreSQL sequence of the blog table
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence('myapp_blog', 'id')) "
+            "FROM generate_series(1, %s)",
+            [count],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def copy_blogs(blogs):
+    """
+    Write unsaved blogs and their content with PostgreSQL COPY, assigning their ids
+    """
+    for blog, pk in zip(blogs, reserve_blog_ids(len(blogs))):
+        blog.id = pk
+    with connection.cursor() as cursor:
+        with cursor.copy(
+            f"COPY myapp_blog ({', '.join(BLOG_COLUMNS)}) FROM STDIN"
+        ) as copy:
+            for blog in blogs:
+                copy.write_row([getattr(blog, column) for column in BLOG_COLUMNS])
+        with cursor.copy(
+            f"COPY myapp_blogcontent ({', '.join(CONTENT_COLUMNS)}) FROM STDIN"
+        ) as copy:
+            for blog in blogs:
+                stored = BlogContent.encode(blog.content)
+                copy.write_row([blog.id, stored["text"], stored["compressed"]])
+
+
+def insert_blogs(blogs, index):
+    """
+    Write one batch of unsaved blogs in a transaction, index them for search
+    and count them in the stats rollups
+    """
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            copy_blogs(blogs)
+        else:
+            with explicit_timestamps():
+                Blog.objects.bulk_create(blogs)
+        if index:
+            search.index_blogs(blogs)
+        stats.record(added=[stats.blog_key(blog) for blog in blogs])
+    # Under DEBUG every statement is kept, along with its parameters
+    connection.queries_log.clear()
+
+
+def seed(
+    users,
+    blogs,
+    *,
+    seed_value=0,
+    until=None,
+    years=5,
+    content_words=300,
+    batch_size=2000,
+    user_prefix="seed_user_",
+    password=None,
+    index=True,
+    progress=None,
+):
+    """
+    Create `users` users and `blogs` blogs written by them.
+    `progress` is called with the number of blogs written after every batch.
+    Returns:
+        dict: Numbers of seeded users and blogs.
+    """
+    # pylint: disable=too-many-arguments
+    if users < 1:
+        raise ValueError("At least one user is needed to author blogs.")
+    until = until or datetime.now(dt_timezone.utc).date()
+    generator = BlogGenerator(seed_value, until, years, content_words)
+    author_ids = seed_users(users, user_prefix, password, batch_size)
+
+    written = 0
+    for batch in batched(generator.blogs(blogs, author_ids), batch_size):
+        insert_blogs(batch, index)
+        written += len(batch)
+        if progress is not None:
+            progress(written)
+    if written:
+        blog_cache.bump()
+    return {"users": len(author_ids), "blogs": written}
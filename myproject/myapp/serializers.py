@@ -4,11 +4,187 @@ It defines a BlogSerializer class that handles serialization, deserialization, a
 for the Blog objects in the Django REST Framework API.
 """
 
+from functools import lru_cache, partial
+from operator import itemgetter
+from types import MappingProxyType
+
+from django.conf import settings
+from django.db.models import QuerySet
+from django.db.models.functions import Left
+from django.db.models.manager import BaseManager
+from django.utils import timezone
 from rest_framework import serializers
-from myapp.models import Blog
+from rest_framework.exceptions import ValidationError
+from myapp.middleware import timed
+from myapp.models import Blog, BlogContent
+
+# Shared by the fast path so datetimes are formatted exactly like ModelSerializer
+DATETIME_FIELD = serializers.DateTimeField()
+
+# Name of the database-side content excerpt
+EXCERPT = "content_excerpt"
+# Columns of the content of a blog, in its `BlogContent` row
+CONTENT_COLUMNS = ("body__text", "body__compressed")
+# Columns read by the fast path for each field
+ROW_COLUMNS = {
+    "id": ("id",),
+    "title": ("title",),
+    "content": CONTENT_COLUMNS,
+    "created_at": ("created_at",),
+    "modified_at": ("modified_at",),
+    "author": ("author__username",),
+}
+# Columns read even when not requested, since pages and the change feed are
+# positioned by them
+KEY_COLUMNS = ("id", "created_at", "modified_at")
+
+
+def read_content(row):
+    """
+    Return the content of a `.values()` row
+    """
+    return BlogContent.decode(row["body__text"], row["body__compressed"])
+
+
+def read_excerpt(row, length):
+    """
+    Return the content excerpt of a `.values()` row: cut by the database, or
+    here when the content is compressed
+    """
+    if row["body__compressed"] is None:
+        return row[EXCERPT] or ""
+    return BlogContent.decode(None, row["body__compressed"])[:length]
+
 
+# Representation of each field from a `.values()` row, for sparse fieldsets
+ROW_READERS = {
+    "id": itemgetter("id"),
+    "title": itemgetter("title"),
+    "content": read_content,
+    "created_at": lambda row: DATETIME_FIELD.to_representation(row["created_at"]),
+    "modified_at": lambda row: DATETIME_FIELD.to_representation(row["modified_at"]),
+    "author": itemgetter("author__username"),
+}
 
-class BlogSerializer(serializers.ModelSerializer):
+
+class ExcerptField(serializers.Field):
+    """
+    Read-only content excerpt of a blog loaded by `BlogSerializer.select`
+    """
+
+    # pylint: disable=abstract-method
+    def __init__(self, length, **kwargs):
+        super().__init__(source="*", read_only=True, **kwargs)
+        self.length = length
+
+    def to_representation(self, value):
+        try:
+            compressed = value.body.compressed
+        except BlogContent.DoesNotExist:
+            return ""
+        if compressed is None:
+            return getattr(value, EXCERPT) or ""
+        return BlogContent.decode(None, compressed)[: self.length]
+
+
+class TimedDataMixin:
+    """
+    Count the time spent building `.data` as serializer time of the request
+    """
+
+    @property
+    def data(self):
+        """
+        The serialized data, timed
+        """
+        with timed("serialize"):
+            return super().data
+
+
+class BlogListSerializer(TimedDataMixin, serializers.ListSerializer):
+    """
+    List serializer with a fast read-only path.
+    Querysets are read with `.values()` so the author username comes from the same
+    query, and each row is turned into a dict directly instead of going through
+    the per-field `to_representation` machinery. Model instances are still
+    serialized by the child serializer.
+
+    Writes are set based: `create` uses `bulk_create` and `update` uses a single
+    `bulk_update` statement per batch. For updates, `instance` is the list of
+    blogs referenced by the `id` of each item.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, BaseManager) else data
+        if isinstance(iterable, QuerySet) and iterable.model is Blog:
+            iterable = self.child.rows(iterable)
+
+        child = self.child
+        return [
+            child.row_to_representation(item)
+            if isinstance(item, dict)
+            else child.to_representation(item)
+            for item in iterable
+        ]
+
+    def run_child_validation(self, data):
+        if self.instance is None:
+            return super().run_child_validation(data)
+
+        if not isinstance(data, dict) or "id" not in data:
+            raise serializers.ValidationError({"id": ["This field is required."]})
+        instance = self.instances_by_id.get(data["id"])
+        if instance is None:
+            raise serializers.ValidationError({"id": ["Not found."]})
+        if instance.author_id != self.context["request"].user.id:
+            raise serializers.ValidationError(
+                {"detail": "You do not have permission to update this blog."}
+            )
+
+        self.child.instance = instance
+        self.child.initial_data = data
+        validated = super().run_child_validation(data)
+        validated["id"] = instance.id
+        return validated
+
+    @property
+    def instances_by_id(self):
+        """
+        Blogs being updated, keyed by id
+        """
+        if not hasattr(self, "_instances_by_id"):
+            self._instances_by_id = {blog.id: blog for blog in self.instance}
+        return self._instances_by_id
+
+    def create(self, validated_data):
+        """
+        Insert every blog with `bulk_create`, authored by the requesting user
+        """
+        author = self.context["request"].user
+        blogs = [Blog(author=author, **attrs) for attrs in validated_data]
+        return Blog.objects.bulk_create(blogs, batch_size=settings.BLOG_BULK_BATCH_SIZE)
+
+    def update(self, instance, validated_data):
+        """
+        Apply every item and write all changes with `bulk_update`
+        """
+        modified_at = timezone.now()
+        fields = {"modified_at"}
+        blogs = []
+        for attrs in validated_data:
+            blog = self.instances_by_id[attrs.pop("id")]
+            for name, value in attrs.items():
+                setattr(blog, name, value)
+            blog.modified_at = modified_at
+            fields.update(attrs)
+            blogs.append(blog)
+        Blog.objects.bulk_update(
+            blogs, sorted(fields), batch_size=settings.BLOG_BULK_BATCH_SIZE
+        )
+        return blogs
+
+
+class BlogSerializer(TimedDataMixin, serializers.ModelSerializer):
     """
     Serializer for the Blog model.
     Convert Blog model instances to JSON format and vice versa.
@@ -16,6 +192,9 @@ class BlogSerializer(serializers.ModelSerializer):
     Ensures that the 'author' field is read-only on both serialization and deserialization.
     """
 
+    # Not a model field, see `Blog.content`
+    content = serializers.CharField(style={"base_template": "textarea.html"})
+
     class Meta:
         """
         Defines the model to be serialized and the fields to include in the serialization process.
@@ -24,6 +203,106 @@ class BlogSerializer(serializers.ModelSerializer):
         model = Blog
         fields = ["id", "title", "content", "created_at", "modified_at", "author"]
         read_only_fields = ["author"]
+        list_serializer_class = BlogListSerializer
+
+    def __init__(self, *args, fields=None, excerpt=None, **kwargs):
+        """
+        `fields` restricts the representation to these field names, and
+        `excerpt` cuts `content` to that many characters in the database, or
+        after decompressing it when it is stored compressed.
+        Both only apply to reads.
+        """
+        super().__init__(*args, **kwargs)
+        self.sparse = fields is not None or bool(excerpt)
+        self.excerpt = None
+        self.row_readers = None
+        if not self.sparse:
+            return
+        if fields is not None:
+            for name in [name for name in self.fields if name not in fields]:
+                self.fields.pop(name)
+        if excerpt and "content" in self.fields:
+            self.excerpt = excerpt
+            self.fields["content"] = ExcerptField(excerpt)
+        self.row_readers = [
+            (
+                name,
+                (
+                    partial(read_excerpt, length=self.excerpt)
+                    if name == "content" and self.excerpt
+                    else ROW_READERS[name]
+                ),
+            )
+            for name in self.fields
+        ]
+
+    def rows(self, queryset):
+        """
+        Return `queryset` as `.values()` rows holding the requested fields, with
+        the author username and the content joined in. The pagination and
+        change feed keys are always read.
+        """
+        if queryset.query.values_select:
+            return queryset
+        columns = [
+            column
+            for name in self.fields
+            if not (name == "content" and self.excerpt)
+            for column in ROW_COLUMNS[name]
+        ]
+        columns += [column for column in KEY_COLUMNS if column not in columns]
+        if self.excerpt:
+            if EXCERPT not in queryset.query.annotations:
+                queryset = queryset.annotate(
+                    **{EXCERPT: Left("body__text", self.excerpt)}
+                )
+            columns += [EXCERPT, "body__compressed"]
+        return queryset.values(*columns)
+
+    def select(self, queryset):
+        """
+        Restrict a model queryset with `only()` to the columns of the requested
+        fields, joining the content and the author only when they are requested
+        """
+        if not self.sparse:
+            return queryset.select_related("body")
+        names, related = [], []
+        for name in self.fields:
+            if name == "author":
+                names.append("author__username")
+                related.append("author")
+            elif name == "content":
+                related.append("body")
+                if self.excerpt:
+                    names.append("body__compressed")
+                    queryset = queryset.annotate(
+                        **{EXCERPT: Left("body__text", self.excerpt)}
+                    )
+                else:
+                    names.extend(CONTENT_COLUMNS)
+            else:
+                names.append(name)
+        queryset = queryset.select_related(None)
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset.only(*names)
+
+    def row_to_representation(self, row):
+        """
+        Build the representation of a `.values()` row.
+        Produces exactly the same output as `to_representation`.
+        """
+        if self.sparse:
+            return {name: read(row) for name, read in self.row_readers}
+        to_datetime = DATETIME_FIELD.to_representation
+        return {
+            "id": row["id"],
+            "title": row["title"],
+            "content": read_content(row),
+            "created_at": to_datetime(row["created_at"]),
+            "modified_at": to_datetime(row["modified_at"]),
+            "author": row["author__username"],
+        }
 
     def create(self, validated_data):
         """
@@ -45,5 +324,48 @@ class BlogSerializer(serializers.ModelSerializer):
         Customize the representation of the Blog instance
         """
         representation = super().to_representation(obj)
-        representation["author"] = obj.author.username
+        if "author" in representation:
+            representation["author"] = obj.author.username
         return representation
+
+
+FIELDSET_FIELDS = tuple(BlogSerializer.Meta.fields)
+EXCERPT_FIELD = serializers.IntegerField(min_value=1)
+
+
+def get_fieldset(query_params):
+    """
+    Return the `fields` and `excerpt` read params as `BlogSerializer` kwargs.
+    Blank params are ignored.
+    Raises:
+        ValidationError: When a field is unknown or the excerpt length is invalid.
+    """
+    return parse_fieldset(
+        query_params.get("fields", ""), query_params.get("excerpt", "")
+    )
+
+
+@lru_cache(maxsize=256)
+def parse_fieldset(fields, excerpt):
+    """
+    Validate the raw `fields` and `excerpt` params; memoized per distinct input
+    """
+    errors = {}
+    names = None
+    if fields.strip():
+        names = frozenset(name.strip() for name in fields.split(",") if name.strip())
+        unknown = sorted(names.difference(FIELDSET_FIELDS))
+        if unknown:
+            errors["fields"] = [
+                f"Unknown fields: {', '.join(unknown)}. "
+                f"Choose from {', '.join(FIELDSET_FIELDS)}."
+            ]
+    length = None
+    if excerpt.strip():
+        try:
+            length = EXCERPT_FIELD.run_validation(excerpt)
+        except ValidationError as exc:
+            errors["excerpt"] = exc.detail
+    if errors:
+        raise ValidationError(errors)
+    return MappingProxyType({"fields": names, "excerpt": length})
@@ -0,0 +1,43 @@
+"""
+Signal receivers for the Blog and User models and database connections
+"""
+
+from django.contrib.auth import get_user_model
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.settings import api_settings
+
+from . import search
+from .authentication import user_cache
+from .middleware import instrument_connection
+from .models import Blog
+
+
+@receiver(post_save, sender=Blog)
+def index_saved_blog(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Index a saved blog for full-text search once its transaction commits
+    """
+    search.index_blogs_later([instance.id])
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_cached_user(
+    sender, instance, **kwargs
+):  # pylint: disable=unused-argument
+    """
+    Evict changed, deactivated and deleted users from the authentication cache
+    """
+    user_cache.invalidate(getattr(instance, api_settings.USER_ID_FIELD))
+
+
+@receiver(connection_created)
+def instrument_new_connection(
+    sender, connection, **kwargs
+):  # pylint: disable=unused-argument
+    """
+    Count and time the queries of every connection for the performance middleware
+    """
+    instrument_connection(connection)
@@ -0,0 +1,277 @@
+"""
+Rollups of blog counts per creation day, creation month and author.
+
+`BlogStat` holds one row per bucket, plus a total. The write paths of
+`BlogViewSet` call `record_later`, which enqueues the keys of the blogs they
+add and remove as a background task once the write commits. A batch of tasks
+is merged into one count delta per bucket and applied with a single upsert
+statement, in a transaction so that a failed batch can be retried; rollups
+lag writes by the queue delay. Reading statistics then costs a few indexed
+lookups of bounded size, however many blogs exist.
+
+Days and months are those of `created_at` in the default timezone. `rebuild`
+recomputes every rollup from the blog table, to backfill existing data or
+repair drift after writes that bypass the API or tasks lost with their
+process. Run it while no task is queued, since a queued delta is applied on
+top of the rebuilt counts.
+"""
+
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import tasks
+from .filters import DATE_FORMATS
+from .models import Blog, BlogStat
+
+# Background task applying the changes of writes to the rollups
+RECORD_TASK = "stats.record"
+
+UPSERT = (
+    "INSERT INTO myapp_blogstat (dimension, bucket, count) VALUES (%s, %s, %s) "
+    "ON CONFLICT (dimension, bucket) "
+    "DO UPDATE SET count = myapp_blogstat.count + excluded.count"
+)
+
+
+def blog_key(blog):
+    """
+    Return the `(author_id, created_at)` pair deciding the buckets of a blog
+    """
+    return blog.author_id, blog.created_at
+
+
+def buckets(author_id, created_at):
+    """
+    Return the `(dimension, bucket)` pairs counting a blog
+    """
+    day = timezone.localtime(created_at, timezone.get_default_timezone()).date()
+    return [
+        (BlogStat.DAY, day.isoformat()),
+        (BlogStat.MONTH, day.isoformat()[:7]),
+        (BlogStat.AUTHOR, str(author_id)),
+        (BlogStat.TOTAL, ""),
+    ]
+
+
+def record(added=(), removed=()):
+    """
+    Count the blogs with keys `added` and stop counting those with keys `removed`.
+    Keys are `blog_key` pairs. Runs in the caller's transaction, so the rollups
+    are committed or rolled back along with the blogs.
+    """
+    deltas = Counter()
+    for key in added:
+        deltas.update(buckets(*key))
+    for key in removed:
+        deltas.subtract(buckets(*key))
+    # A fixed order keeps concurrent upserts from deadlocking on each other's rows
+    rows = [
+        (dimension, bucket, delta)
+        for (dimension, bucket), delta in sorted(deltas.items())
+        if delta
+    ]
+    if rows:
+        with connection.cursor() as cursor:
+            cursor.executemany(UPSERT, rows)
+
+
+def record_later(added=(), removed=()):
+    """
+    Apply `record(added, removed)` in the background once the current
+    transaction commits
+    """
+    if added or removed:
+        tasks.enqueue(
+            RECORD_TASK,
+            {
+                "added": [
+                    [author_id, created_at.isoformat()]
+                    for author_id, created_at in added
+                ],
+                "removed": [
+                    [author_id, created_at.isoformat()]
+                    for author_id, created_at in removed
+                ],
+            },
+        )
+
+
+@tasks.task(RECORD_TASK)
+def record_changes(payloads):
+    """
+    Apply a batch of record tasks to the rollups at once
+    """
+
+    def keys(name):
+        return [
+            (author_id, datetime.fromisoformat(created_at))
+            for payload in payloads
+            for author_id, created_at in payload[name]
+        ]
+
+    with transaction.atomic():
+        record(added=keys("added"), removed=keys("removed"))
+
+
+def rebuild():
+    """
+    Recompute every rollup from the blog table.
+    On PostgreSQL the table is locked against concurrent `record` calls, which
+    wait and apply their deltas on top of the rebuilt counts.
+    """
+    default_timezone = timezone.get_default_timezone()
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("LOCK TABLE myapp_blogstat IN SHARE ROW EXCLUSIVE MODE")
+        BlogStat.objects.all().delete()
+
+        blogs = Blog.objects.order_by()
+        days = blogs.values_list(
+            TruncDate("created_at", tzinfo=default_timezone)
+        ).annotate(Count("id"))
+        months = blogs.values_list(
+            TruncMonth("created_at", tzinfo=default_timezone)
+        ).annotate(Count("id"))
+        authors = blogs.values_list("author_id").annotate(Count("id"))
+
+        rows = [BlogStat(dimension=BlogStat.TOTAL, bucket="", count=blogs.count())]
+        rows += [
+            BlogStat(dimension=BlogStat.DAY, bucket=day.isoformat(), count=count)
+            for day, count in days.iterator()
+        ]
+        rows += [
+            BlogStat(
+                dimension=BlogStat.MONTH,
+                bucket=month.date().isoformat()[:7],
+                count=count,
+            )
+            for month, count in months.iterator()
+        ]
+        rows += [
+            BlogStat(dimension=BlogStat.AUTHOR, bucket=str(author_id), count=count)
+            for author_id, count in authors.iterator()
+        ]
+        BlogStat.objects.bulk_create(rows, batch_size=settings.BLOG_BULK_BATCH_SIZE)
+    return len(rows)
+
+
+class StatsParamsSerializer(serializers.Serializer):
+    """
+    Query params of the stats endpoint
+    """
+
+    # pylint: disable=abstract-method
+    start_date = serializers.DateField(required=False, input_formats=DATE_FORMATS)
+    end_date = serializers.DateField(required=False, input_formats=DATE_FORMATS)
+    author = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, attrs):
+        end_date = attrs.get("end_date") or timezone.localdate(
+            timezone=timezone.get_default_timezone()
+        )
+        start_date = attrs.get("start_date") or end_date - timedelta(
+            days=settings.BLOG_STATS_DEFAULT_DAYS - 1
+        )
+        if start_date > end_date:
+            raise serializers.ValidationError(
+                {"end_date": ["Must not be before start_date."]}
+            )
+        if (end_date - start_date).days >= settings.BLOG_STATS_MAX_DAYS:
+            raise serializers.ValidationError(
+                {
+                    "end_date": [
+                        f"Ensure the range spans at most "
+                        f"{settings.BLOG_STATS_MAX_DAYS} days."
+                    ]
+                }
+            )
+        return {**attrs, "start_date": start_date, "end_date": end_date}
+
+
+def month_starts(start_date, end_date):
+    """
+    Return the first day of every month from `start_date` to `end_date`
+    """
+    month = start_date.replace(day=1)
+    months = []
+    while month <= end_date:
+        months.append(month)
+        month = (month + timedelta(days=32)).replace(day=1)
+    return months
+
+
+def get_stats(start_date, end_date, author=None):
+    """
+    Return the blog counts of every day and month from `start_date` to
+    `end_date`, zeros included, the total, and the counts of the most prolific
+    authors, or of `author` only
+    """
+    days = [
+        start_date + timedelta(days=offset)
+        for offset in range((end_date - start_date).days + 1)
+    ]
+    months = month_starts(start_date, end_date)
+    day_counts = dict(
+        BlogStat.objects.filter(
+            dimension=BlogStat.DAY,
+            bucket__gte=start_date.isoformat(),
+            bucket__lte=end_date.isoformat(),
+        ).values_list("bucket", "count")
+    )
+    month_counts = dict(
+        BlogStat.objects.filter(
+            dimension=BlogStat.MONTH,
+            bucket__gte=months[0].isoformat()[:7],
+            bucket__lte=months[-1].isoformat()[:7],
+        ).values_list("bucket", "count")
+    )
+    total = (
+        BlogStat.objects.filter(dimension=BlogStat.TOTAL)
+        .values_list("count", flat=True)
+        .first()
+    )
+
+    author_stats = BlogStat.objects.filter(dimension=BlogStat.AUTHOR, count__gt=0)
+    if author is not None:
+        author_stats = author_stats.filter(bucket=str(author))
+    else:
+        author_stats = author_stats.order_by("-count", "bucket")[
+            : settings.BLOG_STATS_TOP_AUTHORS
+        ]
+    author_counts = [
+        (int(bucket), count)
+        for bucket, count in author_stats.values_list("bucket", "count")
+    ]
+    usernames = dict(
+        get_user_model()
+        .objects.filter(id__in=[author_id for author_id, _ in author_counts])
+        .values_list("id", "username")
+    )
+
+    return {
+        "total": total or 0,
+        "days": [
+            {"date": day.isoformat(), "count": day_counts.get(day.isoformat(), 0)}
+            for day in days
+        ],
+        "months": [
+            {
+                "month": month.isoformat()[:7],
+                "count": month_counts.get(month.isoformat()[:7], 0),
+            }
+            for month in months
+        ],
+        "authors": [
+            {"id": author_id, "username": usernames.get(author_id), "count": count}
+            for author_id, count in author_counts
+        ],
+    }
@@ -0,0 +1,357 @@
+"""
+Background tasks run after Blog writes.
+
+Side effects that need not delay the response of a write are registered with
+`@task(name)` and enqueued by the write paths with `enqueue(name, payload)`.
+Handlers receive a list of payloads: the waiting tasks of a kind are run as one
+batch of up to `BLOG_TASKS_BATCH_SIZE`, so a burst of writes costs a query per
+batch rather than per write. A failing batch is retried up to
+`BLOG_TASKS_MAX_ATTEMPTS` times, waiting `BLOG_TASKS_RETRY_SECONDS` doubled per
+attempt, so handlers must be idempotent.
+
+Tasks are handed to a pool of `BLOG_TASKS_WORKERS` threads of the process once
+the transaction of the write commits, and never run if it rolls back. They are
+lost if the process stops before running them. With `BLOG_TASKS_DURABLE`, tasks
+are instead written to the `BlogTask` table in the transaction of the write and
+run by the `run_blog_tasks` management command: a batch runs in the transaction
+deleting its rows, several workers share the table through `SKIP LOCKED`, and
+tasks failing their last attempt are kept with their error.
+
+The depth and lag of both queues, waits, run times and outcomes are exported to
+Prometheus.
+"""
+
+import heapq
+import logging
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+from itertools import count
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .metrics import (
+    TASK_QUEUE_DEPTH,
+    TASK_QUEUE_LAG_SECONDS,
+    TASK_RUN_SECONDS,
+    TASK_RUNS,
+    TASK_WAIT_SECONDS,
+)
+from .models import BlogTask
+
+logger = logging.getLogger(__name__)
+
+# Queue labels of the metrics
+MEMORY = "memory"
+DATABASE = "database"
+
+
+class Task:
+    """
+    A registered kind of task; unset limits follow the settings
+    """
+
+    def __init__(self, name, handler, batch_size=None, max_attempts=None):
+        self.name = name
+        self.handler = handler
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+
+
+registry = {}
+
+
+def task(name, batch_size=None, max_attempts=None):
+    """
+    Register the decorated function as the handler of the tasks `name`.
+    It is called with the list of payloads of a batch.
+    """
+
+    def register(handler):
+        registry[name] = Task(name, handler, batch_size, max_attempts)
+        return handler
+
+    return register
+
+
+def batch_limit(name):
+    """
+    Return the most tasks `name` run in one batch
+    """
+    registered = registry.get(name)
+    return (registered and registered.batch_size) or settings.BLOG_TASKS_BATCH_SIZE
+
+
+def attempt_limit(name):
+    """
+    Return how many times a task `name` is attempted
+    """
+    registered = registry.get(name)
+    return (registered and registered.max_attempts) or settings.BLOG_TASKS_MAX_ATTEMPTS
+
+
+def retry_delay(attempts):
+    """
+    Return the seconds to wait before retrying a task that failed `attempts` times
+    """
+    return settings.BLOG_TASKS_RETRY_SECONDS * 2 ** (attempts - 1)
+
+
+def enqueue(name, payload):
+    """
+    Run the task `name` with a JSON serializable `payload` once the current
+    transaction commits
+    Raises:
+        KeyError: If no task is registered under `name`.
+    """
+    if name not in registry:
+        raise KeyError(f"Unknown task {name!r}.")
+    if settings.BLOG_TASKS_DURABLE:
+        BlogTask.objects.create(name=name, payload=payload, run_after=timezone.now())
+    else:
+        transaction.on_commit(lambda: executor.submit(name, payload))
+
+
+def execute(name, payloads):
+    """
+    Run the handler of the tasks `name` on a batch of payloads
+    Raises:
+        LookupError: If no task is registered under `name`.
+    """
+    registered = registry.get(name)
+    if registered is None:
+        raise LookupError(f"Unknown task {name!r}.")
+    started = time.perf_counter()
+    try:
+        registered.handler(payloads)
+    finally:
+        TASK_RUN_SECONDS.labels(name).observe(time.perf_counter() - started)
+    TASK_RUNS.labels(name, "succeeded").inc(len(payloads))
+
+
+def should_retry(name, attempts):
+    """
+    Count a failed attempt of a task `name` and return whether it is retried
+    """
+    retried = attempts < attempt_limit(name)
+    TASK_RUNS.labels(name, "retried" if retried else "failed").inc()
+    return retried
+
+
+class Pending:
+    """
+    A task of the in-memory queue, due at `due` on the monotonic clock
+    """
+
+    def __init__(self, name, payload, due):
+        self.name = name
+        self.payload = payload
+        self.due = due
+        self.attempts = 0
+
+
+class TaskExecutor:
+    """
+    Queue and thread pool running the tasks of this process.
+    Threads are started on first use; without workers, tasks run in the caller.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers
+        self.condition = threading.Condition()
+        self.ready = deque()
+        # (due, sequence, pending) of the tasks waiting to be retried
+        self.delayed = []
+        self.sequence = count()
+        self.threads = []
+
+    def submit(self, name, payload):
+        """
+        Queue a task, or run it at once when the pool has no workers
+        """
+        pending = Pending(name, payload, time.monotonic())
+        workers = settings.BLOG_TASKS_WORKERS if self.workers is None else self.workers
+        if not workers:
+            # Retried without waiting, as the caller is blocked meanwhile
+            batch = [pending]
+            while batch:
+                batch = self.run(batch)
+            return
+        with self.condition:
+            self.ready.append(pending)
+            while len(self.threads) < workers:
+                thread = threading.Thread(
+                    target=self.work,
+                    name=f"blog-tasks-{len(self.threads)}",
+                    daemon=True,
+                )
+                self.threads.append(thread)
+                thread.start()
+            self.condition.notify()
+
+    def take(self):
+        """
+        Wait for a due task and return it with the ready tasks of its kind,
+        up to the batch size of the kind
+        """
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                while self.delayed and self.delayed[0][0] <= now:
+                    self.ready.append(heapq.heappop(self.delayed)[2])
+                if self.ready:
+                    break
+                self.condition.wait(self.delayed[0][0] - now if self.delayed else None)
+            first = self.ready.popleft()
+            limit = batch_limit(first.name)
+            batch, rest = [first], deque()
+            for pending in self.ready:
+                if pending.name == first.name and len(batch) < limit:
+                    batch.append(pending)
+                else:
+                    rest.append(pending)
+            self.ready = rest
+        return batch
+
+    def run(self, batch):
+        """
+        Run a batch of tasks of one kind.
+        Returns the tasks to retry, their attempts counted.
+        """
+        name = batch[0].name
+        started = time.monotonic()
+        for pending in batch:
+            TASK_WAIT_SECONDS.labels(name).observe(max(started - pending.due, 0))
+        try:
+            execute(name, [pending.payload for pending in batch])
+        except Exception:  # pylint: disable=broad-exception-caught
+            retries = []
+            for pending in batch:
+                pending.attempts += 1
+                if should_retry(name, pending.attempts):
+                    retries.append(pending)
+            if len(retries) < len(batch):
+                logger.exception("Background task %s failed, giving up", name)
+            return retries
+        return []
+
+    def retry(self, batch):
+        """
+        Queue failed tasks again once their retry delay has passed
+        """
+        with self.condition:
+            for pending in batch:
+                pending.due = time.monotonic() + retry_delay(pending.attempts)
+                heapq.heappush(
+                    self.delayed, (pending.due, next(self.sequence), pending)
+                )
+            self.condition.notify()
+
+    def work(self):
+        """
+        Run the queued tasks until the process exits
+        """
+        while True:
+            batch = self.take()
+            close_old_connections()
+            try:
+                retries = self.run(batch)
+            finally:
+                close_old_connections()
+            if retries:
+                self.retry(retries)
+
+    def due(self):
+        """
+        Return the due times of the tasks waiting to run
+        """
+        now = time.monotonic()
+        with self.condition:
+            return [pending.due for pending in self.ready] + [
+                due for due, _, _ in self.delayed if due <= now
+            ]
+
+    def depth(self):
+        """
+        Return the number of due tasks waiting to run
+        """
+        return len(self.due())
+
+    def lag(self):
+        """
+        Return the seconds the oldest due task has been waiting
+        """
+        return time.monotonic() - min(self.due(), default=time.monotonic())
+
+
+executor = TaskExecutor()
+# Read at scrape time rather than updated by every task
+TASK_QUEUE_DEPTH.labels(MEMORY).set_function(executor.depth)
+TASK_QUEUE_LAG_SECONDS.labels(MEMORY).set_function(executor.lag)
+
+
+def durable_due(now):
+    """
+    Return the tasks of the durable queue due at `now`, oldest first
+    """
+    return BlogTask.objects.filter(failed_at__isnull=True, run_after__lte=now)
+
+
+def run_durable_batch():
+    """
+    Claim the oldest due task of the durable queue with the due tasks of its
+    kind, up to the batch size of the kind, and run them.
+    Returns:
+        int: Number of tasks run, 0 when none is due.
+    """
+    with transaction.atomic():
+        now = timezone.now()
+        due = (
+            durable_due(now)
+            .select_for_update(skip_locked=True)
+            .order_by("run_after", "id")
+        )
+        head = due.first()
+        if head is None:
+            return 0
+        rows = [head] + list(
+            due.filter(name=head.name).exclude(id=head.id)[: batch_limit(head.name) - 1]
+        )
+        for row in rows:
+            TASK_WAIT_SECONDS.labels(row.name).observe(
+                (now - row.run_after).total_seconds()
+            )
+        try:
+            with transaction.atomic():
+                execute(head.name, [row.payload for row in rows])
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            for row in rows:
+                row.attempts += 1
+                row.last_error = repr(exc)
+                if should_retry(row.name, row.attempts):
+                    row.run_after = now + timedelta(seconds=retry_delay(row.attempts))
+                else:
+                    row.failed_at = now
+            if any(row.failed_at for row in rows):
+                logger.exception("Background task %s failed, giving up", head.name)
+            BlogTask.objects.bulk_update(
+                rows, ["attempts", "last_error", "run_after", "failed_at"]
+            )
+        else:
+            BlogTask.objects.filter(id__in=[row.id for row in rows]).delete()
+    return len(rows)
+
+
+def measure_durable_queue():
+    """
+    Export the depth and lag of the durable queue
+    """
+    now = timezone.now()
+    due = durable_due(now).aggregate(depth=Count("id"), oldest=Min("run_after"))
+    TASK_QUEUE_DEPTH.labels(DATABASE).set(due["depth"])
+    oldest = due["oldest"] or now
+    TASK_QUEUE_LAG_SECONDS.labels(DATABASE).set((now - oldest).total_seconds())
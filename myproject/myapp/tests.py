@@ -1,18 +1,105 @@
 """Test suit for application"""
 
-from datetime import date, timedelta
+import asyncio
+import base64
+import gzip
+import hashlib
+import importlib
+import importlib.util
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+from datetime import date, datetime, timedelta
+from datetime import timezone as dt_timezone
 
-from django.test import TestCase
-from django.urls import reverse
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import (
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.db.migrations.executor import MigrationExecutor
+from django.db.utils import ConnectionHandler
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from django.utils.translation import gettext_lazy
 from django.contrib.auth.models import User
+from prometheus_client import REGISTRY
 from rest_framework import status
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from myproject import settings as project_settings
+from myproject.asgi import application
 
-from .models import Blog
+from . import (
+    admission,
+    changefeed,
+    compression,
+    conditional,
+    events,
+    export,
+    filters,
+    routing,
+    search,
+    stats,
+    tasks,
+)
+from .async_views import AsyncBlogViewSet
+from .authentication import UserCache, user_cache
+from .cache import blog_cache
+from .metrics import DatabasePoolCollector
+from .models import Blog, BlogContent, BlogStat, BlogTask, BlogTombstone
+from .parsers import FastJSONParser
+from .renderers import FastJSONRenderer
+from .serializers import BlogSerializer
+from .views import BlogViewSet
 
+content_migration = importlib.import_module("myapp.migrations.0007_blog_content")
+POOL_AVAILABLE = all(
+    importlib.util.find_spec(name) for name in ("psycopg", "psycopg_pool")
+)
 
-class BlogViewSetTests(TestCase):
+
+# Background tasks run at commit in the test thread, whose connection alone
+# sees the data of the test
+@override_settings(BLOG_TASKS_WORKERS=0)
+class BlogAPITestCase(TestCase):
+    """Base test case clearing the response cache between tests"""
+
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+
+    def running_tasks(self):
+        """
+        Run the background tasks enqueued in the block once it exits, as if
+        its writes committed
+        """
+        return self.captureOnCommitCallbacks(execute=True)
+
+
+class BlogViewSetTests(BlogAPITestCase):
     def setUp(self):
+        super().setUp()
         self.client = APIClient()
         self.user1 = User.objects.create_user(username="admin1", password="admin1")
         self.user2 = User.objects.create_user(username="admin2", password="admin2")
@@ -85,7 +172,8 @@ class BlogViewSetTests(TestCase):
         """
         Search the blog by title
         """
-        self.create_blog()
+        with self.running_tasks():
+            self.create_blog()
         response = self.client.get(reverse("blog-list") + "?title=Test")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertNotEqual(response.data, [])
@@ -197,3 +285,2990 @@ class BlogViewSetTests(TestCase):
         )
         self.assertEqual(response_user1.status_code, status.HTTP_200_OK)
         self.assertEqual(Blog.objects.get().title, "Updated Test Blog")
+
+
+class KeysetPaginationTests(BlogAPITestCase):
+    """Keyset pagination on the list and date filter endpoints"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="pager", password="pager")
+        self.blogs = [
+            Blog.objects.create(title=f"Blog {i}", content="content", author=self.user)
+            for i in range(5)
+        ]
+        # Force a tie on created_at so ordering has to fall back to the id
+        Blog.objects.filter(id__in=[self.blogs[1].id, self.blogs[2].id]).update(
+            created_at=self.blogs[1].created_at
+        )
+        self.expected_ids = list(
+            Blog.objects.order_by("created_at", "id").values_list("id", flat=True)
+        )
+
+    def walk(self, url):
+        """
+        Follow `next` links from `url` and return the ids seen on each page
+        """
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append([blog["id"] for blog in response.data["results"]])
+            url = response.data["next"]
+        return pages
+
+    def test_list_pages_in_keyset_order(self):
+        """
+        Walking the pages returns every blog once, ordered by (created_at, id)
+        """
+        pages = self.walk(reverse("blog-list") + "?page_size=2")
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(sum(pages, []), self.expected_ids)
+
+    def test_previous_link_returns_previous_page(self):
+        """
+        The previous link of the second page points back at the first page
+        """
+        first = self.client.get(reverse("blog-list") + "?page_size=2")
+        second = self.client.get(first.data["next"])
+        self.assertIsNotNone(second.data["previous"])
+        previous = self.client.get(second.data["previous"])
+        self.assertEqual(previous.data["results"], first.data["results"])
+        self.assertIsNone(first.data["previous"])
+
+    def test_date_actions_are_paginated(self):
+        """
+        The date filter actions use the same pagination
+        """
+        day = self.blogs[0].created_at.date()
+        start_date = day - timedelta(days=1)
+        end_date = day + timedelta(days=1)
+        pages = self.walk(
+            reverse("blog-by-date-range")
+            + f"?start_date={start_date}&end_date={end_date}&page_size=3"
+        )
+        self.assertEqual(sum(pages, []), self.expected_ids)
+
+    def test_no_offset_or_count_queries(self):
+        """
+        Fetching a later page never issues OFFSET or COUNT
+        """
+        first = self.client.get(reverse("blog-list") + "?page_size=2")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(first.data["next"])
+        for query in queries.captured_queries:
+            self.assertNotIn("OFFSET", query["sql"].upper())
+            self.assertNotIn("COUNT(", query["sql"].upper())
+
+    def test_invalid_cursor(self):
+        """
+        A malformed cursor is rejected with 404, like DRF's cursor pagination
+        """
+        response = self.client.get(reverse("blog-list") + "?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BlogReadPathTests(BlogAPITestCase):
+    """Fast read-only serialization of blog lists"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user1 = User.objects.create_user(username="reader1", password="reader1")
+        self.user2 = User.objects.create_user(username="reader2", password="reader2")
+        for i in range(3):
+            Blog.objects.create(title=f"Blog {i}", content="content", author=self.user1)
+            Blog.objects.create(title=f"Post {i}", content="content", author=self.user2)
+
+    def test_list_matches_serializer_output(self):
+        """
+        The fast path produces exactly the same JSON as BlogSerializer
+        """
+        response = self.client.get(reverse("blog-list"))
+        expected = [
+            BlogSerializer(blog).data for blog in Blog.objects.order_by("created_at")
+        ]
+        results = sorted(response.json(), key=lambda blog: blog["created_at"])
+        self.assertEqual(results, json.loads(json.dumps(expected)))
+
+    def test_list_runs_a_single_query(self):
+        """
+        Listing blogs does not query the author table once per row
+        """
+        # One query for the conditional GET validators, one for the rows
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("blog-list"))
+        self.assertEqual(len(response.data), 6)
+
+    def test_paginated_list_runs_a_single_query(self):
+        """
+        Paginated pages also read their rows with a single query
+        """
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("blog-list") + "?page_size=4")
+        self.assertEqual(len(response.data["results"]), 4)
+        self.assertIn(response.data["results"][0]["author"], ["reader1", "reader2"])
+
+
+class DateFilterTests(BlogAPITestCase):
+    """Index friendly date filters"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="dates", password="dates")
+        self.blog = Blog.objects.create(title="Late", content="c", author=self.user)
+        # 03:00 UTC on January 2nd is still January 1st in New York
+        Blog.objects.filter(id=self.blog.id).update(
+            created_at=datetime(2024, 1, 2, 3, 0, tzinfo=dt_timezone.utc)
+        )
+
+    def get_ids(self, url):
+        """
+        Return the ids of the blogs returned by `url`
+        """
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [blog["id"] for blog in response.data]
+
+    def test_by_date_uses_current_timezone(self):
+        """
+        Day boundaries follow the current timezone
+        """
+        url = reverse("blog-by-date")
+        self.assertEqual(self.get_ids(url + "?date=2024-01-02"), [self.blog.id])
+        with override_settings(TIME_ZONE="America/New_York"):
+            self.assertEqual(self.get_ids(url + "?date=2024-01-01"), [self.blog.id])
+            self.assertEqual(self.get_ids(url + "?date=2024-01-02"), [])
+
+    def test_range_bounds_are_inclusive_days(self):
+        """
+        Both days of the range are included, and after/before exclude the day itself
+        """
+        url = reverse("blog-by-date-range")
+        self.assertEqual(
+            self.get_ids(url + "?start_date=2024-01-02&end_date=2024-01-02"),
+            [self.blog.id],
+        )
+        after = reverse("blog-created-after-date")
+        before = reverse("blog-created-before-date")
+        self.assertEqual(self.get_ids(after + "?date=2024-01-02"), [])
+        self.assertEqual(self.get_ids(after + "?date=2024-01-01"), [self.blog.id])
+        self.assertEqual(self.get_ids(before + "?date=2024-01-02"), [])
+        self.assertEqual(self.get_ids(before + "?date=2024-01-03"), [self.blog.id])
+
+    def test_filters_compare_the_raw_column(self):
+        """
+        The generated SQL does not cast created_at to a date
+        """
+        with CaptureQueriesContext(connection) as queries:
+            self.get_ids(reverse("blog-by-date") + "?date=2024-01-02")
+        sql = queries.captured_queries[-1]["sql"].lower()
+        self.assertNotIn("cast", sql)
+        self.assertNotIn("date(", sql)
+
+
+class ResponseCacheTests(BlogAPITestCase):
+    """Versioned response cache on the blog read endpoints"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="cached", password="cached")
+        self.author_client = APIClient()
+        self.author_client.force_authenticate(user=self.user)
+        self.blog = Blog.objects.create(title="Cached", content="c", author=self.user)
+
+    def sample(self, metric, action):
+        """
+        Return the current value of a cache counter for `action`
+        """
+        return REGISTRY.get_sample_value(metric, {"action": action}) or 0
+
+    def test_repeated_list_is_served_from_cache(self):
+        """
+        The second identical request is a cache hit and runs no query
+        """
+        hits = self.sample("blog_response_cache_hits_total", "list")
+        misses = self.sample("blog_response_cache_misses_total", "list")
+        first = self.client.get(reverse("blog-list") + "?author=&page_size=5")
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse("blog-list") + "?page_size=5")
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(
+            self.sample("blog_response_cache_hits_total", "list"), hits + 1
+        )
+        self.assertEqual(
+            self.sample("blog_response_cache_misses_total", "list"), misses + 1
+        )
+
+    def test_writes_invalidate_cached_responses(self):
+        """
+        Create, update and delete bump the version so later reads are fresh
+        """
+        url = reverse("blog-list")
+        detail_url = reverse("blog-detail", args=[self.blog.id])
+        self.assertEqual(len(self.client.get(url).data), 1)
+        self.assertEqual(self.client.get(detail_url).data["title"], "Cached")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author_client.post(url, {"title": "New", "content": "c"})
+        self.assertEqual(len(self.client.get(url).data), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author_client.put(detail_url, {"title": "Renamed", "content": "c"})
+        self.assertEqual(self.client.get(detail_url).data["title"], "Renamed")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author_client.delete(detail_url)
+        self.assertEqual(len(self.client.get(url).data), 1)
+        self.assertEqual(
+            self.client.get(detail_url).status_code, status.HTTP_404_NOT_FOUND
+        )
+
+    def test_file_based_backend(self):
+        """
+        The cache works with the file based backend
+        """
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": directory,
+                }
+            }
+        ):
+            url = reverse("blog-by-date") + f"?date={self.blog.created_at.date()}"
+            first = self.client.get(url)
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(first.data, second.data)
+            blog_cache.bump()
+            with self.assertNumQueries(2):
+                self.client.get(url)
+
+
+class ConditionalGetTests(BlogAPITestCase):
+    """ETag / Last-Modified validators and 304 responses"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="etags", password="etags")
+        self.author_client = APIClient()
+        self.author_client.force_authenticate(user=self.user)
+        self.blog = Blog.objects.create(title="Tagged", content="c", author=self.user)
+
+    def later(self, seconds=2):
+        """
+        Move the clock of the validators `seconds` ahead, past the second of
+        the writes of the test
+        """
+        # The collection's last write time is read from the real clock
+        blog_cache.changed_at()
+        return mock.patch.object(
+            conditional.time, "time", return_value=time.time() + seconds
+        )
+
+    def test_collection_if_none_match(self):
+        """
+        A matching If-None-Match gets a 304 without reading the rows
+        """
+        url = reverse("blog-list")
+        with self.later():
+            response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertTrue(etag.startswith('"'))
+        self.assertIn("Last-Modified", response)
+
+        cache.clear()
+        # Only the validator aggregate runs, the rows are never loaded
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified["ETag"], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author_client.delete(reverse("blog-detail", args=[self.blog.id]))
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(changed["ETag"], etag)
+
+    def test_etag_depends_on_filter_params(self):
+        """
+        Different filters produce different validators
+        """
+        first = self.client.get(reverse("blog-list"))
+        second = self.client.get(reverse("blog-list") + f"?author={self.user.id}")
+        self.assertNotEqual(first["ETag"], second["ETag"])
+
+    def test_detail_validators(self):
+        """
+        Detail responses are revalidated with ETag and If-Modified-Since
+        """
+        url = reverse("blog-detail", args=[self.blog.id])
+        with self.later():
+            response = self.client.get(url)
+            etag, last_modified = response["ETag"], response["Last-Modified"]
+            self.assertEqual(
+                self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+                status.HTTP_304_NOT_MODIFIED,
+            )
+            self.assertEqual(
+                self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code,
+                status.HTTP_304_NOT_MODIFIED,
+            )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author_client.put(url, {"title": "Retagged", "content": "c"})
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+        self.assertEqual(changed.data["title"], "Retagged")
+
+    def test_changes_within_a_second(self):
+        """
+        Last-Modified is only given once its second is over, so If-Modified-Since
+        cannot hide a second change made within the same second
+        """
+        url = reverse("blog-detail", args=[self.blog.id])
+        second = datetime(2026, 1, 1, 12, 0, 0, tzinfo=dt_timezone.utc)
+        date = http_date(second.timestamp())
+
+        def modify(milliseconds):
+            Blog.objects.filter(id=self.blog.id).update(
+                modified_at=second + timedelta(milliseconds=milliseconds)
+            )
+            cache.clear()
+
+        def get(at):
+            with mock.patch.object(
+                conditional.time, "time", return_value=second.timestamp() + at
+            ):
+                return self.client.get(url, HTTP_IF_MODIFIED_SINCE=date)
+
+        modify(200)
+        response = get(0.5)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("Last-Modified", response)
+        modify(700)
+        self.assertEqual(get(0.9).status_code, status.HTTP_200_OK)
+
+        response = get(1.5)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["Last-Modified"], date)
+
+    def test_paginated_page_validators(self):
+        """
+        Pages are validated from their own rows and revalidate with 304
+        """
+        url = reverse("blog-list") + "?page_size=1"
+        response = self.client.get(url)
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class BulkEndpointTests(BlogAPITestCase):
+    """Bulk create, update and delete"""
+
+    def setUp(self):
+        super().setUp()
+        self.user1 = User.objects.create_user(username="bulk1", password="bulk1")
+        self.user2 = User.objects.create_user(username="bulk2", password="bulk2")
+        self.client1 = APIClient()
+        self.client2 = APIClient()
+        self.client1.force_authenticate(user=self.user1)
+        self.client2.force_authenticate(user=self.user2)
+        self.url = reverse("blog-bulk")
+
+    def test_bulk_create(self):
+        """
+        All blogs are inserted with a single INSERT, their content with another,
+        and authored by the caller
+        """
+        items = [{"title": f"Bulk {i}", "content": "c"} for i in range(5)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client1.post(self.url, items, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [blog["title"] for blog in response.data], [i["title"] for i in items]
+        )
+        self.assertTrue(all(blog["author"] == "bulk1" for blog in response.data))
+        self.assertEqual(Blog.objects.filter(author=self.user1).count(), 5)
+        inserts = [q for q in queries.captured_queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 2)
+        self.assertIn('INTO "myapp_blog" ', inserts[0]["sql"])
+        self.assertIn('INTO "myapp_blogcontent" ', inserts[1]["sql"])
+
+    def test_bulk_create_reports_errors_per_item(self):
+        """
+        One invalid item rejects the whole request with per item errors
+        """
+        items = [{"title": "Good", "content": "c"}, {"content": "missing title"}]
+        response = self.client1.post(self.url, items, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("title", response.data[1])
+        self.assertEqual(Blog.objects.count(), 0)
+
+    def test_bulk_update(self):
+        """
+        Updates are applied with a single UPDATE statement
+        """
+        blogs = [
+            Blog.objects.create(title=f"Old {i}", content="c", author=self.user1)
+            for i in range(3)
+        ]
+        items = [{"id": blog.id, "title": f"New {blog.id}"} for blog in blogs]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client1.patch(self.url, items, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        updates = [q for q in queries.captured_queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        for blog in blogs:
+            blog.refresh_from_db()
+            self.assertEqual(blog.title, f"New {blog.id}")
+            self.assertEqual(blog.content, "c")
+
+    def test_bulk_update_requires_author(self):
+        """
+        Blogs of other authors are rejected and nothing is updated
+        """
+        own = Blog.objects.create(title="Mine", content="c", author=self.user1)
+        other = Blog.objects.create(title="Theirs", content="c", author=self.user2)
+        items = [{"id": own.id, "title": "X"}, {"id": other.id, "title": "X"}]
+        response = self.client1.patch(self.url, items, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("detail", response.data[1])
+        self.assertEqual(Blog.objects.filter(title="X").count(), 0)
+
+    def test_bulk_delete(self):
+        """
+        Only the caller's blogs are deleted, all or nothing
+        """
+        own = [
+            Blog.objects.create(title="Mine", content="c", author=self.user1)
+            for _ in range(2)
+        ]
+        other = Blog.objects.create(title="Theirs", content="c", author=self.user2)
+        ids = [blog.id for blog in own]
+
+        response = self.client1.delete(self.url, ids + [other.id], format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Blog.objects.count(), 3)
+
+        response = self.client1.delete(self.url, ids, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"deleted": 2})
+        self.assertEqual(list(Blog.objects.values_list("id", flat=True)), [other.id])
+
+    def test_bulk_requires_authentication(self):
+        """
+        Anonymous clients cannot use the bulk endpoint
+        """
+        response = APIClient().post(self.url, [], format="json")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(BLOG_EXPORT_SETTLE_SECONDS=0)
+class SnapshotExportTests(BlogAPITestCase):
+    """Snapshot exports and their downloads"""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(BLOG_EXPORT_DIR=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="exporter", password="exporter")
+        self.blogs = [
+            Blog.objects.create(
+                title=f"Export {i}", content="c" * 100, author=self.user
+            )
+            for i in range(3)
+        ]
+
+    def read_snapshot(self, manifest):
+        """
+        Return the decoded rows of a snapshot
+        """
+        path = export.export_dir() / manifest["file"]
+        with gzip.open(path, "rt", encoding="utf-8") as snapshot:
+            return [json.loads(line) for line in snapshot]
+
+    def test_full_and_incremental_snapshots(self):
+        """
+        A full snapshot has every blog, the next incremental one only the changes
+        """
+        full = export.export_snapshot()
+        self.assertEqual(full["rows"], 3)
+        rows = self.read_snapshot(full)
+        self.assertEqual(
+            rows[0], json.loads(json.dumps(BlogSerializer(self.blogs[0]).data))
+        )
+
+        Blog.objects.filter(id=self.blogs[1].id).update(
+            title="Changed", modified_at=timezone.now() + timedelta(seconds=1)
+        )
+        incremental = export.export_snapshot(
+            incremental=True, until=timezone.now() + timedelta(seconds=2)
+        )
+        self.assertEqual(incremental["kind"], "incremental")
+        self.assertEqual(incremental["since"], full["until"])
+        self.assertEqual(
+            [row["title"] for row in self.read_snapshot(incremental)], ["Changed"]
+        )
+
+    @override_settings(BLOG_EXPORT_SETTLE_SECONDS=2)
+    def test_recent_changes_wait_for_the_next_snapshot(self):
+        """
+        Changes younger than the settle margin, which may commit after the
+        snapshot, are left to the next incremental snapshot
+        """
+        Blog.objects.filter(id=self.blogs[0].id).update(
+            modified_at=timezone.now() - timedelta(seconds=10)
+        )
+        full = export.export_snapshot()
+        self.assertEqual(
+            [row["id"] for row in self.read_snapshot(full)], [self.blogs[0].id]
+        )
+        self.assertLess(datetime.fromisoformat(full["until"]), timezone.now())
+
+        later = timezone.now() + timedelta(seconds=3)
+        with mock.patch.object(export.timezone, "now", return_value=later):
+            incremental = export.export_snapshot(incremental=True)
+        self.assertEqual(
+            [row["id"] for row in self.read_snapshot(incremental)],
+            [blog.id for blog in self.blogs[1:]],
+        )
+
+    def test_management_command(self):
+        """
+        The export_blogs command writes a snapshot and its manifest
+        """
+        out = StringIO()
+        call_command("export_blogs", stdout=out)
+        self.assertIn("Exported 3 blogs", out.getvalue())
+        self.assertEqual(len(export.list_manifests()), 1)
+
+    def test_download_supports_ranges(self):
+        """
+        Snapshots can be downloaded whole or by byte range
+        """
+        manifest = export.export_snapshot()
+        url = reverse("blog-export-download", args=[manifest["name"]])
+        whole = self.client.get(url)
+        self.assertEqual(whole.status_code, status.HTTP_200_OK)
+        body = b"".join(whole.streaming_content)
+        self.assertEqual(hashlib.sha256(body).hexdigest(), manifest["sha256"])
+
+        partial = self.client.get(url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(partial.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b"".join(partial.streaming_content), body[10:20])
+        self.assertEqual(partial["Content-Range"], f"bytes 10-19/{len(body)}")
+
+        suffix = self.client.get(url, HTTP_RANGE="bytes=-5")
+        self.assertEqual(b"".join(suffix.streaming_content), body[-5:])
+
+        stale = self.client.get(url, HTTP_RANGE="bytes=0-1", HTTP_IF_RANGE='"other"')
+        self.assertEqual(stale.status_code, status.HTTP_200_OK)
+
+        unsatisfiable = self.client.get(url, HTTP_RANGE=f"bytes={len(body)}-")
+        self.assertEqual(unsatisfiable.status_code, 416)
+
+    def test_api_starts_background_export(self):
+        """
+        POST starts a background export and returns its name
+        """
+        author_client = APIClient()
+        author_client.force_authenticate(user=self.user)
+        with mock.patch(
+            "myapp.export.start_export", return_value="blogs-20240101T000000000000Z"
+        ) as start_export:
+            response = author_client.post(
+                reverse("blog-export"), {"incremental": True}, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["name"], "blogs-20240101T000000000000Z")
+        start_export.assert_called_once_with(incremental=True)
+
+        self.assertEqual(
+            APIClient().post(reverse("blog-export")).status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+
+
+class FullTextSearchTests(BlogAPITestCase):
+    """Full-text search with ?q= and ?title="""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user1 = User.objects.create_user(username="search1", password="search1")
+        self.user2 = User.objects.create_user(username="search2", password="search2")
+        with self.running_tasks():
+            self.title_match = Blog.objects.create(
+                title="Postgres indexing", content="Notes on btree", author=self.user1
+            )
+            self.content_match = Blog.objects.create(
+                title="Weekly notes", content="Some postgres tuning", author=self.user2
+            )
+            self.other = Blog.objects.create(
+                title="Gardening", content="Tomatoes", author=self.user1
+            )
+
+    def search_ids(self, query, url=None):
+        """
+        Return the ids of the blogs returned for `query`
+        """
+        response = self.client.get((url or reverse("blog-list")) + query)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [blog["id"] for blog in response.data]
+
+    def test_search_is_ranked(self):
+        """
+        Title matches rank above content matches
+        """
+        self.assertEqual(
+            self.search_ids("?q=postgres"),
+            [self.title_match.id, self.content_match.id],
+        )
+        self.assertEqual(self.search_ids("?q=postgres tuning"), [self.content_match.id])
+        self.assertEqual(self.search_ids("?q=unknownword"), [])
+
+    def test_search_combines_with_filters(self):
+        """
+        Search works with the author filter and the date actions
+        """
+        self.assertEqual(
+            self.search_ids(f"?q=postgres&author={self.user2.id}"),
+            [self.content_match.id],
+        )
+        day = self.other.created_at.date()
+        self.assertEqual(
+            len(self.search_ids(f"?date={day}&q=notes", reverse("blog-by-date"))), 2
+        )
+
+    def test_title_search(self):
+        """
+        ?title= only matches blogs whose title contains the text
+        """
+        self.assertEqual(self.search_ids("?title=Postgres"), [self.title_match.id])
+
+    def test_index_follows_writes(self):
+        """
+        Updated, bulk created and deleted blogs are reflected in the results
+        """
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+        with self.running_tasks():
+            client.put(
+                reverse("blog-detail", args=[self.other.id]),
+                {"title": "Gardening with postgres", "content": "Tomatoes"},
+            )
+            client.post(
+                reverse("blog-bulk"),
+                [{"title": "Bulk postgres", "content": "c"}],
+                format="json",
+            )
+            client.delete(reverse("blog-detail", args=[self.title_match.id]))
+        titles = [
+            blog["title"]
+            for blog in self.client.get(reverse("blog-list") + "?q=postgres").data
+        ]
+        self.assertEqual(
+            sorted(titles), ["Bulk postgres", "Gardening with postgres", "Weekly notes"]
+        )
+
+
+@override_settings(ROOT_URLCONF="myproject.asgi_urls")
+class AsyncReadEndpointTests(BlogAPITestCase):
+    """Async read views served through the ASGI URLconf"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="async", password="async")
+        self.token = str(AccessToken.for_user(self.user))
+        self.blogs = [
+            Blog.objects.create(title=f"Async {i}", content="c", author=self.user)
+            for i in range(3)
+        ]
+
+    def aget(self, url, **headers):
+        """
+        GET `url` with the async test client
+        """
+        return async_to_sync(self.async_client.get)(url, headers=headers)
+
+    def test_routes_resolve_to_coroutine_views(self):
+        """
+        Read URLs resolve to async views under ASGI and to sync views otherwise
+        """
+        url = reverse("blog-list")
+        self.assertTrue(asyncio.iscoroutinefunction(resolve(url).func))
+        self.assertFalse(
+            asyncio.iscoroutinefunction(resolve(url, urlconf="myproject.urls").func)
+        )
+        self.assertEqual(application.request_class.urlconf, "myproject.asgi_urls")
+
+    def test_responses_match_sync_views(self):
+        """
+        List, retrieve, date filter and paginated responses equal the sync ones
+        """
+        day = self.blogs[0].created_at.date()
+        urls = [
+            reverse("blog-list"),
+            reverse("blog-list") + f"?author={self.user.id}",
+            reverse("blog-list") + "?page_size=2",
+            reverse("blog-detail", args=[self.blogs[1].id]),
+            reverse("blog-by-date") + f"?date={day}",
+            reverse("blog-by-date-range") + f"?start_date={day}&end_date={day}",
+            reverse("blog-list") + "?fields=id,title&page_size=2",
+            reverse("blog-detail", args=[self.blogs[1].id])
+            + "?fields=author&excerpt=1",
+        ]
+        sync_client = APIClient()
+        for url in urls:
+            cache.clear()
+            with self.settings(ROOT_URLCONF="myproject.urls"):
+                expected = sync_client.get(url)
+            cache.clear()
+            response = self.aget(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+            self.assertEqual(response.json(), expected.json(), url)
+            self.assertEqual(response["ETag"], expected["ETag"], url)
+
+    def test_conditional_get_and_cache(self):
+        """
+        Async reads answer conditional requests and fill the response cache
+        """
+        url = reverse("blog-list")
+        response = self.aget(url)
+        with self.assertNumQueries(0):
+            cached = self.aget(url)
+        self.assertEqual(cached.json(), response.json())
+        not_modified = self.aget(url, If_None_Match=response["ETag"])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_missing_blog(self):
+        """
+        Retrieving an unknown blog returns 404
+        """
+        response = self.aget(reverse("blog-detail", args=[self.blogs[-1].id + 1]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_jwt_authentication(self):
+        """
+        Valid tokens are accepted; invalid tokens and inactive users get 401
+        """
+        url = reverse("blog-list")
+        response = self.aget(url, Authorization=f"Bearer {self.token}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.aget(url, Authorization="Bearer not-a-token")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn("WWW-Authenticate", response)
+
+        self.user.is_active = False
+        self.user.save()
+        response = self.aget(url, Authorization=f"Bearer {self.token}")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.json()["code"], "user_inactive")
+
+    def test_authentication_classes_of_the_sync_viewset(self):
+        """
+        The async views authenticate with the classes of BlogViewSet, the REST
+        framework defaults, sync-only ones included
+        """
+        self.assertEqual(
+            AsyncBlogViewSet.authentication_classes,
+            api_settings.DEFAULT_AUTHENTICATION_CLASSES,
+        )
+        url = reverse("blog-list")
+        with mock.patch.object(
+            BlogViewSet, "authentication_classes", [BasicAuthentication]
+        ):
+            for password, expected in [
+                ("async", status.HTTP_200_OK),
+                ("wrong", status.HTTP_401_UNAUTHORIZED),
+            ]:
+                credentials = base64.b64encode(f"async:{password}".encode()).decode()
+                response = self.aget(url, Authorization=f"Basic {credentials}")
+                self.assertEqual(response.status_code, expected)
+            # Tokens are ignored by the configured classes
+            response = self.aget(url, Authorization="Bearer not-a-token")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_writes_fall_back_to_sync_views(self):
+        """
+        Writes on the async URLs are handled by the sync viewset
+        """
+        response = async_to_sync(self.async_client.post)(
+            reverse("blog-list"),
+            {"title": "Written", "content": "c"},
+            content_type="application/json",
+            headers={"Authorization": f"Bearer {self.token}"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()["author"], self.user.username)
+
+        response = async_to_sync(self.async_client.post)(
+            reverse("blog-by-date"),
+            headers={"Authorization": f"Bearer {self.token}"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class FilterEngineTests(BlogAPITestCase):
+    """Declarative filters shared by the list endpoint and the date aliases"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user1 = User.objects.create_user(username="filter1", password="filter1")
+        self.user2 = User.objects.create_user(username="filter2", password="filter2")
+        self.blogs = {}
+        for day, author, title in [
+            (1, self.user1, "Postgres tuning"),
+            (2, self.user1, "Gardening"),
+            (2, self.user2, "Postgres replicas"),
+            (3, self.user2, "Cooking"),
+        ]:
+            with self.running_tasks():
+                blog = Blog.objects.create(title=title, content="c", author=author)
+            Blog.objects.filter(id=blog.id).update(
+                created_at=datetime(2024, 3, day, 12, 0, tzinfo=dt_timezone.utc)
+            )
+            self.blogs[title] = blog.id
+
+    def get_ids(self, url):
+        """
+        Return the sorted ids of the blogs returned by `url`
+        """
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return sorted(blog["id"] for blog in response.data)
+
+    def test_list_combines_filters_in_one_query(self):
+        """
+        Author, date range and search params narrow a single query
+        """
+        url = (
+            reverse("blog-list")
+            + f"?author={self.user2.id}&start_date=2024-03-01&end_date=2024-03-02"
+            + "&q=postgres"
+        )
+        with CaptureQueriesContext(connection) as queries:
+            ids = self.get_ids(url)
+        self.assertEqual(ids, [self.blogs["Postgres replicas"]])
+        blog_queries = [
+            query for query in queries.captured_queries if "myapp_blog" in query["sql"]
+        ]
+        # One query for the conditional GET validators and one for the rows
+        self.assertEqual(len(blog_queries), 2)
+
+    def test_date_params_collapse_into_one_range(self):
+        """
+        Overlapping date params are intersected
+        """
+        url = (
+            reverse("blog-list") + "?created_after=2024-03-01&created_before=2024-03-03"
+        )
+        self.assertEqual(
+            self.get_ids(url),
+            sorted([self.blogs["Gardening"], self.blogs["Postgres replicas"]]),
+        )
+        url = reverse("blog-list") + "?date=2024-03-02&start_date=2024-03-03"
+        self.assertEqual(self.get_ids(url), [])
+
+    def test_aliases_match_list_filters(self):
+        """
+        The date endpoints return what the list returns for the same filter
+        """
+        aliases = [
+            ("blog-by-date", "date=2024-03-02", "date=2024-03-02"),
+            (
+                "blog-by-date-range",
+                "start_date=2024-03-02&end_date=2024-03-03",
+                "start_date=2024-03-02&end_date=2024-03-03",
+            ),
+            ("blog-created-after-date", "date=2024-03-01", "created_after=2024-03-01"),
+            (
+                "blog-created-before-date",
+                "date=2024-03-03",
+                "created_before=2024-03-03",
+            ),
+        ]
+        for name, alias_query, list_query in aliases:
+            self.assertEqual(
+                self.get_ids(f"{reverse(name)}?{alias_query}"),
+                self.get_ids(f"{reverse('blog-list')}?{list_query}"),
+                name,
+            )
+
+    def test_aliases_honor_author_and_search(self):
+        """
+        The date endpoints apply the author and search filters
+        """
+        url = reverse("blog-by-date") + f"?date=2024-03-02&author={self.user1.id}"
+        self.assertEqual(self.get_ids(url), [self.blogs["Gardening"]])
+        url = reverse("blog-created-after-date") + "?date=2024-03-01&q=postgres"
+        self.assertEqual(self.get_ids(url), [self.blogs["Postgres replicas"]])
+
+    def test_invalid_params_are_bad_requests(self):
+        """
+        Missing and malformed params return 400 with per param errors
+        """
+        cases = [
+            (reverse("blog-by-date"), "date"),
+            (reverse("blog-by-date") + "?date=", "date"),
+            (reverse("blog-by-date") + "?date=03/02/2024", "date"),
+            (reverse("blog-by-date-range") + "?start_date=2024-03-01", "end_date"),
+            (
+                reverse("blog-by-date-range")
+                + "?start_date=2024-03-02&end_date=2024-03-01",
+                "end_date",
+            ),
+            (reverse("blog-created-after-date") + "?date=tomorrow", "date"),
+            (reverse("blog-list") + "?author=abc", "author"),
+            (reverse("blog-list") + "?created_before=2024-13-01", "created_before"),
+        ]
+        for url, param in cases:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, url)
+            self.assertIn(param, response.data, url)
+
+    def test_parsed_specs_are_cached(self):
+        """
+        Identical params are only validated once
+        """
+        url = reverse("blog-list") + "?date=2024-03-02&author=7"
+        self.client.get(url)
+        cache.clear()
+        with mock.patch.object(
+            filters.BlogFilterSerializer, "is_valid", autospec=True
+        ) as is_valid:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        is_valid.assert_not_called()
+
+
+class CachedAuthenticationTests(BlogAPITestCase):
+    """JWT authentication resolving users from the in-process cache"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="cached", password="cached")
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}"
+        )
+        self.url = reverse("blog-list")
+
+    def user_queries(self, method="get", data=None):
+        """
+        Send a request and return the status code and number of auth_user queries
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(self.url, data, format="json")
+        count = sum('FROM "auth_user"' in query["sql"] for query in queries)
+        return response.status_code, count
+
+    def test_user_is_loaded_once(self):
+        """
+        Only the first authenticated request reads the auth_user table
+        """
+        self.assertEqual(self.user_queries(), (status.HTTP_200_OK, 1))
+        self.assertEqual(self.user_queries(), (status.HTTP_200_OK, 0))
+
+    def test_saved_users_are_invalidated(self):
+        """
+        Deactivating a user takes effect on the next request
+        """
+        self.user_queries()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.user_queries()[0], status.HTTP_401_UNAUTHORIZED)
+
+    def test_entries_expire(self):
+        """
+        Users are reloaded once their entry is older than the TTL
+        """
+        self.user_queries()
+        later = time.monotonic() + 3600
+        with mock.patch("myapp.authentication.time.monotonic", return_value=later):
+            self.assertEqual(self.user_queries(), (status.HTTP_200_OK, 1))
+
+    def test_cache_is_bounded(self):
+        """
+        The least recently used users are evicted beyond the maximum size
+        """
+        users = UserCache()
+        with override_settings(BLOG_AUTH_USER_CACHE_SIZE=2):
+            users.set(1, User(id=1))
+            users.set(2, User(id=2))
+            users.get(1)
+            users.set(3, User(id=3))
+        self.assertIsNone(users.get(2))
+        self.assertEqual([users.get(1).id, users.get(3).id], [1, 3])
+
+    @override_settings(BLOG_AUTH_STATELESS_READS=True)
+    def test_stateless_reads(self):
+        """
+        Reads are authenticated from the token claims; writes still load the user
+        """
+        self.assertEqual(self.user_queries(), (status.HTTP_200_OK, 0))
+        created = self.user_queries("post", {"title": "Stateless", "content": "c"})
+        self.assertEqual(created, (status.HTTP_201_CREATED, 1))
+
+
+class DatabasePoolTests(BlogAPITestCase):
+    """Database connection settings and pool metrics"""
+
+    def load_settings(self, environ):
+        """
+        Return the project settings module evaluated with `environ`
+        """
+        with mock.patch.dict(os.environ, environ):
+            module = importlib.reload(project_settings)
+        self.addCleanup(importlib.reload, project_settings)
+        return module
+
+    def test_pool_settings_from_environment(self):
+        """
+        Credentials and pool bounds are read from the environment
+        """
+        database = self.load_settings(
+            {
+                "DB_HOST": "db.internal",
+                "DB_PASSWORD": "secret",
+                "DB_POOL_MAX_SIZE": "20",
+            }
+        ).DATABASES["default"]
+        self.assertEqual(database["HOST"], "db.internal")
+        self.assertEqual(database["PASSWORD"], "secret")
+        self.assertEqual(database["CONN_MAX_AGE"], 0)
+        pool = database["OPTIONS"]["pool"]
+        self.assertEqual((pool["min_size"], pool["max_size"]), (2, 20))
+
+    def test_pool_options_fit_django_pool(self):
+        """
+        The pool options do not repeat the arguments Django passes to the pool
+        """
+        database = self.load_settings({}).DATABASES["default"]
+        self.assertTrue(database["CONN_HEALTH_CHECKS"])
+        pool_class = mock.Mock()
+        # Called as DatabaseWrapper.pool calls psycopg_pool.ConnectionPool
+        pool_class(
+            kwargs={},
+            open=False,
+            configure=None,
+            check=pool_class.check_connection,
+            **database["OPTIONS"]["pool"],
+        )
+        options = pool_class.call_args.kwargs
+        self.assertEqual(options["check"], pool_class.check_connection)
+        self.assertEqual(options["max_size"], 10)
+
+    @skipUnless(POOL_AVAILABLE, "psycopg and psycopg_pool are not installed")
+    def test_pool_built_by_django(self):
+        """
+        Django builds the pool of the settings, checking connections
+        """
+        database = self.load_settings({}).DATABASES["default"]
+        wrapper = ConnectionHandler({"pooled": database})["pooled"]
+        with mock.patch("psycopg_pool.ConnectionPool") as pool_class:
+            self.assertEqual(wrapper.pool, pool_class.return_value)
+        self.addCleanup(wrapper.close_pool)
+        options = pool_class.call_args.kwargs
+        self.assertEqual(options["check"], pool_class.check_connection)
+        self.assertEqual(options["max_size"], 10)
+
+    def test_persistent_connections_without_pool(self):
+        """
+        Disabling the pool falls back to persistent, health checked connections
+        """
+        database = self.load_settings({"DB_POOL": "false"}).DATABASES["default"]
+        self.assertNotIn("pool", database["OPTIONS"])
+        self.assertEqual(database["CONN_MAX_AGE"], 60)
+        self.assertTrue(database["CONN_HEALTH_CHECKS"])
+
+    def test_pool_metrics(self):
+        """
+        Pool statistics are exported at scrape time
+        """
+        pool = mock.Mock()
+        pool.get_stats.return_value = {
+            "pool_min": 2,
+            "pool_max": 10,
+            "pool_size": 4,
+            "pool_available": 1,
+            "requests_num": 50,
+            "requests_wait_ms": 1500,
+            "requests_errors": 3,
+        }
+        with mock.patch.object(
+            DatabasePoolCollector, "pools", return_value=[("default", pool)]
+        ):
+            labels = {"alias": "default"}
+            self.assertEqual(REGISTRY.get_sample_value("blog_db_pool_size", labels), 4)
+            self.assertEqual(
+                REGISTRY.get_sample_value("blog_db_pool_wait_seconds_total", labels),
+                1.5,
+            )
+            self.assertEqual(
+                REGISTRY.get_sample_value(
+                    "blog_db_pool_checkout_failures_total", labels
+                ),
+                3,
+            )
+            self.assertEqual(
+                REGISTRY.get_sample_value(
+                    "blog_db_pool_connection_errors_total", labels
+                ),
+                0,
+            )
+
+
+class PerformanceMiddlewareTests(BlogAPITestCase):
+    """Per-request query, database, serializer and render timings"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="timed", password="timed")
+        Blog.objects.create(title="Timed", content="c", author=self.user)
+
+    def timings(self, response):
+        """
+        Parse the Server-Timing header into `{name: (duration, description)}`
+        """
+        timings = {}
+        for metric in response["Server-Timing"].split(", "):
+            name, *params = metric.split(";")
+            values = dict(param.split("=", 1) for param in params)
+            timings[name] = (float(values["dur"]), values.get("desc", "").strip('"'))
+        return timings
+
+    def test_server_timing_header(self):
+        """
+        The header reports the queries run and the time of each phase
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("blog-list"))
+        timings = self.timings(response)
+        self.assertEqual(timings["db"][1], f"{len(queries)} queries")
+        self.assertGreater(timings["db"][0], 0)
+        self.assertGreater(timings["serialize"][0], 0)
+        self.assertGreater(timings["render"][0], 0)
+        self.assertGreaterEqual(timings["total"][0], timings["db"][0])
+
+    def test_histograms_are_labelled_by_route(self):
+        """
+        Timings are observed per route and viewset action
+        """
+        labels = {"route": "blog-detail", "action": "retrieve"}
+        before = REGISTRY.get_sample_value("blog_request_db_queries_count", labels) or 0
+        blog = Blog.objects.get()
+        self.client.get(reverse("blog-detail", args=[blog.id]))
+        self.assertEqual(
+            REGISTRY.get_sample_value("blog_request_db_queries_count", labels),
+            before + 1,
+        )
+        self.assertGreater(
+            REGISTRY.get_sample_value("blog_request_render_seconds_sum", labels), 0
+        )
+
+    @override_settings(ROOT_URLCONF="myproject.asgi_urls")
+    def test_async_views(self):
+        """
+        Async views are measured too
+        """
+        response = async_to_sync(self.async_client.get)(reverse("blog-list"))
+        timings = self.timings(response)
+        # The conditional GET validators and the rows
+        self.assertEqual(timings["db"][1], "2 queries")
+        self.assertGreater(timings["render"][0], 0)
+
+    @override_settings(BLOG_SERVER_TIMING_HEADER=False)
+    def test_header_can_be_disabled(self):
+        """
+        The header is optional
+        """
+        response = self.client.get(reverse("blog-list"))
+        self.assertNotIn("Server-Timing", response)
+
+
+class SeedBlogsTests(BlogAPITestCase):
+    def seed(self, **options):
+        """
+        Run the seed_blogs command quietly
+        """
+        options = {"users": 5, "blogs": 60, "until": date(2026, 1, 1), **options}
+        call_command("seed_blogs", batch_size=25, stdout=StringIO(), **options)
+
+    def test_seed_blogs(self):
+        """
+        Blogs are spread over the authors and the years before --until
+        """
+        self.seed(years=3)
+        self.assertEqual(
+            User.objects.filter(username__startswith="seed_user_").count(), 5
+        )
+        self.assertEqual(Blog.objects.count(), 60)
+        blogs = Blog.objects.all()
+        self.assertGreater(len({blog.author_id for blog in blogs}), 1)
+        self.assertGreater(len({blog.created_at.year for blog in blogs}), 1)
+        for blog in blogs:
+            self.assertLessEqual(blog.created_at, blog.modified_at)
+            self.assertGreaterEqual(blog.created_at.year, 2023)
+            self.assertLess(blog.created_at.date(), date(2026, 1, 1))
+            self.assertTrue(blog.title and blog.content)
+
+    def test_deterministic(self):
+        """
+        The same seed creates the same blogs, and existing users are reused
+        """
+        fields = (
+            "title",
+            "body__text",
+            "body__compressed",
+            "created_at",
+            "modified_at",
+            "author_id",
+        )
+        self.seed(seed=7)
+        first = list(Blog.objects.order_by("id").values_list(*fields))
+        Blog.objects.all().delete()
+        self.seed(seed=7)
+        self.assertEqual(list(Blog.objects.order_by("id").values_list(*fields)), first)
+        self.assertEqual(User.objects.count(), 5)
+
+        Blog.objects.all().delete()
+        self.seed(seed=8)
+        self.assertNotEqual(
+            list(Blog.objects.order_by("id").values_list(*fields)), first
+        )
+
+    def test_seeded_blogs_are_searchable(self):
+        """
+        Seeded blogs are indexed for search and visible through the API
+        """
+        self.client.get(reverse("blog-list"))
+        self.seed()
+        word = Blog.objects.order_by("id").first().title.split()[0]
+        response = self.client.get(reverse("blog-list"), {"q": word})
+        self.assertGreater(len(response.data), 0)
+        # The cached empty list was invalidated
+        response = self.client.get(reverse("blog-list"))
+        self.assertEqual(len(response.data), 60)
+
+    def test_invalid_arguments(self):
+        """
+        Blogs need at least one author
+        """
+        with self.assertRaises(CommandError):
+            self.seed(users=0)
+
+
+class BlogStatsTests(BlogAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user1 = User.objects.create_user(username="stats1", password="stats1")
+        self.user2 = User.objects.create_user(username="stats2", password="stats2")
+        self.client1 = APIClient()
+        self.client2 = APIClient()
+        self.client1.force_authenticate(user=self.user1)
+        self.client2.force_authenticate(user=self.user2)
+        self.url = reverse("blog-stats")
+
+    def rollups(self):
+        """
+        Return the non-zero rollup rows
+        """
+        return set(
+            BlogStat.objects.filter(count__gt=0).values_list(
+                "dimension", "bucket", "count"
+            )
+        )
+
+    def assert_rollups_match_rebuild(self):
+        """
+        Incremental rollups equal rollups recomputed from the blogs
+        """
+        incremental = self.rollups()
+        call_command("rebuild_blog_stats", stdout=StringIO())
+        self.assertEqual(incremental, self.rollups())
+
+    def test_write_paths_maintain_rollups(self):
+        """
+        Create, update, delete and the bulk endpoint keep the rollups exact
+        """
+        bulk_url = reverse("blog-bulk")
+        with self.running_tasks():
+            blog_id = self.client1.post(
+                reverse("blog-list"), {"title": "One", "content": "c"}
+            ).data["id"]
+            response = self.client2.post(
+                bulk_url,
+                [{"title": f"B{i}", "content": "c"} for i in range(3)],
+                format="json",
+            )
+        bulk_ids = [blog["id"] for blog in response.data]
+        today = timezone.localdate().isoformat()
+        self.assertIn((BlogStat.DAY, today, 4), self.rollups())
+        self.assertIn((BlogStat.AUTHOR, str(self.user2.id), 3), self.rollups())
+        self.assert_rollups_match_rebuild()
+
+        with self.running_tasks():
+            self.client1.patch(
+                reverse("blog-detail", args=[blog_id]), {"title": "Renamed"}
+            )
+            self.client2.patch(
+                bulk_url, [{"id": bulk_ids[0], "title": "x"}], format="json"
+            )
+        self.assert_rollups_match_rebuild()
+
+        with self.running_tasks():
+            self.client1.delete(reverse("blog-detail", args=[blog_id]))
+            self.client2.delete(bulk_url, bulk_ids[:2], format="json")
+        self.assertIn((BlogStat.TOTAL, "", 1), self.rollups())
+        self.assertNotIn(
+            str(self.user1.id), {bucket for _, bucket, _ in self.rollups()}
+        )
+        self.assert_rollups_match_rebuild()
+
+    def test_failed_bulk_write_leaves_rollups(self):
+        """
+        Rollups are only updated once the write commits
+        """
+        self.client1.post(
+            reverse("blog-bulk"),
+            [{"title": "Good", "content": "c"}, {"content": "no title"}],
+            format="json",
+        )
+        self.assertEqual(self.rollups(), set())
+
+    def test_stats_endpoint(self):
+        """
+        Counts per day and month over the range, zeros included, and per author
+        """
+        for day, author in [
+            (date(2026, 1, 30), self.user1),
+            (date(2026, 2, 1), self.user1),
+            (date(2026, 2, 1), self.user2),
+            (date(2025, 6, 1), self.user2),
+        ]:
+            blog = Blog.objects.create(title="t", content="c", author=author)
+            Blog.objects.filter(id=blog.id).update(
+                created_at=datetime(
+                    day.year, day.month, day.day, 12, tzinfo=dt_timezone.utc
+                )
+            )
+        call_command("rebuild_blog_stats", stdout=StringIO())
+
+        response = self.client.get(
+            self.url, {"start_date": "2026-01-30", "end_date": "2026-02-02"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total"], 4)
+        self.assertEqual(
+            response.data["days"],
+            [
+                {"date": "2026-01-30", "count": 1},
+                {"date": "2026-01-31", "count": 0},
+                {"date": "2026-02-01", "count": 2},
+                {"date": "2026-02-02", "count": 0},
+            ],
+        )
+        self.assertEqual(
+            response.data["months"],
+            [{"month": "2026-01", "count": 1}, {"month": "2026-02", "count": 2}],
+        )
+        self.assertEqual(
+            response.data["authors"],
+            [
+                {"id": self.user1.id, "username": "stats1", "count": 2},
+                {"id": self.user2.id, "username": "stats2", "count": 2},
+            ],
+        )
+
+        response = self.client.get(
+            self.url,
+            {
+                "start_date": "2026-02-01",
+                "end_date": "2026-02-01",
+                "author": self.user2.id,
+            },
+        )
+        self.assertEqual(
+            response.data["authors"],
+            [{"id": self.user2.id, "username": "stats2", "count": 2}],
+        )
+
+    def test_default_range(self):
+        """
+        Without params the last BLOG_STATS_DEFAULT_DAYS days are returned
+        """
+        response = self.client.get(self.url)
+        days = response.data["days"]
+        self.assertEqual(len(days), project_settings.BLOG_STATS_DEFAULT_DAYS)
+        self.assertEqual(days[-1]["date"], timezone.localdate().isoformat())
+        self.assertEqual(response.data["total"], 0)
+
+    def test_invalid_params(self):
+        """
+        Reversed and overlong ranges are rejected
+        """
+        for params in [
+            {"start_date": "2026-02-02", "end_date": "2026-02-01"},
+            {"start_date": "2020-01-01", "end_date": "2026-01-01"},
+            {"start_date": "yesterday"},
+            {"author": "me"},
+        ]:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_constant_queries(self):
+        """
+        The number of queries does not depend on the number of blogs
+        """
+        params = {"start_date": "2026-01-01", "end_date": "2026-03-01"}
+        with self.running_tasks():
+            self.client1.post(reverse("blog-list"), {"title": "One", "content": "c"})
+        # Day, month, total, top authors and their usernames
+        with self.assertNumQueries(5):
+            self.client.get(self.url, params)
+        call_command(
+            "seed_blogs", users=5, blogs=200, until=date(2026, 3, 1), stdout=StringIO()
+        )
+        cache.clear()
+        with self.assertNumQueries(5):
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.data["total"], 201)
+        self.assert_rollups_match_rebuild()
+
+
+class SparseFieldsetTests(BlogAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="sparse", password="sparse")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.blogs = [
+            Blog.objects.create(
+                title=f"Sparse {i}", content="Long content " * 50, author=self.user
+            )
+            for i in range(3)
+        ]
+
+    def blog_selects(self, queries):
+        """
+        Return the captured SELECTs reading the blog table
+        """
+        return [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith("SELECT") and 'FROM "myapp_blog"' in query["sql"]
+        ]
+
+    def test_list_fields(self):
+        """
+        Only the requested fields are returned, and unneeded columns are not read
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("blog-list"), {"fields": "id,title"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data,
+            [{"id": blog.id, "title": blog.title} for blog in self.blogs],
+        )
+        for sql in self.blog_selects(queries):
+            self.assertNotIn("myapp_blogcontent", sql)
+            self.assertNotIn("auth_user", sql)
+
+        response = self.client.get(reverse("blog-list"), {"fields": "title,author"})
+        self.assertEqual(response.data[0], {"title": "Sparse 0", "author": "sparse"})
+
+    def test_excerpt(self):
+        """
+        Content is truncated by the database
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("blog-list"), {"excerpt": 20, "fields": "id,content"}
+            )
+        self.assertEqual(
+            response.data[0],
+            {"id": self.blogs[0].id, "content": "Long content Long co"},
+        )
+        for sql in self.blog_selects(queries):
+            self.assertNotIn('"myapp_blogcontent"."text" AS', sql)
+        # Without `fields`, every other field is returned in full
+        response = self.client.get(reverse("blog-list"), {"excerpt": 4})
+        expected = BlogSerializer(self.blogs[0]).data
+        self.assertEqual(response.data[0], {**expected, "content": "Long"})
+
+    def test_paginated_fields(self):
+        """
+        Pages are positioned by columns read even when they are not returned
+        """
+        url = reverse("blog-list")
+        response = self.client.get(url, {"fields": "title", "page_size": 2})
+        self.assertEqual(
+            response.data["results"], [{"title": "Sparse 0"}, {"title": "Sparse 1"}]
+        )
+        response = self.client.get(response.data["next"])
+        self.assertEqual(response.data["results"], [{"title": "Sparse 2"}])
+
+    def test_retrieve_fields(self):
+        """
+        Retrieving a blog loads only the requested columns with only()
+        """
+        url = reverse("blog-detail", args=[self.blogs[0].id])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"fields": "title,author", "excerpt": 4})
+        self.assertEqual(response.data, {"title": "Sparse 0", "author": "sparse"})
+        selects = self.blog_selects(queries)
+        self.assertTrue(selects)
+        for sql in selects:
+            self.assertNotIn("myapp_blogcontent", sql)
+
+        response = self.client.get(url, {"fields": "id,content", "excerpt": 4})
+        self.assertEqual(response.data, {"id": self.blogs[0].id, "content": "Long"})
+        full = self.client.get(url)
+        self.assertEqual(full.data, BlogSerializer(self.blogs[0]).data)
+        self.assertNotEqual(full["ETag"], response["ETag"])
+
+    def test_invalid_params(self):
+        """
+        Unknown fields and invalid excerpt lengths are rejected
+        """
+        response = self.client.get(reverse("blog-list"), {"fields": "id,secret"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("secret", str(response.data["fields"][0]))
+        for excerpt in ["0", "many"]:
+            response = self.client.get(reverse("blog-list"), {"excerpt": excerpt})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("excerpt", response.data)
+
+    def test_writes_return_full_blogs(self):
+        """
+        The params only shape reads
+        """
+        response = self.client.post(
+            reverse("blog-list") + "?fields=id&excerpt=2",
+            {"title": "New", "content": "Full content"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["content"], "Full content")
+        self.assertEqual(response.data["author"], "sparse")
+
+
+class FastJSONTests(BlogAPITestCase):
+    """orjson renderer and parser against DRF's JSONRenderer and JSONParser"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="jsön", password="json")
+        Blog.objects.create(
+            title="Line\u2028separators\u2029and ünïcode ✓",
+            content='Quotes " and \\ backslashes\n\t</script>',
+            author=self.user,
+        )
+
+    def samples(self):
+        """
+        Return data covering what DRF's encoder handles
+        """
+        now = timezone.now()
+        return [
+            self.client.get(reverse("blog-list")).data,
+            {"datetime": now, "naive": datetime(2026, 1, 2, 3, 4, 5, 678901)},
+            {"date": date(2026, 1, 2), "time": now.time(), "delta": timedelta(hours=1)},
+            {"decimal": Decimal("1.10"), "uuid": uuid.UUID(int=1), "none": None},
+            {"lazy": gettext_lazy("Not found."), "set": {1}, "tuple": (1, "a")},
+            {"queryset": User.objects.values_list("username", flat=True)},
+            {"big": 2**70, 1: "int key", "nested": [[{"a": [True, False]}]]},
+            ["\u2028\u2029", "emoji 🎉", "", 0, -1, 0.5],
+            "plain string",
+        ]
+
+    def test_output_matches_json_renderer(self):
+        """
+        Rendered bytes are identical, including with indentation
+        """
+        fast, reference = FastJSONRenderer(), JSONRenderer()
+        for data in self.samples():
+            for media_type in [None, "application/json; indent=2"]:
+                self.assertEqual(
+                    fast.render(data, media_type), reference.render(data, media_type)
+                )
+        self.assertEqual(fast.render(None), b"")
+
+    def test_stdlib_fallback(self):
+        """
+        Without orjson the renderer and parser are DRF's
+        """
+        with mock.patch("myapp.renderers.orjson", None):
+            for data in self.samples():
+                self.assertEqual(
+                    FastJSONRenderer().render(data), JSONRenderer().render(data)
+                )
+        with mock.patch("myapp.parsers.orjson", None):
+            self.assertEqual(FastJSONParser().parse(BytesIO(b'{"a": 1}')), {"a": 1})
+
+    def test_api_responses(self):
+        """
+        The API renders with the fast renderer
+        """
+        response = self.client.get(reverse("blog-list"))
+        self.assertIsInstance(response.accepted_renderer, FastJSONRenderer)
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+        self.assertIn(b"\\u2028", response.content)
+
+    def test_parser_matches_json_parser(self):
+        """
+        Parsed data and parse errors are identical
+        """
+        bodies = [
+            '{"title": "ünïcode", "items": [1, 2.5, null, true]}'.encode(),
+            b'{"big": 123456789012345678901234567890}',
+            b'{"small": -9223372036854775809}',
+            b'{"overflow": 1e400}',
+            b'"\\ud800"',
+            b"[1, 2,]",
+            b"NaN",
+            b"",
+        ]
+        for body in bodies:
+            try:
+                expected = JSONParser().parse(BytesIO(body))
+            except ParseError as exc:
+                with self.assertRaisesMessage(ParseError, str(exc.detail)):
+                    FastJSONParser().parse(BytesIO(body))
+            else:
+                self.assertEqual(FastJSONParser().parse(BytesIO(body)), expected)
+
+        body = '{"title": "latin-1 é"}'.encode("latin-1")
+        context = {"encoding": "latin-1"}
+        self.assertEqual(
+            FastJSONParser().parse(BytesIO(body), parser_context=context),
+            {"title": "latin-1 é"},
+        )
+
+    def test_json_requests(self):
+        """
+        Writes are parsed by the fast parser
+        """
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = client.post(
+            reverse("blog-list"),
+            '{"title": "Fast", "content": "ünïcode \\u2028 separated"}',
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["content"], "ünïcode \u2028 separated")
+        response = client.post(
+            reverse("blog-list"), "{not json", content_type="application/json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CompressionTests(BlogAPITestCase):
+    """Negotiated response compression"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="squeezed", password="squeezed")
+        for i in range(5):
+            Blog.objects.create(
+                title=f"Compressible {i}", content="words " * 200, author=self.user
+            )
+
+    def middleware(self, response, **settings_overrides):
+        """
+        Return a `CompressionMiddleware` answering with `response`
+        """
+        with override_settings(**settings_overrides):
+            return compression.CompressionMiddleware(lambda request: response)
+
+    def test_gzip_response(self):
+        """
+        Large responses are gzipped with Vary, Content-Length and a weak ETag
+        """
+        identity = self.client.get(reverse("blog-list"))
+        response = self.client.get(reverse("blog-list"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(response["Content-Length"], str(len(response.content)))
+        self.assertEqual(gzip.decompress(response.content), identity.content)
+        self.assertLess(len(response.content), len(identity.content) / 4)
+        self.assertEqual(response["ETag"], "W/" + identity["ETag"])
+
+    def test_conditional_get_with_weak_etag(self):
+        """
+        The weakened ETag still revalidates, and the 304 carries it too
+        """
+        url = reverse("blog-list")
+        etag = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")["ETag"]
+        response = self.client.get(
+            url, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_identity_responses(self):
+        """
+        Small bodies, refused encodings and compressed formats are sent as they are
+        """
+        blog = Blog.objects.first()
+        small = self.client.get(
+            reverse("blog-detail", args=[blog.id]) + "?fields=id",
+            HTTP_ACCEPT_ENCODING="gzip",
+        )
+        self.assertNotIn("Content-Encoding", small)
+        self.assertFalse(small["ETag"].startswith("W/"))
+
+        refused = self.client.get(
+            reverse("blog-list"), HTTP_ACCEPT_ENCODING="gzip;q=0, identity"
+        )
+        self.assertNotIn("Content-Encoding", refused)
+        self.assertIn("Accept-Encoding", refused["Vary"])
+
+        archive = HttpResponse(b"x" * 4096, content_type="application/gzip")
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertNotIn("Content-Encoding", self.middleware(archive)(request))
+
+    def test_negotiation(self):
+        """
+        The highest quality wins, ties going to the server's preference
+        """
+        encodings = ["zstd", "br", "gzip"]
+        self.assertEqual(compression.negotiate("gzip, br", encodings), "br")
+        self.assertEqual(compression.negotiate("gzip, br;q=0.5", encodings), "gzip")
+        self.assertEqual(compression.negotiate("*", encodings), "zstd")
+        self.assertEqual(compression.negotiate("*;q=0.1, GZIP", encodings), "gzip")
+        self.assertEqual(compression.negotiate("br;q=0, deflate", encodings), None)
+        self.assertEqual(compression.negotiate("gzip;q=x, br", ["gzip"]), None)
+        self.assertEqual(compression.negotiate("", encodings), None)
+
+    def test_streaming_response(self):
+        """
+        Streams are compressed chunk by chunk, each chunk decodable on arrival
+        """
+        chunks = [b"first chunk " * 100, b"second chunk " * 100]
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip")
+        response = self.middleware(StreamingHttpResponse(iter(chunks)))(request)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertNotIn("Content-Length", response)
+
+        decompressor = zlib.decompressobj(31)
+        for chunk, compressed in zip(chunks, response.streaming_content):
+            self.assertEqual(decompressor.decompress(compressed), chunk)
+
+    def test_async_streaming_response(self):
+        """
+        Async streams are compressed as well
+        """
+
+        async def chunks():
+            for i in range(3):
+                yield f"event {i}\n".encode() * 100
+
+        async def consume(response):
+            return b"".join([chunk async for chunk in response.streaming_content])
+
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip")
+        response = self.middleware(StreamingHttpResponse(chunks()))(request)
+        body = gzip.decompress(async_to_sync(consume)(response))
+        self.assertEqual(
+            body, b"".join(f"event {i}\n".encode() * 100 for i in range(3))
+        )
+
+    def test_levels_are_configurable(self):
+        """
+        Each encoding uses its configured level
+        """
+        content = json.dumps([{"title": f"Blog {i}"} for i in range(500)]).encode()
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip")
+        for level in (1, 9):
+            response = self.middleware(
+                HttpResponse(content), BLOG_COMPRESSION_LEVELS={"gzip": level}
+            )(request)
+            self.assertEqual(response.content, zlib.compress(content, level, wbits=31))
+
+    def test_metrics(self):
+        """
+        Sizes, ratios and CPU time are observed per encoding
+        """
+        labels = {"encoding": "gzip"}
+        before = {
+            name: REGISTRY.get_sample_value(name, labels) or 0
+            for name in [
+                "blog_compression_input_bytes_total",
+                "blog_compression_output_bytes_total",
+                "blog_compression_ratio_count",
+                "blog_compression_cpu_seconds_count",
+            ]
+        }
+        identity = self.client.get(reverse("blog-list"))
+        response = self.client.get(reverse("blog-list"), HTTP_ACCEPT_ENCODING="gzip")
+        after = {name: REGISTRY.get_sample_value(name, labels) for name in before}
+        self.assertEqual(
+            after["blog_compression_input_bytes_total"]
+            - before["blog_compression_input_bytes_total"],
+            len(identity.content),
+        )
+        self.assertEqual(
+            after["blog_compression_output_bytes_total"]
+            - before["blog_compression_output_bytes_total"],
+            len(response.content),
+        )
+        self.assertEqual(
+            after["blog_compression_ratio_count"],
+            before["blog_compression_ratio_count"] + 1,
+        )
+        self.assertEqual(
+            after["blog_compression_cpu_seconds_count"],
+            before["blog_compression_cpu_seconds_count"] + 1,
+        )
+
+
+@override_settings(
+    BLOG_DB_REPLICAS=["replica"], BLOG_DB_STICKY_SECONDS=60, BLOG_TASKS_WORKERS=0
+)
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Read replica routing, with a second connection to the test database as replica.
+    Transactions are committed so the replica connection sees the rows.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        # Added once the test databases exist, so the runner neither creates nor
+        # checks it, and allowed from here on
+        connections.settings["replica"] = {
+            **connections["default"].settings_dict,
+            "TEST": {"MIRROR": "default"},
+        }
+        cls.databases = {"default", "replica"}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        connections["replica"].close()
+        del connections["replica"]
+        del connections.settings["replica"]
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        routing.replica_health.reset()
+        self.addCleanup(routing.replica_health.reset)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="writer", password="writer")
+        self.reader = User.objects.create_user(username="reader", password="reader")
+        self.blog = Blog.objects.create(title="Routed", content="c", author=self.user)
+
+    def queries(self, method, url, user=None, **kwargs):
+        """
+        Return the response and the numbers of queries run on the primary and the replica
+        """
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connections["default"]) as primary:
+            with CaptureQueriesContext(connections["replica"]) as replica:
+                response = getattr(self.client, method)(url, **kwargs)
+        return response, len(primary), len(replica)
+
+    def test_reads_go_to_the_replica(self):
+        """
+        Safe requests read from the replica, writes and their reads from the primary
+        """
+        response, primary, replica = self.queries("get", reverse("blog-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((primary, replica > 0), (0, True))
+
+        url = reverse("blog-detail", args=[self.blog.id])
+        response, primary, replica = self.queries(
+            "patch", url, self.user, data={"title": "Changed"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((primary > 0, replica), (True, 0))
+
+    def test_writers_stick_to_the_primary(self):
+        """
+        After a write its author reads from the primary until the window ends
+        """
+        self.queries(
+            "post",
+            reverse("blog-list"),
+            self.user,
+            data={"title": "New", "content": "c"},
+            format="json",
+        )
+        response, primary, replica = self.queries(
+            "get", reverse("blog-list"), self.user
+        )
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual((primary > 0, replica), (True, 0))
+
+        # Other users still read from the replica
+        _, primary, replica = self.queries(
+            "get", reverse("blog-list") + "?author=1", self.reader
+        )
+        self.assertEqual((primary, replica > 0), (0, True))
+
+        with mock.patch.object(routing, "sticky_seconds", return_value=0):
+            cache.delete(routing.sticky_key(self.user.pk))
+            _, primary, replica = self.queries(
+                "get", reverse("blog-list") + "?author=2", self.user
+            )
+        self.assertEqual((primary, replica > 0), (0, True))
+
+    @override_settings(
+        BLOG_DB_STICKY_SECONDS=5,
+        BLOG_DB_REPLICA_MAX_LAG=30,
+        BLOG_DB_REPLICA_CHECK_INTERVAL=10,
+    )
+    def test_sticky_window_covers_the_replica_lag(self):
+        """
+        Writers stick to the primary, and replica reads are kept out of the
+        response cache, for as long as a healthy replica may lag
+        """
+        self.assertEqual(routing.sticky_seconds(), 40)
+        self.assertTrue(routing.may_be_stale(time.time() - 20))
+        self.assertFalse(routing.may_be_stale(time.time() - 41))
+
+        routing.stick_to_primary(self.user)
+        with mock.patch.object(routing.time, "time", return_value=time.time() + 20):
+            self.assertTrue(routing.is_sticky(self.user))
+        with mock.patch.object(routing.time, "time", return_value=time.time() + 41):
+            self.assertFalse(routing.is_sticky(self.user))
+
+    def test_default_sticky_window(self):
+        """
+        With the shipped settings the sticky window is BLOG_DB_STICKY_SECONDS,
+        as replicas lagging less are the only ones used
+        """
+        defaults = {
+            name: getattr(project_settings, name)
+            for name in [
+                "BLOG_DB_STICKY_SECONDS",
+                "BLOG_DB_REPLICA_MAX_LAG",
+                "BLOG_DB_REPLICA_CHECK_INTERVAL",
+            ]
+        }
+        with override_settings(**defaults):
+            self.assertEqual(routing.sticky_seconds(), 5)
+            self.assertTrue(routing.may_be_stale(time.time() - 4))
+            self.assertFalse(routing.may_be_stale(time.time() - 6))
+        self.assertLess(
+            defaults["BLOG_DB_REPLICA_MAX_LAG"]
+            + defaults["BLOG_DB_REPLICA_CHECK_INTERVAL"],
+            defaults["BLOG_DB_STICKY_SECONDS"],
+        )
+
+    def test_recent_replica_reads_are_not_cached(self):
+        """
+        Responses read from a replica right after a write are not cached
+        """
+        blog_cache.bump()
+        self.queries("get", reverse("blog-list"))
+        _, _, replica = self.queries("get", reverse("blog-list"))
+        self.assertGreater(replica, 0)
+
+        with mock.patch.object(routing, "sticky_seconds", return_value=0):
+            self.queries("get", reverse("blog-list"))
+            _, _, replica = self.queries("get", reverse("blog-list"))
+        self.assertEqual(replica, 0)
+
+    def test_unhealthy_replica_falls_back_to_the_primary(self):
+        """
+        A replica failing its health check is skipped until it passes again
+        """
+        with mock.patch.object(routing.replica_health, "probe", return_value=False):
+            _, primary, replica = self.queries("get", reverse("blog-list"))
+        self.assertEqual((primary > 0, replica), (True, 0))
+        self.assertEqual(
+            REGISTRY.get_sample_value("blog_db_replica_healthy", {"alias": "replica"}),
+            0,
+        )
+
+        # The failure is remembered for the check interval
+        cache.clear()
+        _, primary, replica = self.queries("get", reverse("blog-list"))
+        self.assertEqual((primary > 0, replica), (True, 0))
+
+        with override_settings(BLOG_DB_REPLICA_CHECK_INTERVAL=0):
+            cache.clear()
+            _, primary, replica = self.queries("get", reverse("blog-list"))
+        self.assertEqual((primary, replica > 0), (0, True))
+
+    def test_failing_replica_query_is_retried_on_the_primary(self):
+        """
+        A request whose replica fails mid-request is served by the primary
+        """
+        with mock.patch.object(
+            connections["replica"], "_cursor", side_effect=OperationalError
+        ), mock.patch.object(routing.replica_health, "probe", return_value=True):
+            with CaptureQueriesContext(connections["default"]) as primary:
+                response = self.client.get(reverse("blog-detail", args=[self.blog.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["title"], "Routed")
+        self.assertGreater(len(primary), 0)
+        self.assertEqual(routing.replica_health.states["replica"][0], False)
+
+    @override_settings(ROOT_URLCONF="myproject.asgi_urls")
+    def test_async_views(self):
+        """
+        Async read endpoints use the replica as well
+        """
+        with CaptureQueriesContext(connections["replica"]) as replica:
+            response = async_to_sync(self.async_client.get)(reverse("blog-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreater(len(replica), 0)
+
+    def test_router(self):
+        """
+        Outside of requests everything uses the primary, and replicas are not migrated
+        """
+        router = routing.ReplicaRouter()
+        self.assertEqual(router.db_for_read(Blog), "default")
+        self.assertEqual(router.db_for_write(Blog, instance=self.blog), "default")
+        self.assertFalse(router.allow_migrate("replica", "myapp"))
+        self.assertIsNone(router.allow_migrate("default", "myapp"))
+        self.assertEqual(Blog.objects.using("replica").get().title, "Routed")
+
+
+class AdmissionControlTests(BlogAPITestCase):
+    """Per-route concurrency limits, priority queueing and load shedding"""
+
+    def request(self, name="blog-by-date-range", args=None, **headers):
+        """
+        Return a GET request to the route `name`
+        """
+        return RequestFactory().get(reverse(name, args=args), **headers)
+
+    def test_queue_and_shed(self):
+        """
+        Excess requests wait for a slot, and are shed once the queue is full
+        """
+        limiter = admission.RouteLimiter("test", concurrency=1, queue=1)
+        self.assertIsNone(limiter.enter(admission.Waiter, admission.ANONYMOUS_READ))
+        waiter = limiter.enter(admission.Waiter, admission.ANONYMOUS_READ)
+        self.assertIsNotNone(waiter)
+        with self.assertRaises(admission.Shed):
+            limiter.enter(admission.Waiter, admission.ANONYMOUS_READ)
+
+        limiter.release(0.5)
+        self.assertTrue(waiter.wait(0))
+        self.assertEqual(waiter.outcome, "admitted")
+        self.assertEqual(limiter.active, 1)
+        limiter.release(0.5)
+        self.assertEqual(limiter.active, 0)
+
+    def test_priorities(self):
+        """
+        Writes are served before reads and push anonymous reads out of a full queue
+        """
+        limiter = admission.RouteLimiter("test", concurrency=1, queue=2)
+        limiter.enter(admission.Waiter, admission.ANONYMOUS_READ)
+        anonymous = limiter.enter(admission.Waiter, admission.ANONYMOUS_READ)
+        read = limiter.enter(admission.Waiter, admission.AUTHENTICATED_READ)
+        write = limiter.enter(admission.Waiter, admission.WRITE)
+        self.assertTrue(anonymous.wait(0))
+        self.assertEqual(anonymous.outcome, "evicted")
+
+        limiter.release(0.1)
+        self.assertEqual((write.outcome, read.outcome), ("admitted", None))
+        limiter.release(0.1)
+        self.assertEqual(read.outcome, "admitted")
+
+        with self.assertRaises(admission.Shed):
+            limiter.enter(admission.Waiter, admission.ANONYMOUS_READ)
+            limiter.enter(admission.Waiter, admission.ANONYMOUS_READ)
+            limiter.enter(admission.Waiter, admission.ANONYMOUS_READ)
+
+    def bearer(self):
+        """
+        Return the Authorization header of a valid access token
+        """
+        user = User.objects.create_user(username="admitted", password="admitted")
+        return {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(user)}"}
+
+    def test_priority_of_requests(self):
+        """
+        Requests with a valid token rank above anonymous ones, writes above reads
+        """
+        factory = RequestFactory()
+        auth = self.bearer()
+        self.assertEqual(admission.priority(factory.get("/")), admission.ANONYMOUS_READ)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                admission.priority(factory.get("/", **auth)),
+                admission.AUTHENTICATED_READ,
+            )
+        self.assertEqual(admission.priority(factory.post("/", **auth)), admission.WRITE)
+
+        expired = AccessToken.for_user(User.objects.get(username="admitted"))
+        expired.set_exp(lifetime=-timedelta(minutes=1))
+        for header in ["Bearer x", "Basic YTpi", f"Bearer {expired}", "Bearer"]:
+            for request in [factory.get("/"), factory.post("/")]:
+                request.META["HTTP_AUTHORIZATION"] = header
+                self.assertEqual(
+                    admission.priority(request), admission.ANONYMOUS_READ, header
+                )
+
+    @override_settings(
+        BLOG_ADMISSION_ROUTES={"blog-by-date-range": {"concurrency": 1, "queue": 1}},
+        BLOG_ADMISSION_QUEUE_TIMEOUT=0.05,
+    )
+    def test_middleware_sheds_with_retry_after(self):
+        """
+        A request waiting too long is answered with 503 and Retry-After
+        """
+        entered, finish = threading.Event(), threading.Event()
+
+        def slow_view(request):
+            if request.path == reverse("blog-by-date-range"):
+                entered.set()
+                finish.wait(5)
+            return HttpResponse("done")
+
+        middleware = admission.AdmissionMiddleware(slow_view)
+        labels = {"route": "blog-by-date-range", "reason": "timeout"}
+        before = REGISTRY.get_sample_value("blog_admission_shed_total", labels) or 0
+        worker = threading.Thread(target=middleware, args=[self.request()])
+        worker.start()
+        self.addCleanup(worker.join)
+        self.addCleanup(finish.set)
+        self.assertTrue(entered.wait(5))
+
+        response = middleware(self.request())
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertGreaterEqual(int(response["Retry-After"]), 1)
+        self.assertEqual(
+            REGISTRY.get_sample_value("blog_admission_shed_total", labels), before + 1
+        )
+        self.assertEqual(
+            REGISTRY.get_sample_value(
+                "blog_admission_in_flight", {"route": "blog-by-date-range"}
+            ),
+            1,
+        )
+
+        # Other routes are not limited by this one
+        self.assertEqual(middleware(self.request("blog-list")).content, b"done")
+
+    @override_settings(
+        BLOG_ADMISSION_ROUTES={
+            "blog-list": {"concurrency": 1, "queue": 1},
+            "blog-export-download": {"concurrency": 1, "queue": 1, "streaming": True},
+        },
+        BLOG_ADMISSION_QUEUE_TIMEOUT=0,
+    )
+    def test_streaming_routes_hold_their_slot(self):
+        """
+        Streaming routes keep their slot until the body is sent or the response
+        closed; other routes release it once the view returns
+        """
+        middleware = admission.AdmissionMiddleware(
+            lambda request: StreamingHttpResponse(iter([b"a", b"b"]))
+        )
+        download = self.request("blog-export-download", args=["snapshot"])
+
+        response = middleware(download)
+        limiter = middleware.limiters["blog-export-download"]
+        self.assertEqual(limiter.active, 1)
+        self.assertEqual(middleware(download).status_code, 503)
+        self.assertEqual(b"".join(response.streaming_content), b"ab")
+        self.assertEqual(limiter.active, 0)
+
+        response = middleware(download)
+        response.close()
+        self.assertEqual(limiter.active, 0)
+
+        middleware(self.request("blog-list"))
+        self.assertEqual(middleware.limiters["blog-list"].active, 0)
+
+    @override_settings(
+        BLOG_ADMISSION_ROUTES={"blog-list": {"concurrency": 1, "queue": 1}},
+        BLOG_ADMISSION_QUEUE_TIMEOUT=5,
+    )
+    def test_async_middleware(self):
+        """
+        Coroutines queue on the same limits
+        """
+        served = []
+        auth = self.bearer()
+
+        async def view(request):
+            await asyncio.sleep(0.01)
+            served.append(request.META.get("HTTP_AUTHORIZATION", "anonymous"))
+            return HttpResponse("done")
+
+        middleware = admission.AdmissionMiddleware(view)
+
+        async def run():
+            return await asyncio.gather(
+                middleware(self.request("blog-list")),
+                middleware(self.request("blog-list")),
+                middleware(self.request("blog-list")),
+                middleware(self.request("blog-list", **auth)),
+            )
+
+        responses = async_to_sync(run)()
+        self.assertEqual(
+            [response.status_code for response in responses], [200, 503, 503, 200]
+        )
+        self.assertEqual(served, ["anonymous", auth["HTTP_AUTHORIZATION"]])
+
+    @override_settings(
+        BLOG_ADMISSION_ROUTES={"blog-list": {"concurrency": 1, "queue": 4}},
+        BLOG_ADMISSION_QUEUE_TIMEOUT=5,
+    )
+    def test_cancelled_waiters_free_their_slot(self):
+        """
+        A queued coroutine cancelled by a client disconnect leaves the queue,
+        and gives back the slot it was handed before it could resume
+        """
+        labels = {"route": "blog-list", "reason": "cancelled"}
+        before = REGISTRY.get_sample_value("blog_admission_shed_total", labels) or 0
+
+        async def run():
+            finish = asyncio.Event()
+
+            async def view(request):
+                await finish.wait()
+                return HttpResponse("done")
+
+            middleware = admission.AdmissionMiddleware(view)
+            running = asyncio.create_task(middleware(self.request("blog-list")))
+            await asyncio.sleep(0)
+            limiter = middleware.limiters["blog-list"]
+
+            async def queue():
+                task = asyncio.create_task(middleware(self.request("blog-list")))
+                while not limiter.waiters:
+                    await asyncio.sleep(0)
+                return task
+
+            async def cancel(task):
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+
+            # Cancelled while waiting
+            await cancel(await queue())
+            self.assertEqual(limiter.waiters, [])
+
+            # Cancelled once admitted, before resuming
+            waiting = await queue()
+            with mock.patch.object(admission.AsyncWaiter, "wake"):
+                finish.set()
+                await running
+            self.assertEqual(limiter.active, 1)
+            await cancel(waiting)
+            self.assertEqual(limiter.active, 0)
+
+        async_to_sync(run)()
+        self.assertEqual(
+            REGISTRY.get_sample_value("blog_admission_shed_total", labels), before + 1
+        )
+
+    @override_settings(
+        BLOG_ADMISSION_ROUTES={"*": {"concurrency": 0, "queue": 0}},
+        BLOG_ADMISSION_STATUS=429,
+    )
+    def test_installed_middleware(self):
+        """
+        The middleware is installed, and exempt routes are never limited
+        """
+        response = self.client.get(reverse("blog-list"))
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(
+            response.json()["detail"], "The server is busy, please retry later."
+        )
+        self.assertIn("Retry-After", response)
+        self.assertEqual(self.client.get("/metrics").status_code, status.HTTP_200_OK)
+
+
+@override_settings(BLOG_CHANGES_SETTLE_SECONDS=0)
+class ChangeFeedTests(BlogAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="feed", password="feed")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("blog-changes")
+
+    def sync(self, cursor=None, **params):
+        """
+        Return the changes after `cursor`
+        """
+        if cursor is not None:
+            params["cursor"] = cursor
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_batches_in_change_order(self):
+        """
+        Changes come oldest first, in batches resumed by the returned cursor
+        """
+        blogs = [
+            Blog.objects.create(title=f"B{i}", content="c", author=self.user)
+            for i in range(5)
+        ]
+        Blog.objects.filter(id=blogs[0].id).update(title="Renamed")
+        Blog.objects.filter(id=blogs[0].id).update(modified_at=timezone.now())
+
+        seen, cursor, more = [], None, True
+        while more:
+            page = self.sync(cursor, batch_size=2)
+            self.assertLessEqual(len(page["blogs"]), 2)
+            seen += [blog["id"] for blog in page["blogs"]]
+            cursor, more = page["cursor"], page["more"]
+        self.assertEqual(seen, [blog.id for blog in blogs[1:]] + [blogs[0].id])
+
+        page = self.sync(cursor)
+        self.assertEqual((page["blogs"], page["deleted"]), ([], []))
+        self.assertFalse(page["more"])
+
+        blogs[2].title = "Edited"
+        blogs[2].save()
+        page = self.sync(page["cursor"])
+        self.assertEqual([blog["title"] for blog in page["blogs"]], ["Edited"])
+
+    def test_deletions_leave_tombstones(self):
+        """
+        Single and bulk deletes are returned as tombstones after the cursor
+        """
+        ids = [
+            Blog.objects.create(title=f"B{i}", content="c", author=self.user).id
+            for i in range(3)
+        ]
+        cursor = self.sync()["cursor"]
+        self.client.delete(reverse("blog-detail", args=[ids[0]]))
+        self.client.delete(reverse("blog-bulk"), ids[1:], format="json")
+
+        page = self.sync(cursor)
+        self.assertEqual(page["blogs"], [])
+        self.assertEqual(sorted(entry["id"] for entry in page["deleted"]), ids)
+        self.assertEqual(self.sync(page["cursor"])["deleted"], [])
+
+    def test_recent_changes_wait_for_the_horizon(self):
+        """
+        Changes younger than the settle delay are left for a later call
+        """
+        Blog.objects.create(title="Fresh", content="c", author=self.user)
+        with override_settings(BLOG_CHANGES_SETTLE_SECONDS=60):
+            page = self.sync()
+        self.assertEqual(page["blogs"], [])
+        self.assertEqual(len(self.sync(page["cursor"])["blogs"]), 1)
+
+    def test_invalid_and_expired_cursors(self):
+        """
+        Malformed cursors are rejected, cursors older than the tombstones are gone
+        """
+        response = self.client.get(self.url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        old = timezone.now() - changefeed.retention() - timedelta(days=1)
+        response = self.client.get(
+            self.url, {"cursor": changefeed.encode_cursor((old, 0, changefeed.UPSERT))}
+        )
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+    def test_prune_tombstones_command(self):
+        """
+        The command deletes only the tombstones past the retention
+        """
+        BlogTombstone.objects.create(
+            blog_id=1, deleted_at=timezone.now() - changefeed.retention()
+        )
+        BlogTombstone.objects.create(blog_id=2, deleted_at=timezone.now())
+        call_command("prune_blog_tombstones", stdout=StringIO())
+        self.assertEqual(
+            list(BlogTombstone.objects.values_list("blog_id", flat=True)), [2]
+        )
+
+
+@override_settings(ROOT_URLCONF="myproject.asgi_urls")
+class EventStreamTests(BlogAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user1 = User.objects.create_user(username="live1", password="live1")
+        self.user2 = User.objects.create_user(username="live2", password="live2")
+        self.client1 = APIClient()
+        self.client2 = APIClient()
+        self.client1.force_authenticate(user=self.user1)
+        self.client2.force_authenticate(user=self.user2)
+        self.url = reverse("blog-events")
+        patcher = mock.patch.object(events, "broker", events.EventBroker())
+        self.broker = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write(self, client, method, *args, **kwargs):
+        """
+        Send a write request and run its on-commit callbacks
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(client, method)(*args, **kwargs)
+
+    async def subscribe(self, **headers):
+        """
+        Open a stream and return its iterator, past the `retry` preamble
+        """
+        response = await self.async_client.get(self.url, headers=headers)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertTrue((await anext(stream)).startswith(b"retry:"))
+        return stream
+
+    async def receive(self, stream):
+        """
+        Return the fields of the next message of `stream`, data decoded
+        """
+        message = await asyncio.wait_for(anext(stream), 5)
+        fields = dict(
+            line.split(": ", 1) for line in message.decode().split("\n") if line
+        )
+        fields["data"] = json.loads(fields["data"])
+        return fields
+
+    def test_streams_writes_of_the_author(self):
+        """
+        Creates, updates and deletes, single and bulk, are pushed once committed
+        """
+
+        async def scenario():
+            stream = await self.subscribe()
+            filtered = await self.async_client.get(self.url, {"author": self.user1.id})
+            filtered = aiter(filtered.streaming_content)
+            await anext(filtered)
+
+            await sync_to_async(self.write)(
+                self.client2,
+                "post",
+                reverse("blog-list"),
+                {"title": "Theirs", "content": "c"},
+            )
+            response = await sync_to_async(self.write)(
+                self.client1,
+                "post",
+                reverse("blog-list"),
+                {"title": "Mine", "content": "c"},
+            )
+            blog_id = response.data["id"]
+            await sync_to_async(self.write)(
+                self.client1,
+                "patch",
+                reverse("blog-detail", args=[blog_id]),
+                {"title": "Edited"},
+            )
+            await sync_to_async(self.write)(
+                self.client1, "delete", reverse("blog-bulk"), [blog_id], format="json"
+            )
+
+            received = [await self.receive(stream) for _ in range(4)]
+            self.assertEqual(
+                [(event["event"], event["data"].get("title")) for event in received],
+                [
+                    ("created", "Theirs"),
+                    ("created", "Mine"),
+                    ("updated", "Edited"),
+                    ("deleted", None),
+                ],
+            )
+            self.assertEqual(received[3]["data"], {"id": blog_id})
+            self.assertEqual(received[1]["data"]["author"], "live1")
+
+            received = [await self.receive(filtered) for _ in range(3)]
+            self.assertEqual(
+                [event["event"] for event in received],
+                ["created", "updated", "deleted"],
+            )
+            await stream.aclose()
+            await filtered.aclose()
+
+        async_to_sync(scenario)()
+        self.assertEqual(self.broker.subscribers, 0)
+
+    def test_resume_from_last_event_id(self):
+        """
+        Reconnecting clients get the events they missed, or a reset when the
+        events are gone
+        """
+
+        async def scenario():
+            listener = await self.subscribe()
+            for title in ("One", "Two"):
+                await sync_to_async(self.write)(
+                    self.client1,
+                    "post",
+                    reverse("blog-list"),
+                    {"title": title, "content": "c"},
+                )
+            first = await self.receive(listener)
+
+            resumed = await self.subscribe(Last_Event_ID=first["id"])
+            event = await self.receive(resumed)
+            self.assertEqual(event["data"]["title"], "Two")
+
+            stale = await self.subscribe(Last_Event_ID="old-process-1")
+            event = await self.receive(stale)
+            self.assertEqual(event["event"], "reset")
+            for stream in (listener, resumed, stale):
+                await stream.aclose()
+
+        async_to_sync(scenario)()
+
+    def test_fan_out_wakes_all_subscribers_of_a_loop(self):
+        """
+        Subscribers of one event loop share a single wake-up per publication
+        """
+
+        async def scenario():
+            streams = [self.broker.stream() for _ in range(200)]
+            for stream in streams:
+                await anext(stream)
+            self.assertEqual(len(self.broker.channels), 1)
+            waiting = [asyncio.ensure_future(anext(stream)) for stream in streams]
+            await asyncio.sleep(0)
+            with mock.patch.object(
+                asyncio.get_running_loop(),
+                "call_soon_threadsafe",
+                wraps=asyncio.get_running_loop().call_soon_threadsafe,
+            ) as wake:
+                await asyncio.to_thread(
+                    self.broker.publish, events.DELETED, [(1, {"id": 7})]
+                )
+            (channel,) = self.broker.channels.values()
+            wakes = [
+                call for call in wake.call_args_list if call.args == (channel.wake,)
+            ]
+            self.assertEqual(len(wakes), 1)
+            messages = await asyncio.wait_for(asyncio.gather(*waiting), 5)
+            self.assertEqual(len(set(messages)), 1)
+            for stream in streams:
+                await stream.aclose()
+
+        async_to_sync(scenario)()
+        self.assertEqual(self.broker.channels, {})
+
+    @override_settings(BLOG_EVENTS_HEARTBEAT_SECONDS=0.01)
+    def test_heartbeat_and_limits(self):
+        """
+        Idle streams get heartbeats; invalid filters and excess streams are refused
+        """
+
+        async def scenario():
+            stream = await self.subscribe()
+            self.assertEqual(await anext(stream), events.HEARTBEAT)
+            with override_settings(BLOG_EVENTS_MAX_SUBSCRIBERS=1):
+                response = await self.async_client.get(self.url)
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            self.assertIn("Retry-After", response)
+            await stream.aclose()
+            response = await self.async_client.get(self.url, {"author": "x"})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        async_to_sync(scenario)()
+
+
+@override_settings(BLOG_CONTENT_COMPRESS_MIN_SIZE=1024)
+class BlogContentStorageTests(BlogAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="body", password="body")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.long_text = " ".join(["Compressible postgres notes."] * 100)
+
+    def stored(self, blog_id):
+        """
+        Return the content row of a blog
+        """
+        return BlogContent.objects.get(blog_id=blog_id)
+
+    def test_large_bodies_are_compressed(self):
+        """
+        Bodies over the threshold are stored compressed and read back unchanged
+        """
+        with self.running_tasks():
+            long_id = self.client.post(
+                reverse("blog-list"), {"title": "Long", "content": self.long_text}
+            ).data["id"]
+            short_id = self.client.post(
+                reverse("blog-list"), {"title": "Short", "content": "Brief"}
+            ).data["id"]
+        self.assertEqual(self.stored(long_id).text, "")
+        self.assertLess(len(self.stored(long_id).compressed), 1024)
+        self.assertEqual(self.stored(short_id).text, "Brief")
+        self.assertIsNone(self.stored(short_id).compressed)
+
+        detail = self.client.get(reverse("blog-detail", args=[long_id]))
+        self.assertEqual(detail.data["content"], self.long_text)
+        listed = self.client.get(reverse("blog-list"))
+        self.assertEqual(
+            [blog["content"] for blog in listed.data], [self.long_text, "Brief"]
+        )
+        self.assertEqual(Blog.objects.get(id=long_id).content, self.long_text)
+        search_ids = [
+            blog["id"]
+            for blog in self.client.get(reverse("blog-list"), {"q": "postgres"}).data
+        ]
+        self.assertEqual(search_ids, [long_id])
+
+    def test_excerpts_of_compressed_bodies(self):
+        """
+        Excerpts are cut after decompressing, in lists and on the detail endpoint
+        """
+        blog = Blog.objects.create(
+            title="Long", content=self.long_text, author=self.user
+        )
+        params = {"fields": "id,content", "excerpt": 12}
+        listed = self.client.get(reverse("blog-list"), params)
+        self.assertEqual(listed.data, [{"id": blog.id, "content": "Compressible"}])
+        detail = self.client.get(reverse("blog-detail", args=[blog.id]), params)
+        self.assertEqual(detail.data, {"id": blog.id, "content": "Compressible"})
+
+    def test_writes_store_content(self):
+        """
+        Updates and bulk updates replace the stored content, other writes keep it
+        """
+        blog = Blog.objects.create(title="Blog", content="Brief", author=self.user)
+        self.client.patch(
+            reverse("blog-detail", args=[blog.id]), {"content": self.long_text}
+        )
+        self.assertIsNotNone(self.stored(blog.id).compressed)
+        self.client.patch(
+            reverse("blog-bulk"), [{"id": blog.id, "content": "Again"}], format="json"
+        )
+        self.assertEqual(self.stored(blog.id).text, "Again")
+
+        blog = Blog.objects.get(id=blog.id)
+        blog.title = "Renamed"
+        with CaptureQueriesContext(connection) as queries:
+            blog.save(update_fields=["title"])
+        self.assertFalse(
+            [
+                query["sql"]
+                for query in queries.captured_queries
+                if query["sql"].startswith(("INSERT", "UPDATE"))
+                and "myapp_blogcontent" in query["sql"]
+            ]
+        )
+        self.assertEqual(Blog.objects.get(id=blog.id).content, "Again")
+
+    def test_detail_and_list_read_content_only_when_requested(self):
+        """
+        Content is joined in a single query when returned, and not read otherwise
+        """
+        blog = Blog.objects.create(title="Blog", content="Brief", author=self.user)
+        url = reverse("blog-detail", args=[blog.id])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        content_queries = [
+            query["sql"]
+            for query in queries.captured_queries
+            if "myapp_blogcontent" in query["sql"]
+        ]
+        self.assertEqual(len(content_queries), 1)
+        self.assertIn('"myapp_blog"."title"', content_queries[0])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("blog-list"), {"fields": "id,title"})
+        self.assertNotIn(
+            "myapp_blogcontent", " ".join(q["sql"] for q in queries.captured_queries)
+        )
+
+
+class BlogContentMigrationTests(TransactionTestCase):
+    """Migrations 0007 and 0009 move content out of the blog table and back"""
+
+    before = [("myapp", "0006_blog_changes")]
+    expand = [("myapp", "0007_blog_content")]
+    contract = [("myapp", "0009_remove_blog_content_column")]
+
+    def migrate(self, targets):
+        """
+        Migrate the database to `targets` and return the models of that state
+        """
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def columns(self, table):
+        """
+        Return the column names of `table`
+        """
+        with connection.cursor() as cursor:
+            description = connection.introspection.get_table_description(cursor, table)
+        return [column.name for column in description]
+
+    def bodies(self, apps):
+        """
+        Return the decoded bodies by blog id
+        """
+        return {
+            body.blog_id: BlogContent.decode(body.text, body.compressed)
+            for body in apps.get_model("myapp", "BlogContent").objects.all()
+        }
+
+    @override_settings(BLOG_CONTENT_COMPRESS_MIN_SIZE=1024, BLOG_TASKS_WORKERS=0)
+    def test_content_is_moved_online_and_back(self):
+        """
+        The expand step copies every body and mirrors the writes of the previous
+        release; the contract step drops the column and adds the foreign key
+        """
+        apps = self.migrate(self.before)
+        user = apps.get_model("auth", "User").objects.create(username="old")
+        old_blog = apps.get_model("myapp", "Blog")
+        texts = [f"Body {i}" for i in range(5)] + ["Long body. " * 200]
+        ids = [
+            blog.id
+            for blog in old_blog.objects.bulk_create(
+                [old_blog(title="t", content=text, author=user) for text in texts]
+            )
+        ]
+
+        with mock.patch.object(content_migration, "BATCH_SIZE", 2):
+            apps = self.migrate(self.expand)
+        self.assertEqual(self.bodies(apps), dict(zip(ids, texts)))
+        self.assertIsNotNone(
+            apps.get_model("myapp", "BlogContent")
+            .objects.get(blog_id=ids[-1])
+            .compressed
+        )
+        self.assertIn("content", self.columns("myapp_blog"))
+
+        # The previous release keeps writing the column
+        old_blog.objects.filter(id=ids[0]).update(content="Edited")
+        old_blog.objects.filter(id=ids[1]).delete()
+        added = old_blog.objects.create(title="t", content="Added", author_id=user.id)
+        # and the new release writes BlogContent only
+        new = Blog.objects.create(title="t", content="New", author_id=user.id)
+        expected = dict(zip(ids, texts))
+        del expected[ids[1]]
+        expected.update({ids[0]: "Edited", added.id: "Added", new.id: "New"})
+        self.assertEqual(self.bodies(apps), expected)
+
+        apps = self.migrate(self.contract)
+        self.assertNotIn("content", self.columns("myapp_blog"))
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, "myapp_blogcontent"
+            )
+        self.assertIn(
+            ("myapp_blog", "id"),
+            [constraint["foreign_key"] for constraint in constraints.values()],
+        )
+        self.assertEqual(self.bodies(apps), expected)
+
+        apps = self.migrate(self.before)
+        self.assertEqual(
+            dict(apps.get_model("myapp", "Blog").objects.values_list("id", "content")),
+            expected,
+        )
+
+
+class BackgroundTaskTests(BlogAPITestCase):
+    """Background tasks run after commit by the thread pool or the durable queue"""
+
+    def setUp(self):
+        super().setUp()
+        self.batches = []
+        self.register("tests.record", self.batches.append)
+
+    def register(self, name, handler):
+        """
+        Register a task for the duration of the test
+        """
+        tasks.task(name)(handler)
+        self.addCleanup(tasks.registry.pop, name)
+
+    def runs(self, name, outcome):
+        """
+        Return the runs of task `name` with `outcome` counted so far
+        """
+        labels = {"task": name, "outcome": outcome}
+        return REGISTRY.get_sample_value("blog_task_runs_total", labels) or 0
+
+    @override_settings(BLOG_TASKS_WORKERS=0)
+    def test_tasks_run_after_commit(self):
+        """
+        Tasks run once their transaction commits, and not if it rolls back
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                tasks.enqueue("tests.record", 1)
+                self.assertEqual(self.batches, [])
+            with self.assertRaises(ValueError):
+                with transaction.atomic():
+                    tasks.enqueue("tests.record", 2)
+                    raise ValueError("rolled back")
+        self.assertEqual(self.batches, [[1]])
+        with self.assertRaises(KeyError):
+            tasks.enqueue("tests.unknown", 3)
+
+    def test_thread_pool_batches_tasks_of_a_kind(self):
+        """
+        Tasks of a kind queued behind a busy worker run as one batch
+        """
+        executor = tasks.TaskExecutor(workers=1)
+        started, release, done = threading.Event(), threading.Event(), threading.Event()
+        self.register("tests.block", lambda payloads: started.set() or release.wait(5))
+        self.register("tests.done", lambda payloads: done.set())
+        before = self.runs("tests.record", "succeeded")
+
+        executor.submit("tests.block", None)
+        self.assertTrue(started.wait(5))
+        for name, payload in [
+            ("tests.record", 1),
+            ("tests.record", 2),
+            ("tests.done", None),
+            ("tests.record", 3),
+        ]:
+            executor.submit(name, payload)
+        self.assertEqual(executor.depth(), 4)
+        self.assertGreaterEqual(executor.lag(), 0)
+        release.set()
+        self.assertTrue(done.wait(5))
+        self.assertEqual(self.batches, [[1, 2, 3]])
+        self.assertEqual(self.runs("tests.record", "succeeded") - before, 3)
+        self.assertEqual(executor.depth(), 0)
+
+    @override_settings(BLOG_TASKS_RETRY_SECONDS=0.01, BLOG_TASKS_MAX_ATTEMPTS=3)
+    def test_failed_tasks_are_retried(self):
+        """
+        A failing task is retried after a delay until it succeeds
+        """
+        executor = tasks.TaskExecutor(workers=1)
+        calls, done = [], threading.Event()
+
+        def flaky(payloads):
+            calls.append(payloads)
+            if len(calls) < 3:
+                raise ConnectionError("webhook unreachable")
+            done.set()
+
+        self.register("tests.flaky", flaky)
+        before = self.runs("tests.flaky", "retried")
+        executor.submit("tests.flaky", 1)
+        self.assertTrue(done.wait(5))
+        self.assertEqual(calls, [[1], [1], [1]])
+        self.assertEqual(self.runs("tests.flaky", "retried") - before, 2)
+
+    @override_settings(BLOG_TASKS_DURABLE=True)
+    def test_durable_queue(self):
+        """
+        Durable tasks are stored with the write and run in batches by the command
+        """
+        with transaction.atomic():
+            tasks.enqueue("tests.record", 1)
+            tasks.enqueue("tests.record", 2)
+        self.assertEqual(BlogTask.objects.count(), 2)
+        self.assertEqual(self.batches, [])
+
+        out = StringIO()
+        call_command("run_blog_tasks", once=True, stdout=out)
+        self.assertEqual(self.batches, [[1, 2]])
+        self.assertFalse(BlogTask.objects.exists())
+        self.assertIn("Ran 2 background tasks", out.getvalue())
+        self.assertEqual(
+            REGISTRY.get_sample_value("blog_task_queue_depth", {"queue": "database"}),
+            2,
+        )
+
+    @override_settings(BLOG_TASKS_DURABLE=True, BLOG_TASKS_MAX_ATTEMPTS=2)
+    def test_durable_failures_are_retried_then_kept(self):
+        """
+        A failed durable task waits before its retry and is kept after its last
+        attempt, with its error
+        """
+
+        def fail(payloads):
+            raise ValueError("boom")
+
+        self.register("tests.fail", fail)
+        tasks.enqueue("tests.fail", {"id": 1})
+
+        self.assertEqual(tasks.run_durable_batch(), 1)
+        task = BlogTask.objects.get()
+        self.assertEqual(task.attempts, 1)
+        self.assertGreater(task.run_after, timezone.now())
+        self.assertIsNone(task.failed_at)
+        self.assertEqual(tasks.run_durable_batch(), 0)
+
+        BlogTask.objects.update(run_after=timezone.now())
+        with self.assertLogs("myapp.tasks", "ERROR"):
+            self.assertEqual(tasks.run_durable_batch(), 1)
+        task.refresh_from_db()
+        self.assertEqual(task.attempts, 2)
+        self.assertIsNotNone(task.failed_at)
+        self.assertIn("boom", task.last_error)
+        self.assertEqual(tasks.run_durable_batch(), 0)
+
+    @override_settings(BLOG_TASKS_DURABLE=True)
+    def test_write_side_effects_are_tasks(self):
+        """
+        Writes index blogs and update the rollups through the durable queue
+        """
+        user = User.objects.create_user(username="tasks2", password="tasks2")
+        client = APIClient()
+        client.force_authenticate(user=user)
+        client.post(
+            reverse("blog-bulk"),
+            [{"title": f"Queued {i}", "content": "c"} for i in range(3)],
+            format="json",
+        )
+        self.assertEqual(
+            sorted(BlogTask.objects.values_list("name", flat=True)),
+            [search.INDEX_TASK, stats.RECORD_TASK],
+        )
+        self.assertFalse(BlogStat.objects.exists())
+        self.assertEqual(client.get(reverse("blog-list"), {"q": "queued"}).data, [])
+
+        call_command("run_blog_tasks", once=True, stdout=StringIO())
+        self.assertFalse(BlogTask.objects.exists())
+        self.assertEqual(BlogStat.objects.get(dimension=BlogStat.TOTAL).count, 3)
+        cache.clear()
+        self.assertEqual(len(client.get(reverse("blog-list"), {"q": "queued"}).data), 3)
+
+    @skipUnless(connection.vendor == "sqlite", "Only the SQLite index is cleaned up")
+    @override_settings(BLOG_TASKS_WORKERS=0)
+    def test_deleted_blogs_leave_the_index_after_commit(self):
+        """
+        Deleting a blog removes its search entry in a task run after commit
+        """
+        user = User.objects.create_user(username="tasks1", password="tasks1")
+        with self.captureOnCommitCallbacks(execute=True):
+            blog = Blog.objects.create(title="Indexed", content="c", author=user)
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        def indexed():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT COUNT(*) FROM {search.FTS_TABLE} WHERE rowid = %s",
+                    [blog.id],
+                )
+                return cursor.fetchone()[0]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            client.delete(reverse("blog-detail", args=[blog.id]))
+            self.assertEqual(indexed(), 1)
+        self.assertEqual(indexed(), 0)
@@ -3,6 +3,7 @@ Create the URLs of endpoints
 """
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .async_views import AsyncBlogViewSet, blog_events
 from .views import BlogViewSet
 
 router = DefaultRouter()
@@ -11,3 +12,37 @@ router.register(r"blogs", BlogViewSet, basename="blog")
 urlpatterns = [
     path("", include(router.urls)),
 ]
+
+# Async read endpoints, routed ahead of `urlpatterns` by the ASGI URLconf.
+# Writes to the same URLs are handled by the sync views of the router. The
+# event stream is only served through ASGI, where it holds no thread.
+sync_views = {url.name: url.callback for url in router.urls}
+async_urlpatterns = [
+    path("blogs/events/", blog_events, name="blog-events"),
+    path(
+        "blogs/",
+        AsyncBlogViewSet.as_async_view(
+            {"get": "list"}, sync_views["blog-list"], basename="blog", detail=False
+        ),
+        name="async-blog-list",
+    ),
+    path(
+        "blogs/<int:pk>/",
+        AsyncBlogViewSet.as_async_view(
+            {"get": "retrieve"}, sync_views["blog-detail"], basename="blog", detail=True
+        ),
+        name="async-blog-detail",
+    ),
+] + [
+    path(
+        f"blogs/{action}/",
+        AsyncBlogViewSet.as_async_view({"get": action}, basename="blog", detail=False),
+        name=f"async-blog-{action.replace('_', '-')}",
+    )
+    for action in (
+        "by_date",
+        "by_date_range",
+        "created_after_date",
+        "created_before_date",
+    )
+]
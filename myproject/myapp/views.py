@@ -1,98 +1,359 @@
 """
 This module defines the BlogViewSet for managing Blog instances in the API.
 
-It provides standard CRUD operations, as well as custom filtering endpoints
-for querying blogs by author, specific dates, or date ranges.
+It provides standard CRUD operations. Read endpoints are filtered by author,
+dates, date ranges and full-text search through `filters.BlogFilterBackend`;
+the date endpoints are kept as aliases of the filtered list. Blog counts per
+day, month and author are served by `stats` from rollups that the write
+actions maintain in the same transaction; once committed, writes are pushed to
+the clients of the event stream of `events`, and side effects that need not
+delay the response run as background tasks of `tasks`.
+List responses support opt-in keyset pagination via `?page_size=` and `?cursor=`.
 """
 
-from datetime import datetime
-from rest_framework import permissions, viewsets, status
+from rest_framework import permissions, serializers, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from django.conf import settings
+from django.db import DatabaseError, transaction
 from django.utils import timezone
 
+from . import changefeed, events, export, filters, routing, search, stats
+from .cache import blog_cache, cache_response
+from .conditional import conditional_response
 from .models import Blog
-from .serializers import BlogSerializer
+from .pagination import KeysetPagination
+from .serializers import BlogSerializer, get_fieldset
 
 
-class BlogViewSet(viewsets.ModelViewSet):
-    queryset = Blog.objects.all()
+class BlogViewSet(viewsets.ModelViewSet):  # pylint: disable=too-many-public-methods
+    queryset = Blog.objects.select_related("author")
     serializer_class = BlogSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
+    filter_backends = [filters.BlogFilterBackend]
+    # Reads that must not lag behind the primary: the change feed would skip
+    # the changes a replica has not replayed when it sends its cursor past them
+    primary_read_actions = {"changes"}
+
+    def dispatch(self, request, *args, **kwargs):
+        """
+        Handle the request in its own read routing scope.
+        A request whose replica fails is retried once on the other databases.
+        """
+        with routing.request_scope():
+            try:
+                return super().dispatch(request, *args, **kwargs)
+            except DatabaseError:
+                if not routing.replica_failed():
+                    raise
+        with routing.request_scope():
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        """
+        Send the reads of safe-method requests to a replica, unless the user
+        wrote recently or the action needs the primary
+        """
+        super().initial(request, *args, **kwargs)
+        if (
+            routing.replicas()
+            and request.method in permissions.SAFE_METHODS
+            and self.action not in self.primary_read_actions
+        ):
+            routing.use_replica(routing.choose_read_alias(request.user))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """
+        Keep the reads of a successful writer on the primary for a while
+        """
+        if request.method not in permissions.SAFE_METHODS and status.is_success(
+            response.status_code
+        ):
+            routing.stick_to_primary(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        with transaction.atomic():
+            serializer.save(author=self.request.user)
+            stats.record_later(added=[stats.blog_key(serializer.instance)])
+            events.publish_on_commit(events.CREATED, [serializer.instance])
+        blog_cache.bump_on_commit()
+
+    def get_fieldset(self):
+        """
+        Return the `fields` and `excerpt` params of a read request as serializer kwargs
+        """
+        if self.request.method not in permissions.SAFE_METHODS:
+            return {}
+        return get_fieldset(self.request.query_params)
+
+    def get_serializer(self, *args, **kwargs):
+        return super().get_serializer(*args, **{**self.get_fieldset(), **kwargs})
 
     def get_queryset(self):
+        """
+        Only load the columns of the requested fields when retrieving a blog,
+        and the content along with the blogs that are written
+        """
         queryset = super().get_queryset()
-        author_id = self.request.query_params.get("author")
-        if author_id:
-            queryset = queryset.filter(author_id=author_id)
+        if self.action == "retrieve":
+            queryset = self.get_serializer().select(queryset)
+        elif self.action in ("update", "partial_update"):
+            queryset = queryset.select_related("body")
         return queryset
 
+    def get_read_queryset(self):
+        """
+        Return the queryset serialized by the current collection action.
+        Also used to compute conditional GET validators without running the action.
+        """
+        return self.filter_queryset(self.get_queryset())
+
+    @conditional_response
+    @cache_response
+    def list(self, request, *args, **kwargs):
+        return self.list_response(self.get_read_queryset())
+
+    def list_response(self, queryset):
+        """
+        Serialize a blog queryset, paginating it when the client asked for pages.
+        Rows are read with `.values()`, only for the requested fields, and
+        serialized by the fast read path.
+        """
+        queryset = self.get_serializer().rows(queryset)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+    @conditional_response
+    @cache_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     @action(detail=False, methods=["get"])
     def by_date(self, request, *args, **kwargs):
         """
-        Return blogs created on a specific date.
+        Return blogs created on a specific date; alias of the list `date` filter.
         Query Params:
             date (str): Date in 'YYYY-MM-DD' format.
         Returns:
             Response: Serialized list of blog posts from the specified date.
         """
-        date_str = request.query_params.get("date")
-        date = datetime.strptime(date_str, "%Y-%m-%d").date()
-        blogs = Blog.objects.filter(created_at__date=date)
-        serializer = self.get_serializer(blogs, many=True)
-        return Response(serializer.data)
+        return self.list(request, *args, **kwargs)
 
     @action(detail=False, methods=["get"])
     def by_date_range(self, request, *args, **kwargs):
         """
-        Return blogs created within a specific date range.
+        Return blogs created within a specific date range; alias of the list
+        `start_date` and `end_date` filters.
         Query Params:
            start_date (str): Start date in 'YYYY-MM-DD' format.
            end_date (str): End date in 'YYYY-MM-DD' format.
         Returns:
            Response: Serialized list of blog posts in the given date range.
         """
-        start_date_str = request.query_params.get("start_date")
-        end_date_str = request.query_params.get("end_date")
-        start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-        end_date = datetime.strptime(end_date_str, "%Y-%m-%d").date()
-        blogs = Blog.objects.filter(created_at__date__range=(start_date, end_date))
-        serializer = self.get_serializer(blogs, many=True)
-        return Response(serializer.data)
+        return self.list(request, *args, **kwargs)
 
     @action(detail=False, methods=["get"])
     def created_after_date(self, request, *args, **kwargs):
         """
-        Return blogs created after a given date
+        Return blogs created after a given date; alias of the list `created_after` filter.
         Query Params:
             date (str): Date in 'YYYY-MM-DD' format.
         Returns:
             Response: Serialized list of blog posts created after the specified date.
         """
-        date_str = request.query_params.get("date")
-        date = datetime.strptime(date_str, "%Y-%m-%d").date()
-        blogs = Blog.objects.filter(created_at__date__gt=date)
-        serializer = self.get_serializer(blogs, many=True)
-        return Response(serializer.data)
+        return self.list(request, *args, **kwargs)
 
     @action(detail=False, methods=["get"])
     def created_before_date(self, request, *args, **kwargs):
         """
-        Return blogs created before a given date.
+        Return blogs created before a given date; alias of the list `created_before` filter.
         Query Params:
             date (str): Date in 'YYYY-MM-DD' format.
         Returns:
             Response: Serialized list of blog posts created before the specified date
         """
-        date_str = request.query_params.get("date")
-        date = datetime.strptime(date_str, "%Y-%m-%d").date()
-        blogs = Blog.objects.filter(created_at__date__lt=date)
-        serializer = self.get_serializer(blogs, many=True)
-        return Response(serializer.data)
+        return self.list(request, *args, **kwargs)
+
+    @action(detail=False, methods=["get"])
+    @cache_response
+    def stats(self, request, *args, **kwargs):
+        """
+        Return blog counts per day and month, the total and the most prolific authors.
+        Counts come from the rollup table maintained by the write paths, so the
+        cost does not depend on the number of blogs.
+        Query Params:
+            start_date (str): First day, 'YYYY-MM-DD'. Defaults to BLOG_STATS_DEFAULT_DAYS ago.
+            end_date (str): Last day, 'YYYY-MM-DD'. Defaults to today.
+            author (int): Only count the blogs of this author in `authors`.
+        Returns:
+            Response: `total`, and `days`, `months` and `authors` with their counts.
+        """
+        params = stats.StatsParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return Response(stats.get_stats(**params.validated_data))
+
+    @action(detail=False, methods=["get"])
+    def changes(self, request, *args, **kwargs):
+        """
+        Return the blogs created or modified, and the blogs deleted, since a cursor.
+        Query Params:
+            cursor (str): Cursor returned by the previous call; omit it to start
+                from the beginning.
+            batch_size (int): Maximum number of changes. Defaults to BLOG_CHANGES_BATCH_SIZE.
+        Returns:
+            Response: `blogs` and `deleted` tombstones in change order, the
+            `cursor` to send next, and whether `more` changes are waiting.
+        """
+        params = changefeed.ChangesParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return Response(
+            changefeed.get_changes(
+                self.get_serializer(), self.get_queryset(), **params.validated_data
+            )
+        )
+
+    @action(detail=False, methods=["post", "patch", "delete"], url_path="bulk")
+    def bulk(self, request, *args, **kwargs):
+        """
+        Create, update or delete many blogs in a single transaction.
+        Request body:
+            POST: List of blogs to create.
+            PATCH: List of partial blogs, each with the `id` of the blog to update.
+            DELETE: List of blog ids.
+        Only the author of a blog may update or delete it. If any item is invalid
+        nothing is written and the response lists the errors of each item.
+        Returns:
+            Response: Created or updated blogs, or the number of deleted blogs.
+        """
+        items = request.data
+        if isinstance(items, list) and len(items) > settings.BLOG_BULK_MAX_ITEMS:
+            raise ValidationError(
+                f"Ensure this list has at most {settings.BLOG_BULK_MAX_ITEMS} items."
+            )
+
+        with transaction.atomic():
+            if request.method == "DELETE":
+                deleted = self.perform_bulk_destroy(items)
+                response = Response({"deleted": deleted})
+            elif request.method == "PATCH":
+                ids = [
+                    item["id"]
+                    for item in (items if isinstance(items, list) else [])
+                    if isinstance(item, dict) and isinstance(item.get("id"), int)
+                ]
+                blogs = Blog.objects.select_related("author", "body").select_for_update(
+                    of=("self",)
+                )
+                serializer = self.get_serializer(
+                    list(blogs.filter(id__in=ids)), data=items, many=True, partial=True
+                )
+                serializer.is_valid(raise_exception=True)
+                removed = [stats.blog_key(blog) for blog in serializer.instance]
+                serializer.save()
+                search.index_blogs_later([blog.id for blog in serializer.instance])
+                stats.record_later(
+                    added=[stats.blog_key(blog) for blog in serializer.instance],
+                    removed=removed,
+                )
+                events.publish_on_commit(events.UPDATED, serializer.instance)
+                response = Response(serializer.data)
+            else:
+                serializer = self.get_serializer(data=items, many=True)
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+                search.index_blogs_later([blog.id for blog in serializer.instance])
+                stats.record_later(
+                    added=[stats.blog_key(blog) for blog in serializer.instance]
+                )
+                events.publish_on_commit(events.CREATED, serializer.instance)
+                response = Response(serializer.data, status=status.HTTP_201_CREATED)
+            blog_cache.bump_on_commit()
+        return response
+
+    def perform_bulk_destroy(self, ids):
+        """
+        Delete the blogs with the given ids in one statement.
+        Raises:
+            ValidationError: Per item errors when an id is invalid, missing or
+                belongs to a blog of another author.
+        Returns:
+            int: Number of deleted blogs.
+        """
+        if not isinstance(ids, list):
+            raise ValidationError("Expected a list of blog ids.")
+        valid_ids = [pk for pk in ids if isinstance(pk, int)]
+        keys = {
+            pk: (author_id, created_at)
+            for pk, author_id, created_at in Blog.objects.select_for_update()
+            .filter(id__in=valid_ids)
+            .values_list("id", "author_id", "created_at")
+        }
+        errors = []
+        for pk in ids:
+            if not isinstance(pk, int):
+                errors.append({"id": ["A valid integer is required."]})
+            elif pk not in keys:
+                errors.append({"id": ["Not found."]})
+            elif keys[pk][0] != self.request.user.id:
+                errors.append(
+                    {"detail": "You do not have permission to delete this blog."}
+                )
+            else:
+                errors.append({})
+        if any(errors):
+            raise ValidationError(errors)
+
+        _, deleted = Blog.objects.filter(id__in=valid_ids).delete()
+        changefeed.record_deletions(valid_ids)
+        events.publish_deletions_on_commit({pk: keys[pk][0] for pk in valid_ids})
+        search.index_blogs_later(valid_ids)
+        stats.record_later(removed=[keys[pk] for pk in set(valid_ids)])
+        return deleted.get(Blog._meta.label, 0)
+
+    @action(detail=False, methods=["get", "post"])
+    def export(self, request, *args, **kwargs):
+        """
+        List completed snapshot exports, or start a new one in the background.
+        Request body (POST):
+            incremental (bool): Only export blogs modified since the last snapshot.
+        Returns:
+            Response: Manifests of completed snapshots, or the name of the
+            snapshot being written with 202 Accepted.
+        """
+        if request.method == "GET":
+            return Response(export.list_manifests())
+
+        data = request.data if isinstance(request.data, dict) else {}
+        incremental = serializers.BooleanField().run_validation(
+            data.get("incremental", False)
+        )
+        try:
+            name = export.start_export(incremental=incremental)
+        except export.ExportInProgress as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_409_CONFLICT)
+        return Response({"name": name}, status=status.HTTP_202_ACCEPTED)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path=r"export/(?P<name>[\w-]+)",
+        url_name="export-download",
+    )
+    def export_download(self, request, name, *args, **kwargs):
+        """
+        Download a snapshot file. Supports `Range` and `If-Range` requests.
+        """
+        manifest = export.get_manifest(name)
+        if manifest is None:
+            raise NotFound()
+        return export.snapshot_response(request, manifest)
 
     def perform_update(self, serializer):
         """
@@ -107,7 +368,12 @@ class BlogViewSet(viewsets.ModelViewSet):
         if self.request.user != instance.author:
             raise PermissionDenied("You do not have permission to update this blog.")
 
-        instance = serializer.save(modified_at=timezone.now())
+        removed = stats.blog_key(instance)
+        with transaction.atomic():
+            instance = serializer.save(modified_at=timezone.now())
+            stats.record_later(added=[stats.blog_key(instance)], removed=[removed])
+            events.publish_on_commit(events.UPDATED, [instance])
+        blog_cache.bump_on_commit()
         return Response(
             {
                 "message": f'Blog "{instance.title}" updated successfully!',
@@ -123,8 +389,18 @@ class BlogViewSet(viewsets.ModelViewSet):
         Returns:
             Response: Success message with 204 No Content status.
         """
+        if self.request.user != instance.author:
+            raise PermissionDenied("You do not have permission to delete this blog.")
+
         instance_title = instance.title
-        instance.delete()
+        instance_id = instance.id
+        with transaction.atomic():
+            instance.delete()
+            changefeed.record_deletions([instance_id])
+            stats.record_later(removed=[stats.blog_key(instance)])
+            events.publish_deletions_on_commit({instance_id: instance.author_id})
+            search.index_blogs_later([instance_id])
+        blog_cache.bump_on_commit()
         response_message = f'Blog "{instance_title}" deleted successfully!'
         return Response(
             {"message": response_message}, status=status.HTTP_204_NO_CONTENT
@@ -2,6 +2,8 @@
 ASGI config for myproject project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests served through ASGI resolve against ``myproject.asgi_urls``, which
+routes the Blog read endpoints to their async views.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
@@ -9,8 +11,23 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler, ASGIRequest
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "myproject.settings")
 
-application = get_asgi_application()
+
+class AsyncRoutesRequest(ASGIRequest):
+    """ASGI request resolved against the async URLconf"""
+
+    urlconf = "myproject.asgi_urls"
+
+
+class AsyncRoutesHandler(ASGIHandler):
+    """ASGI handler creating `AsyncRoutesRequest` requests"""
+
+    request_class = AsyncRoutesRequest
+
+
+django.setup(set_prefix=False)
+application = AsyncRoutesHandler()
@@ -0,0 +1,15 @@
+"""
+URL configuration of requests served through ASGI.
+
+The async Blog read endpoints take precedence over the sync ones on the same
+paths; everything else resolves exactly as in `myproject.urls`.
+"""
+from django.urls import path, include
+
+from myapp.urls import async_urlpatterns
+from myproject.urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path("api/", include(async_urlpatterns)),
+    *sync_urlpatterns,
+]
@@ -0,0 +1,25 @@
+"""
+Database helpers referenced from the settings.
+
+This module is imported by `settings.py`, so it must not import Django models
+or anything that needs configured settings.
+"""
+
+
+def replica_databases(primary, hosts):
+    """
+    Return the `DATABASES` entries `replica1`, `replica2`... of read replicas of
+    the `primary` database at `hosts`, each `host` or `host:port`.
+    In tests replicas mirror the primary, which then serves their reads.
+    """
+    databases = {}
+    for number, address in enumerate(hosts, 1):
+        host, _, port = address.partition(":")
+        databases[f"replica{number}"] = {
+            **primary,
+            "HOST": host,
+            "PORT": port or primary["PORT"],
+            "OPTIONS": {**primary["OPTIONS"]},
+            "TEST": {"MIRROR": "default"},
+        }
+    return databases
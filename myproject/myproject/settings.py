@@ -10,9 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
+from myproject.db import replica_databases
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -45,6 +48,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django_prometheus.middleware.PrometheusBeforeMiddleware",
+    "myapp.middleware.PerformanceMiddleware",
+    "myapp.compression.CompressionMiddleware",
+    "myapp.admission.AdmissionMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -79,17 +85,77 @@ WSGI_APPLICATION = "myproject.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# Connection settings come from the environment; the defaults match the local
+# PostgreSQL container described in the README.
+# With DB_POOL enabled (the default), connections are served by a psycopg pool
+# of DB_POOL_MIN_SIZE to DB_POOL_MAX_SIZE connections, which Django has the pool
+# check before each checkout as CONN_HEALTH_CHECKS is on. Requests wait at most
+# DB_POOL_TIMEOUT seconds for a connection.
+# Without the pool, connections persist for DB_CONN_MAX_AGE seconds.
+
+DB_POOL = os.environ.get("DB_POOL", "true").lower() in ("1", "true", "yes", "on")
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
-        "NAME": "mydb",
-        "USER": "postgres",
-        "PASSWORD": "postgres",
-        "HOST": "localhost",
-        "PORT": "5432",
+        "NAME": os.environ.get("DB_NAME", "mydb"),
+        "USER": os.environ.get("DB_USER", "postgres"),
+        "PASSWORD": os.environ.get("DB_PASSWORD", "postgres"),
+        "HOST": os.environ.get("DB_HOST", "localhost"),
+        "PORT": os.environ.get("DB_PORT", "5432"),
+        "CONN_MAX_AGE": 0 if DB_POOL else int(os.environ.get("DB_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {},
     }
 }
 
+if DB_POOL:
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+        "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+        "timeout": float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+        "max_idle": float(os.environ.get("DB_POOL_MAX_IDLE", 600)),
+    }
+
+# Read replicas: DB_REPLICA_HOSTS lists `host[:port]` of streaming replicas of
+# the default database, separated by commas; they use its name, credentials
+# and pool settings. Safe-method requests of the blog API read from a healthy
+# replica, except for users who wrote in the last BLOG_DB_STICKY_SECONDS.
+# Replicas are probed at most every BLOG_DB_REPLICA_CHECK_INTERVAL seconds and
+# skipped while down or lagging more than BLOG_DB_REPLICA_MAX_LAG seconds. The
+# sticky window is extended to at least the sum of those two, so keep that sum
+# below BLOG_DB_STICKY_SECONDS or the sticky setting has no effect.
+
+DATABASES.update(
+    replica_databases(
+        DATABASES["default"],
+        [
+            host.strip()
+            for host in os.environ.get("DB_REPLICA_HOSTS", "").split(",")
+            if host.strip()
+        ],
+    )
+)
+DATABASE_ROUTERS = ["myapp.routing.ReplicaRouter"]
+
+BLOG_DB_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+BLOG_DB_STICKY_SECONDS = 5
+BLOG_DB_REPLICA_CHECK_INTERVAL = 1
+BLOG_DB_REPLICA_MAX_LAG = 2
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Any backend works for the blog response cache, e.g. FileBasedCache or Redis.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+BLOG_CACHE_ALIAS = "default"
+BLOG_CACHE_TIMEOUT = 300
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -132,10 +198,99 @@ STATIC_URL = "static/"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
-    "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+    "DEFAULT_AUTHENTICATION_CLASSES": ("myapp.authentication.CachedJWTAuthentication",),
+    # orjson backed JSON with the same output as DRF's, see myapp/renderers.py
+    "DEFAULT_RENDERER_CLASSES": (
+        "myapp.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
     ),
+    "DEFAULT_PARSER_CLASSES": (
+        "myapp.parsers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
+}
+
+# Send query count, database, serializer and render times in a Server-Timing
+# header (they are exported as Prometheus histograms either way)
+BLOG_SERVER_TIMING_HEADER = True
+
+# Response compression: encodings by preference (br and zstd are used when the
+# brotli / zstandard packages are installed), their levels, and the smallest
+# body compressed, in bytes
+BLOG_COMPRESSION_ENCODINGS = ["zstd", "br", "gzip"]
+BLOG_COMPRESSION_LEVELS = {"gzip": 6, "br": 4, "zstd": 3}
+BLOG_COMPRESSION_MIN_SIZE = 1024
+
+# Admission control: requests served at once and requests waiting, per URL
+# name, "*" standing for the routes not listed. Excess requests wait at most
+# BLOG_ADMISSION_QUEUE_TIMEOUT seconds, else get BLOG_ADMISSION_STATUS (503 or
+# 429) with Retry-After. Limits are per process, so size them to its threads.
+# Routes with "streaming" keep their slot until their streamed body is sent.
+BLOG_ADMISSION_ROUTES = {
+    "*": {"concurrency": 32, "queue": 64},
+    "blog-list": {"concurrency": 16, "queue": 32},
+    "blog-by-date-range": {"concurrency": 4, "queue": 8},
+    "blog-export-download": {"concurrency": 2, "queue": 2, "streaming": True},
 }
+BLOG_ADMISSION_EXEMPT = ["prometheus-django-metrics"]
+BLOG_ADMISSION_QUEUE_TIMEOUT = 5
+BLOG_ADMISSION_STATUS = 503
+
+# Blog content is zlib-compressed when its UTF-8 text is at least this many
+# bytes (None stores every body as text), at this compression level
+BLOG_CONTENT_COMPRESS_MIN_SIZE = 4096
+BLOG_CONTENT_COMPRESS_LEVEL = 6
+
+# Blog bulk endpoints: maximum items per request and rows per INSERT / UPDATE
+BLOG_BULK_MAX_ITEMS = 10000
+BLOG_BULK_BATCH_SIZE = 1000
+
+# Blog stats endpoint: days covered by default, longest range and authors listed
+BLOG_STATS_DEFAULT_DAYS = 30
+BLOG_STATS_MAX_DAYS = 366
+BLOG_STATS_TOP_AUTHORS = 20
+
+# Blog change feed: changes per call by default and at most, seconds a change
+# waits before it is served (covering transactions committing after others that
+# started later), and days deletion tombstones are kept for cursors to resume
+BLOG_CHANGES_BATCH_SIZE = 500
+BLOG_CHANGES_MAX_BATCH_SIZE = 1000
+BLOG_CHANGES_SETTLE_SECONDS = 2
+BLOG_CHANGES_TOMBSTONE_DAYS = 30
+
+# Blog event stream (ASGI only): events kept for clients resuming with
+# Last-Event-ID, seconds between heartbeats of idle streams, and streams served
+# at once per process
+BLOG_EVENTS_BUFFER_SIZE = 1000
+BLOG_EVENTS_HEARTBEAT_SECONDS = 15
+BLOG_EVENTS_MAX_SUBSCRIBERS = 5000
+
+# Background tasks of blog writes, run once the write commits: threads per
+# process (0 runs them inline at commit), or with BLOG_TASKS_DURABLE rows of
+# the BlogTask table, run by `manage.py run_blog_tasks`. Tasks of a kind are run
+# in batches of up to BLOG_TASKS_BATCH_SIZE, up to BLOG_TASKS_MAX_ATTEMPTS times,
+# waiting BLOG_TASKS_RETRY_SECONDS (doubled per attempt) between attempts; the
+# worker command polls the table every BLOG_TASKS_POLL_SECONDS
+BLOG_TASKS_WORKERS = 2
+BLOG_TASKS_DURABLE = False
+BLOG_TASKS_BATCH_SIZE = 100
+BLOG_TASKS_MAX_ATTEMPTS = 5
+BLOG_TASKS_RETRY_SECONDS = 2
+BLOG_TASKS_POLL_SECONDS = 1
+
+# Directory receiving blog snapshot exports, and seconds a change waits before
+# it is exported (covering transactions committing after the snapshot started)
+BLOG_EXPORT_DIR = BASE_DIR / "exports"
+BLOG_EXPORT_SETTLE_SECONDS = 2
+
+# Authenticated users are cached in each process: maximum entries and seconds
+# before a cached user is reloaded. Saving or deleting a user evicts it at once.
+BLOG_AUTH_USER_CACHE_SIZE = 10000
+BLOG_AUTH_USER_CACHE_TTL = 60
+# Authenticate GET/HEAD/OPTIONS requests from the token claims alone, without
+# loading the user (deactivation then only applies once the token expires)
+BLOG_AUTH_STATELESS_READS = False
 
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=1),